@@ -11,8 +11,16 @@ Module Description:
 - settings: Configuration file including API key, model parameters, file paths, etc.
 """
 
-from .summary import main
 from . import settings
 
 __all__ = ['main', 'settings']
 __version__ = '1.0.0'
+
+
+def __getattr__(name):
+    # summary 依赖 pandas 和 openai，访问 analyzer.main 时才导入
+    # summary pulls in pandas and openai, so it is imported on first access to analyzer.main
+    if name == 'main':
+        from .summary import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
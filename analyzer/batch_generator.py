@@ -9,10 +9,64 @@ This script generates batch_list.jsonl for Alibaba Cloud Bailian batch inference
 Output format: Each line is a JSON object in OpenAI-compatible batch format
 """
 
-import pandas as pd
+import csv
 import json
+import gzip
 import os
 from . import settings
+from .label_store import open_store, prompt_hash
+
+# 打标请求中用户消息的前缀 / Prefix of the user message in labeling requests
+USER_MESSAGE_PREFIX = "请对以下微博进行打标：\n"
+
+# 多条打包请求的 custom_id 前缀与用户消息 / custom_id prefix and user message of packed requests
+PACK_ID_PREFIX = "pack-"
+PACKED_MESSAGE_PREFIX = (
+    "请对以下 {n} 条微博分别进行打标，每条微博以【id】开头。\n"
+    "只输出一个合法的 JSON 数组，数组中每个元素对应一条微博，字段与单条打标的 JSON 对象完全相同，"
+    "并额外包含 \"id\" 字段（值为该微博的 id）。每条微博恰好对应一个元素，不要遗漏或增加。\n"
+)
+# 打包请求追加在 system prompt 末尾的输出格式覆盖说明，取代其中"仅输出一个 JSON 对象"的要求
+# Output-format override appended to the system prompt of packed requests; it supersedes the
+# prompt's "output exactly one JSON object" rule
+PACKED_SYSTEM_SUFFIX = (
+    "\n\n# Output Format Override (多条打包请求)\n"
+    "本次请求包含多条微博。上文\"仅输出一个合法的 JSON 对象\"的要求改为：只输出一个合法的 JSON 数组，"
+    "每条微博对应数组中的一个 JSON 对象，字段与单条打标完全相同，并额外包含 \"id\" 字段。"
+    "不要输出任何 Markdown 标记或解释性文字。\n"
+    "This request carries several posts. Instead of a single JSON object, output exactly one valid JSON array "
+    "with one object per post, using the same fields as single-post labeling plus an \"id\" field.\n"
+)
+
+
+def packed_system_prompt(system_prompt):
+    """打包请求使用的 system prompt / System prompt used by packed requests"""
+    return system_prompt + PACKED_SYSTEM_SUFFIX
+
+
+def build_packed_message(items):
+    """
+    把多条微博拼成一条用户消息 / Build one user message carrying several posts
+
+    参数 Parameters:
+    - items: [(post_id, content), ...]
+    """
+    parts = [PACKED_MESSAGE_PREFIX.format(n=len(items))]
+    for post_id, content in items:
+        parts.append(f"\n【{post_id}】\n{content}\n")
+    return ''.join(parts)
+
+
+def ids_file_for(output_file):
+    """批量请求文件对应的 id 对照表路径 / Path of the id table written next to the request shards"""
+    stem = output_file[:-len('.jsonl')] if output_file.endswith('.jsonl') else output_file
+    return f"{stem}_ids.csv"
+
+
+def manifest_file_for(output_file):
+    """批量请求文件对应的清单路径 / Path of the manifest written next to the request file"""
+    stem = output_file[:-len('.jsonl')] if output_file.endswith('.jsonl') else output_file
+    return f"{stem}_manifest.json"
 
 
 def generate_batch_list(csv_file=None, output_file='analyzer/data/batch_list.jsonl',
@@ -29,6 +83,7 @@ def generate_batch_list(csv_file=None, output_file='analyzer/data/batch_list.jso
     - api_key: 阿里云百炼 API Key（默认从 settings.py 读取）/ Alibaba Cloud API Key
     - model_name: 模型名称（默认从 settings.py 读取）/ Model name
     """
+    import pandas as pd
     
     # 使用 settings 中的配置作为默认值 / Use settings defaults if parameters not provided
     if api_key is None:
@@ -59,6 +114,16 @@ def generate_batch_list(csv_file=None, output_file='analyzer/data/batch_list.jso
         # 读取 system prompt / Read system prompt
         with open(prompt_file, 'r', encoding='utf-8') as f:
             system_prompt = f.read()
+        labels_hash = prompt_hash(system_prompt)
+        
+        # 跳过标签库中已用同一 prompt 打过标的微博 / Skip posts already labeled under the same prompt
+        store = open_store()
+        if store is not None:
+            post_ids = df_deduped['id'].astype(str).str.strip()
+            labeled = store.labeled_ids(post_ids, labels_hash)
+            store.close()
+            df_deduped = df_deduped[~post_ids.isin(labeled)].reset_index(drop=True)
+            print(f"标签库中已有 {len(labeled)} 条，跳过 / Already in label store, skipped: {len(labeled)}")
         
         print(f"总共 {len(df_deduped)} 条微博需要打标")
         print(f"Total {len(df_deduped)} posts to label")
@@ -92,7 +157,7 @@ def generate_batch_list(csv_file=None, output_file='analyzer/data/batch_list.jso
                             },
                             {
                                 "role": "user",
-                                "content": f"请对以下微博进行打标：\n{content}"
+                                "content": f"{USER_MESSAGE_PREFIX}{content}"
                             }
                         ],
                         "temperature": 0.3
@@ -105,6 +170,16 @@ def generate_batch_list(csv_file=None, output_file='analyzer/data/batch_list.jso
                 if idx % 100 == 0:
                     print(f"  已生成 {idx} 条请求 / Generated {idx} requests")
         
+        # 记录生成时的 prompt 哈希，供结果入库使用 / Record the prompt hash for storing the results later
+        with open(manifest_file_for(output_file), 'w', encoding='utf-8') as f:
+            json.dump({
+                'source_csv': csv_file,
+                'prompt_file': prompt_file,
+                'prompt_hash': labels_hash,
+                'model': model_name,
+                'total_requests': len(df_deduped),
+            }, f, ensure_ascii=False, indent=2)
+        
         print(f"\n[OK] 批量请求文件已生成")
         print(f"[OK] Batch request file generated")
         print(f"  输出路径 / Output: {output_file}")
@@ -123,6 +198,263 @@ def generate_batch_list(csv_file=None, output_file='analyzer/data/batch_list.jso
         return None
 
 
+class ShardWriter:
+    """
+    按行数 / 字节数上限自动切换分片文件的写入器
+    Writer that rolls over to a new numbered shard when a line or byte limit is reached
+
+    参数 Parameters:
+    - output_file: 基础输出路径，分片命名为 <名称>_0001.jsonl[.gz] / Base path; shards are <stem>_0001.jsonl[.gz]
+    - max_lines: 每个分片最大行数（None 不限制）/ Max lines per shard (None = unlimited)
+    - max_bytes: 每个分片最大字节数，按未压缩大小计（None 不限制）/ Max uncompressed bytes per shard
+    - compress: 是否 gzip 压缩 / Whether to gzip shards
+    """
+
+    def __init__(self, output_file, max_lines=None, max_bytes=None, compress=False):
+        stem = output_file[:-len('.jsonl')] if output_file.endswith('.jsonl') else output_file
+        self.stem = stem
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.shards = []
+        self._f = None
+
+    def _open_next(self):
+        self.close()
+        index = len(self.shards) + 1
+        path = f"{self.stem}_{index:04d}.jsonl" + ('.gz' if self.compress else '')
+        self._f = gzip.open(path, 'wb') if self.compress else open(path, 'wb')
+        self.shards.append({'file': os.path.basename(path), 'lines': 0, 'bytes': 0,
+                            'first_id': None, 'last_id': None})
+
+    def write(self, custom_id, line):
+        data = line.encode('utf-8')
+        shard = self.shards[-1] if self.shards else None
+        if (
+            shard is None
+            or (self.max_lines and shard['lines'] + 1 > self.max_lines)
+            or (self.max_bytes and shard['lines'] > 0 and shard['bytes'] + len(data) > self.max_bytes)
+        ):
+            self._open_next()
+            shard = self.shards[-1]
+        self._f.write(data)
+        shard['lines'] += 1
+        shard['bytes'] += len(data)
+        if shard['first_id'] is None:
+            shard['first_id'] = custom_id
+        shard['last_id'] = custom_id
+        return shard['file']
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def generate_batch_list_streaming(csv_file=None, output_file='analyzer/data/batch_list.jsonl',
+                                  prompt_file='analyzer/prompts/labeling_prompt.txt',
+                                  model_name=None, chunksize=None, max_lines=None,
+                                  max_bytes=None, compress=None, pack_size=None):
+    """
+    流式生成批量推理请求：分块读取 CSV，不使用 iterrows，按行数/字节数上限写入多个分片，
+    并生成分片清单（manifest）和 id→分片 对照表，供下游关联结果使用。
+    Streaming batch generation: reads the CSV in chunks without iterrows, writes numbered shards
+    bounded by line/byte limits, and writes a shard manifest plus an id→shard table for downstream joins.
+
+    输出的每一行与 generate_batch_list 完全相同（id 去重也保持"保留第一次出现"，空正文同样写为 'nan'）。
+    唯一的例外：id 始终按文本读取，id 列有缺失时 generate_batch_list 会把其余 id 读成浮点数（如 '13.0'），这里仍为 '13'，
+    缺失的 id 写为 'nan'。
+    Every line is byte-identical to generate_batch_list output (id dedupe still keeps the first occurrence,
+    empty posts are written as 'nan' too). The one exception: ids are always read as text, so when the id
+    column has gaps generate_batch_list turns the other ids into floats ('13.0') while this keeps '13';
+    the missing id itself becomes 'nan'.
+
+    参数 Parameters:
+    - csv_file / output_file / prompt_file / model_name: 同 generate_batch_list / Same as generate_batch_list
+    - chunksize: 每次读取的行数（默认 settings.BATCH_CHUNKSIZE）/ Rows per CSV chunk
+    - max_lines: 每个分片最大行数（默认 settings.BATCH_MAX_LINES）/ Max lines per shard
+    - max_bytes: 每个分片最大字节数（默认 settings.BATCH_MAX_BYTES）/ Max bytes per shard
+    - compress: 是否 gzip 压缩（默认 settings.BATCH_GZIP）/ Gzip shards
+    - pack_size: 每个请求打包的微博条数 K（默认 settings.BATCH_PACK_SIZE）/ Posts per request (K)
+
+    K > 1 时每 K 条微博共享一次 system prompt，custom_id 为 pack-000001 形式，
+    模型需返回带 "id" 字段的 JSON 数组；id 对照表记录每条微博所在的请求，
+    由 process_batch_results 按 id 拆分结果。
+    With K > 1, every K posts share one copy of the system prompt; custom_ids look like pack-000001
+    and the model must answer with a JSON array whose elements carry "id". The id table records
+    which request each post went into so process_batch_results can demultiplex the answers.
+
+    返回 Returns:
+    - 成功返回清单 dict，否则返回 None / Manifest dict on success, None otherwise
+    """
+    import pandas as pd
+
+    if model_name is None:
+        model_name = settings.MODEL_NAME
+    if csv_file is None:
+        csv_file = settings.TEST_POST_LIST
+    if chunksize is None:
+        chunksize = settings.BATCH_CHUNKSIZE
+    if max_lines is None:
+        max_lines = settings.BATCH_MAX_LINES
+    if max_bytes is None:
+        max_bytes = settings.BATCH_MAX_BYTES
+    if compress is None:
+        compress = settings.BATCH_GZIP
+    if pack_size is None:
+        pack_size = settings.BATCH_PACK_SIZE
+    if pack_size < 1:
+        raise ValueError("BATCH_PACK_SIZE 必须 >= 1 / BATCH_PACK_SIZE must be >= 1")
+
+    writer = None
+    store = None
+    try:
+        with open(prompt_file, 'r', encoding='utf-8') as f:
+            system_prompt = f.read()
+        # 标签哈希只取决于原 prompt，打包方式不影响已存标签是否可复用
+        # The label hash depends on the base prompt only; packing does not invalidate stored labels
+        labels_hash = prompt_hash(system_prompt)
+        if pack_size > 1:
+            system_prompt = packed_system_prompt(system_prompt)
+
+        output_dir = os.path.dirname(output_file)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        # 预先序列化所有请求共享的部分，每行只需编码 id 和正文
+        # Pre-serialise the parts shared by every request; only id and content are encoded per line
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        head = '{"custom_id": '
+        middle = (
+            ', "method": "POST", "url": "/v1/chat/completions", "body": {"model": ' + encode(model_name)
+            + ', "messages": [{"role": "system", "content": ' + encode(system_prompt)
+            + '}, {"role": "user", "content": '
+        )
+        tail = '}], "temperature": 0.3}}\n'
+
+        writer = ShardWriter(output_file, max_lines=max_lines, max_bytes=max_bytes, compress=compress)
+        stem = writer.stem
+        ids_file = ids_file_for(output_file)
+        manifest_file = manifest_file_for(output_file)
+        store = open_store()
+        skipped_labeled = 0
+
+        seen = set()
+        total_rows = 0
+        written = 0
+        requests_written = 0
+        est_tokens = 0
+        pending = []
+
+        def emit(items):
+            # 写出一个打包请求 / Write one packed request
+            nonlocal requests_written, est_tokens
+            requests_written += 1
+            custom_id = f"{PACK_ID_PREFIX}{requests_written:06d}"
+            user_content = build_packed_message(items)
+            est_tokens += len(system_prompt) + len(user_content)
+            shard = writer.write(custom_id, head + encode(custom_id) + middle + encode(user_content) + tail)
+            return [(post_id, custom_id, shard) for post_id, _ in items]
+        print(f"正在流式生成批量推理请求文件...")
+        print(f"Streaming batch requests from {csv_file}...")
+
+        with open(ids_file, 'w', encoding='utf-8', newline='') as ids_out:
+            ids_writer = csv.writer(ids_out)
+            ids_writer.writerow(['post_id', 'custom_id', 'shard'])
+            reader = pd.read_csv(csv_file, chunksize=chunksize, dtype={'id': str})
+            for chunk in reader:
+                if 'id' not in chunk.columns or '微博正文' not in chunk.columns:
+                    raise ValueError(f"CSV 文件必须包含 'id' 和 '微博正文' 列 / CSV must have 'id' and '微博正文' columns")
+                total_rows += len(chunk)
+
+                # 块内按 id 去重，再排除之前块中出现过的 id / Dedupe within the chunk, then against earlier chunks
+                chunk = chunk.drop_duplicates(subset=['id'], keep='first')
+                # 与 generate_batch_list 的 str(...) 一致，缺失值写为 'nan'（astype(str) 会保留 NaN）
+                # Same as str(...) in generate_batch_list: missing values become 'nan' (astype(str) keeps NaN)
+                ids = chunk['id'].map(str)
+                fresh = ~ids.isin(seen)
+                ids = ids[fresh].tolist()
+                contents = chunk.loc[fresh, '微博正文'].map(str).str.strip().tolist()
+                seen.update(ids)
+                written += len(ids)
+
+                # 跳过标签库中已用同一 prompt 打过标的微博 / Skip posts already labeled under the same prompt
+                if store is not None:
+                    labeled = store.labeled_ids([i.strip() for i in ids], labels_hash)
+                    if labeled:
+                        keep = [i.strip() not in labeled for i in ids]
+                        ids = [i for i, k in zip(ids, keep) if k]
+                        contents = [c for c, k in zip(contents, keep) if k]
+                        skipped_labeled += len(keep) - len(ids)
+
+                id_rows = []
+                for raw_id, content in zip(ids, contents):
+                    post_id = raw_id.strip()
+                    if pack_size == 1:
+                        user_content = USER_MESSAGE_PREFIX + content
+                        est_tokens += len(system_prompt) + len(user_content)
+                        shard = writer.write(post_id, head + encode(post_id) + middle + encode(user_content) + tail)
+                        id_rows.append((post_id, post_id, shard))
+                        requests_written += 1
+                    else:
+                        pending.append((post_id, content))
+                        if len(pending) == pack_size:
+                            id_rows.extend(emit(pending))
+                            pending = []
+                ids_writer.writerows(id_rows)
+                print(f"  已处理 {written} 条微博，生成 {requests_written} 条请求 / "
+                      f"{written} posts, {requests_written} requests")
+
+            if pending:
+                ids_writer.writerows(emit(pending))
+
+        writer.close()
+        posts = written - skipped_labeled
+        total_bytes = sum(shard['bytes'] for shard in writer.shards)
+        manifest = {
+            'source_csv': csv_file,
+            'prompt_file': prompt_file,
+            'prompt_hash': labels_hash,
+            'model': model_name,
+            'compressed': compress,
+            'pack_size': pack_size,
+            'total_rows': total_rows,
+            'total_posts': posts,
+            'total_requests': requests_written,
+            'duplicates_removed': total_rows - written,
+            'skipped_labeled': skipped_labeled,
+            'bytes_per_post': round(total_bytes / posts, 1) if posts else 0,
+            'est_tokens_per_post': round(est_tokens / posts, 1) if posts else 0,
+            'ids_file': os.path.basename(ids_file),
+            'shards': writer.shards,
+        }
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        print(f"\n[OK] 共 {posts} 条微博、{requests_written} 条请求，写入 {len(writer.shards)} 个分片")
+        print(f"[OK] {posts} posts in {requests_written} requests written to {len(writer.shards)} shard(s)")
+        if store is not None:
+            print(f"  标签库中已有、跳过 / Skipped, already in label store: {skipped_labeled}")
+        print(f"  每条微博平均 {manifest['bytes_per_post']} 字节，估算输入 {manifest['est_tokens_per_post']} tokens "
+              f"(K={pack_size})")
+        print(f"  Per post: {manifest['bytes_per_post']} bytes, ~{manifest['est_tokens_per_post']} input tokens "
+              f"(K={pack_size})")
+        for shard in writer.shards:
+            print(f"  {shard['file']}: {shard['lines']} 行 / lines, {shard['bytes'] / 1024 / 1024:.1f} MB")
+        print(f"  清单 / Manifest: {manifest_file}")
+        return manifest
+
+    except Exception as e:
+        print(f"[ERROR] 生成失败 / Generation failed: {e}")
+        print(f"[ERROR] {e}")
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+        if store is not None:
+            store.close()
+
+
 if __name__ == '__main__':
     # 示例使用 / Example usage
     print("=" * 60)
@@ -131,7 +463,11 @@ if __name__ == '__main__':
     print("=" * 60)
     
     # 生成 batch_list.jsonl / Generate batch_list.jsonl
-    count = generate_batch_list()
+    if settings.BATCH_STREAMING or settings.BATCH_PACK_SIZE > 1:
+        manifest = generate_batch_list_streaming()
+        count = manifest['total_requests'] if manifest else None
+    else:
+        count = generate_batch_list()
     
     if count:
         print(f"\n✓ 成功生成 {count} 条批量推理请求")
@@ -0,0 +1,326 @@
+"""
+LLM 调用吞吐基准
+LLM throughput benchmark
+
+启动本地桩服务（见 stub_server.py），把 summary.main、test_labeling 和批量结果处理流程指向它，
+报告吞吐、客户端 p50/p95 延迟和重试次数。所有输入输出都写在临时目录中，不访问网络。
+Starts the local stand-in server (see stub_server.py), points summary.main, test_labeling and the batch
+result pipeline at it, and reports throughput, client-side p50/p95 latency and retry counts.
+All inputs and outputs live in a temporary directory; no network access is needed.
+
+用法 Usage:
+    python -m analyzer.benchmark --workloads summary labeling batch --concurrency 8 \\
+        --latency-ms 300 --error-rate 0.05 --rate-limit-rate 0.05 --output bench.json
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import random
+import tempfile
+import time
+
+from . import settings
+from .metrics import percentile
+from .stub_server import StubConfig, StubServer, LATENCY_DISTRIBUTIONS
+
+WORKLOADS = ('summary', 'labeling', 'batch')
+
+_PHRASES = [
+    '今天看到这个消息真的很震惊', '支持官方尽快调查清楚', '这件事情反转太多了',
+    '希望大家理性讨论不要网暴', '哥哥的新剧太好看了', '又是资本在操纵热搜吧',
+    '吃瓜群众表示看不懂', '作为当地人说几句实话', '这种行为必须严惩', '期待后续进展',
+]
+
+
+def synthetic_posts(n, n_keywords=10, seed=0):
+    """
+    生成带话题标签的合成微博（关键词、id、微博正文）
+    Generate synthetic posts with topic tags (关键词, id, 微博正文)
+    """
+    import pandas as pd
+
+    rng = random.Random(seed)
+    keywords = [f"热搜话题{i + 1}" for i in range(n_keywords)]
+    rows = []
+    for i in range(n):
+        kw = keywords[i % n_keywords]
+        body = '，'.join(rng.choice(_PHRASES) for _ in range(rng.randint(2, 6)))
+        rows.append({'关键词': kw, 'id': f"{5000000000000000 + i}", '微博正文': f"#{kw}# {body}。"})
+    return pd.DataFrame(rows)
+
+
+class CallRecorder:
+    """记录客户端视角的每次调用 / Record every call as seen by the client"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    def summary(self, wall):
+        calls = len(self.latencies)
+        return {
+            'calls': calls,
+            'client_errors': self.errors,
+            'throughput_calls_per_s': round(calls / wall, 3) if wall else None,
+            'latency_p50_ms': _round(percentile(self.latencies, 50)),
+            'latency_p95_ms': _round(percentile(self.latencies, 95)),
+        }
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def instrument(client, recorder):
+    """
+    包装客户端的 chat.completions.create，记录延迟和异常（异常仍会抛给调用方，由其重试）
+    Wrap chat.completions.create to record latency and failures (failures still propagate so the caller retries)
+    """
+    from openai import AsyncOpenAI
+
+    create = client.chat.completions.create
+    # 按客户端类型选择包装：AsyncOpenAI 的 create 不是协程函数（iscoroutinefunction 为 False），
+    # 但返回协程，必须等待完成后再计时
+    # Pick the wrapper by client type: AsyncOpenAI's create is not a coroutine function but returns
+    # a coroutine, so timing has to wrap the await
+    if isinstance(client, AsyncOpenAI):
+        @functools.wraps(create)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await create(*args, **kwargs)
+            except Exception:
+                recorder.errors += 1
+                raise
+            finally:
+                recorder.latencies.append((time.perf_counter() - start) * 1000)
+    else:
+        @functools.wraps(create)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return create(*args, **kwargs)
+            except Exception:
+                recorder.errors += 1
+                raise
+            finally:
+                recorder.latencies.append((time.perf_counter() - start) * 1000)
+    client.chat.completions.create = timed
+    return client
+
+
+@contextlib.contextmanager
+def patched(obj, **values):
+    """临时替换属性，退出时恢复 / Temporarily override attributes, restored on exit"""
+    old = {name: getattr(obj, name) for name in values}
+    for name, value in values.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            setattr(obj, name, value)
+
+
+def run_summary(server, workdir, recorder, n_posts, n_keywords):
+    from . import summary
+
+    input_file = os.path.join(workdir, 'context_posts.csv')
+    synthetic_posts(n_posts, n_keywords)[['关键词', '微博正文']].to_csv(input_file, index=False, encoding='utf-8-sig')
+    sync_client = instrument(summary.OpenAI(api_key=settings.API_KEY, base_url=server.base_url), recorder)
+    real_async = summary.AsyncOpenAI
+    async_factory = lambda **kw: instrument(real_async(**kw), recorder)
+    with patched(settings, BASE_URL=server.base_url, INPUT_FILE=input_file,
+                 OUTPUT_STAGE1_CSV=os.path.join(workdir, 'stage1.csv'),
+                 OUTPUT_STAGE2_MD=os.path.join(workdir, 'stage2.md'),
+                 OUTPUT_FINAL_CONTEXT=os.path.join(workdir, 'final_context.txt'),
+                 OUTPUT_STAGE1_SELECTION_CSV=os.path.join(workdir, 'stage1_selected_posts.csv')), \
+            patched(summary, client=sync_client), \
+            patched(summary, AsyncOpenAI=async_factory):
+        summary.main()
+    return {}
+
+
+def run_labeling(server, workdir, recorder, n_posts, n_keywords):
+    from . import labeling_testing
+
+    csv_file = os.path.join(workdir, 'label_posts.csv')
+    synthetic_posts(n_posts, n_keywords)[['id', '微博正文']].to_csv(csv_file, index=False, header=False)
+    real_openai = labeling_testing.OpenAI
+    factory = lambda **kw: instrument(real_openai(**kw), recorder)
+    with patched(settings, BASE_URL=server.base_url), patched(labeling_testing, OpenAI=factory):
+        labeling_testing.test_labeling(
+            csv_file=csv_file, n=n_posts,
+            output_file=os.path.join(workdir, 'labeling_results.csv'),
+        )
+    return {}
+
+
+def run_batch(server, workdir, recorder, n_posts, n_keywords):
+    """
+    批量推理流程：生成请求 → 桩服务离线生成结果 → 下载 → 关联 → 展开，分别计时
+    Batch pipeline: generate requests → fake results offline with the stub → download → join → expand, timed per step
+    """
+    from .batch_generator import generate_batch_list_streaming, ids_file_for
+    from .result_download_and_conversion import (
+        download_batch_results, process_batch_results, process_batch_results_streaming, expand_labels,
+    )
+
+    csv_file = os.path.join(workdir, 'post_list.csv')
+    synthetic_posts(n_posts, n_keywords)[['id', '微博正文']].to_csv(csv_file, index=False)
+    batch_file = os.path.join(workdir, 'batch_list.jsonl')
+    steps = {}
+
+    start = time.perf_counter()
+    manifest = generate_batch_list_streaming(csv_file=csv_file, output_file=batch_file, compress=False)
+    steps['generate_s'] = round(time.perf_counter() - start, 3)
+
+    lines = []
+    for shard in manifest['shards']:
+        with open(os.path.join(workdir, shard['file']), 'r', encoding='utf-8') as f:
+            for line in f:
+                request = json.loads(line)
+                completion = server.completion(request['body'], server.respond(request['body']))
+                lines.append(json.dumps({
+                    'custom_id': request['custom_id'],
+                    'response': {'status_code': 200, 'body': completion},
+                }, ensure_ascii=False))
+    url = server.add_file('batch_results.jsonl', ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    raw_file = os.path.join(workdir, 'batch_results_raw.jsonl')
+    start = time.perf_counter()
+    download_batch_results(url, raw_file)
+    steps['download_s'] = round(time.perf_counter() - start, 3)
+
+    final_csv = os.path.join(workdir, 'batch_results_final.csv')
+    process = process_batch_results_streaming if settings.RESULT_STREAMING else process_batch_results
+    start = time.perf_counter()
+    process(raw_file, csv_file, final_csv, ids_file=ids_file_for(batch_file))
+    steps['process_s'] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    expand_labels(final_csv, os.path.join(workdir, 'batch_results_final_expanded.csv'))
+    steps['expand_s'] = round(time.perf_counter() - start, 3)
+    steps['posts_per_s'] = round(n_posts / sum(v for k, v in steps.items() if k.endswith('_s')), 1)
+    return steps
+
+
+RUNNERS = {'summary': run_summary, 'labeling': run_labeling, 'batch': run_batch}
+
+
+def run_benchmark(workloads=WORKLOADS, config=None, concurrency=None, cache_mode='bypass', repeat=1,
+                  summary_posts=200, summary_keywords=10, label_posts=50, batch_posts=5000):
+    """
+    运行基准并返回结果 dict
+    Run the benchmark and return a result dict
+
+    参数 Parameters:
+    - workloads: 要运行的负载 / Workloads to run ('summary', 'labeling', 'batch')
+    - config: StubConfig（默认 200ms lognormal，无错误注入）/ Stub configuration
+    - concurrency: 阶段一并发数（覆盖 settings.STAGE1_CONCURRENCY）/ Stage 1 concurrency override
+    - cache_mode: LLM 缓存模式，'use' 时缓存放在临时目录，配合 repeat 观察缓存效果 /
+      LLM cache mode; with 'use' the cache lives in the temp dir, combine with repeat to see its effect
+    - repeat: 每个负载重复次数 / Runs per workload
+    """
+    config = config or StubConfig()
+    server = StubServer(config).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir, \
+                patched(settings, LLM_CACHE_MODE=cache_mode,
+                        LLM_CACHE_PATH=os.path.join(workdir, 'llm_cache.sqlite'),
+                        LABEL_STORE_PATH=None,
+                        STAGE1_CONCURRENCY=concurrency or settings.STAGE1_CONCURRENCY):
+            # 关闭标签库：合成 id 不应被用户真实标签库跳过，桩标签也不能写入其中
+            # The label store is disabled: synthetic ids must not be skipped by the user's real store,
+            # and stub labels must never be written into it
+            sizes = {
+                'summary': (summary_posts, summary_keywords),
+                'labeling': (label_posts, summary_keywords),
+                'batch': (batch_posts, summary_keywords),
+            }
+            for workload in workloads:
+                for run in range(1, repeat + 1):
+                    server.reset_stats()
+                    recorder = CallRecorder()
+                    start = time.perf_counter()
+                    extra = RUNNERS[workload](server, workdir, recorder, *sizes[workload])
+                    wall = time.perf_counter() - start
+                    server_stats = server.stats()
+                    retries = sum(count for status, count in server_stats['status'].items() if status != '200')
+                    entry = {'workload': workload, 'run': run, 'wall_s': round(wall, 3)}
+                    entry.update(recorder.summary(wall))
+                    entry['retries'] = retries
+                    entry['server'] = server_stats
+                    if extra:
+                        entry['steps'] = extra
+                    results.append(entry)
+    finally:
+        server.stop()
+    return {
+        'config': {
+            'latency_ms': config.latency_ms,
+            'latency_dist': config.latency_dist,
+            'error_rate': config.error_rate,
+            'rate_limit_rate': config.rate_limit_rate,
+            'rpm': config.rpm,
+            'concurrency': concurrency or settings.STAGE1_CONCURRENCY,
+            'cache_mode': cache_mode,
+        },
+        'results': results,
+    }
+
+
+def print_report(report):
+    print("\n" + "=" * 70)
+    print("LLM 基准结果 / LLM benchmark results")
+    print("=" * 70)
+    for entry in report['results']:
+        print(f"[{entry['workload']} #{entry['run']}] {entry['wall_s']}s, "
+              f"{entry['calls']} 次调用 / calls, {entry['throughput_calls_per_s']} calls/s, "
+              f"p50 {entry['latency_p50_ms']} ms, p95 {entry['latency_p95_ms']} ms, "
+              f"重试 / retries {entry['retries']}")
+        if entry.get('steps'):
+            print("    " + ", ".join(f"{k}={v}" for k, v in entry['steps'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM 调用吞吐基准 / LLM throughput benchmark')
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument('--concurrency', type=int, default=None, help='阶段一并发数 / Stage 1 concurrency')
+    parser.add_argument('--cache', choices=['bypass', 'use'], default='bypass', help='LLM 缓存模式 / LLM cache mode')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--summary-posts', type=int, default=200)
+    parser.add_argument('--keywords', type=int, default=10)
+    parser.add_argument('--label-posts', type=int, default=50)
+    parser.add_argument('--batch-posts', type=int, default=5000)
+    parser.add_argument('--output', default=None, help='保存 JSON 结果的路径 / Path for the JSON report')
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, rpm=args.rpm, seed=args.seed,
+    )
+    report = run_benchmark(
+        workloads=args.workloads, config=config, concurrency=args.concurrency, cache_mode=args.cache,
+        repeat=args.repeat, summary_posts=args.summary_posts, summary_keywords=args.keywords,
+        label_posts=args.label_posts, batch_posts=args.batch_posts,
+    )
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 / Report saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+微博打标系统 - 标签结构定义与批量展开
+Weibo Labeling System - Label schema and bulk expansion
+
+LABEL_SCHEMA 与 labeling_prompt.txt 中要求输出的字段一一对应：枚举字段展开为 category 列，
+数值字段展开为数值列，文本字段展开为 string 列。无法解析的行写入 label_error 列，不会中断整个展开过程。
+LABEL_SCHEMA mirrors the fields requested in labeling_prompt.txt: enum fields become categorical
+columns, numeric fields numeric columns and text fields string columns. Rows that cannot be parsed
+are reported in a label_error column instead of aborting the whole expansion.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # 可选依赖，未安装时退回标准库 / Optional dependency, falls back to stdlib
+    _json_loads = json.loads
+
+# 字段类型 Field types:
+# - {'type': 'category', 'values': [...]}: 枚举值 / Enum values
+# - {'type': 'float'} / {'type': 'int'}: 数值（如置信度分数）/ Numeric, e.g. scores
+# - {'type': 'text'}: 自由文本 / Free text
+LABEL_SCHEMA = {
+    'validity': {
+        'type': 'category',
+        'values': ['general', 'stanning_and_other_spamming', 'noise', '无意义-噪音'],
+    },
+    'stance': {
+        'type': 'category',
+        'values': ['support', 'oppose', 'neutral', 'no_clear_stance', 'irrelevant', 'uncertian', 'uncertain'],
+    },
+    'emotion_category': {
+        'type': 'category',
+        'values': ['anger', 'disgust', 'annoyance', 'like', 'sadness', 'happiness', 'fear', 'surprise',
+                   'none', 'uncertain'],
+    },
+    'emotion_subtype': {
+        'type': 'category',
+        'values': ['personal_anger', 'moral_outrage', 'fury',
+                   'physical_disgust', 'moral_contempt', 'rejection',
+                   'idol_doration', 'simple_liking', 'admiration', 'solidarity',
+                   'annoyance',
+                   'disappointed', 'empathy', 'grieve', 'hopeless',
+                   'simple_happy', 'pride', 'gloat', 'looking_forward_and_hope',
+                   'anxious', 'fear', 'concerned',
+                   'astounded', 'happily_surprised', 'shock',
+                   'general'],
+    },
+    'target': {
+        'type': 'category',
+        'values': ['person', 'outfit_or_appearance', 'action', 'opinion', 'group_or_organization',
+                   'works_or_creations', 'scenery', 'others'],
+    },
+    'mf_main': {
+        'type': 'category',
+        'values': ['care_vs_harm', 'fairness_vs_cheating', 'loyalty_vs_betrayal', 'authority_vs_subversion',
+                   'sanctity_vs_degradation', 'none', 'uncertain'],
+    },
+    'mf_direction': {
+        'type': 'category',
+        'values': ['care', 'harm', 'fairness', 'cheating', 'loyalty', 'betrayal', 'authority', 'subversion',
+                   'sanctity', 'degradation', 'none', 'uncertain'],
+    },
+    'reasoning': {'type': 'text'},
+}
+
+BULK_CHUNK = 10000  # 每次整体解析的行数 / Rows parsed together in one call
+
+
+def _parse_one(text):
+    """解析单行标签，返回 (dict 或 None, 错误信息) / Parse one label, returns (dict or None, error)"""
+    if not isinstance(text, str) or not text.strip():
+        return None, 'empty'
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    try:
+        value = _json_loads(text)
+    except ValueError as e:
+        return None, f"invalid json: {str(e)[:60]}"
+    if not isinstance(value, dict):
+        return None, 'not an object'
+    return value, ''
+
+
+def parse_labels(labels):
+    """
+    批量解析标签 JSON：每 BULK_CHUNK 行拼成一个 JSON 数组一次解析，
+    该块中有格式错误时才退回逐行解析，并记录每行的错误。
+    Parse label JSON in bulk: every BULK_CHUNK rows are joined into one JSON array and parsed at once;
+    only a chunk containing a malformed row falls back to per-row parsing with per-row errors.
+
+    返回 Returns:
+    - (list of dict or None, list of str)
+    """
+    labels = list(labels)
+    parsed, errors = [], []
+    for start in range(0, len(labels), BULK_CHUNK):
+        chunk = labels[start:start + BULK_CHUNK]
+        values = None
+        if all(isinstance(x, str) and x.lstrip().startswith('{') for x in chunk):
+            try:
+                values = _json_loads('[' + ','.join(chunk) + ']')
+            except ValueError:
+                values = None
+        if values is not None and len(values) == len(chunk) and all(isinstance(v, dict) for v in values):
+            parsed.extend(values)
+            errors.extend([''] * len(chunk))
+            continue
+        for text in chunk:
+            value, error = _parse_one(text)
+            parsed.append(value)
+            errors.append(error)
+    return parsed, errors
+
+
+def expand_label_frame(df, schema=None, label_column='label', keep_columns=('id', 'content')):
+    """
+    按标签结构把 label 列展开为带类型的列
+    Expand the label column into typed columns according to the schema
+
+    参数 Parameters:
+    - df: 含 label 列的 DataFrame / DataFrame with a label column
+    - schema: 标签结构（默认 LABEL_SCHEMA）/ Label schema (default LABEL_SCHEMA)
+    - label_column: 标签 JSON 所在列 / Column holding the label JSON
+    - keep_columns: 原样保留的列（不存在的列自动跳过）/ Columns carried over as-is (missing ones are skipped)
+
+    返回 Returns:
+    - DataFrame: keep_columns + 结构中的字段 + label_error / keep_columns + schema fields + label_error
+    """
+    import pandas as pd
+
+    if schema is None:
+        schema = LABEL_SCHEMA
+    parsed, errors = parse_labels(df[label_column].tolist())
+    empty = {}
+    rows = [p if p is not None else empty for p in parsed]
+
+    out = df[[c for c in keep_columns if c in df.columns]].reset_index(drop=True).copy()
+    for field, spec in schema.items():
+        raw = pd.Series([r.get(field) for r in rows], dtype=object)
+        kind = spec['type']
+        if kind == 'category':
+            declared = list(spec['values'])
+            observed = raw.dropna().astype(str)
+            unexpected = observed[~observed.isin(declared)]
+            for idx in unexpected.index:
+                note = f"{field}={unexpected[idx]!r} not in schema"
+                errors[idx] = f"{errors[idx]}; {note}" if errors[idx] else note
+            # 保留结构外的取值（追加为新类别），避免丢失数据 / Keep out-of-schema values as extra categories
+            extra = sorted(set(unexpected))
+            out[field] = pd.Categorical(raw.where(raw.isna(), raw.astype(str)), categories=declared + extra)
+        elif kind in ('float', 'int'):
+            numeric = pd.to_numeric(raw, errors='coerce')
+            bad = numeric.isna() & raw.notna()
+            for idx in bad[bad].index:
+                note = f"{field}={raw[idx]!r} not numeric"
+                errors[idx] = f"{errors[idx]}; {note}" if errors[idx] else note
+            out[field] = numeric.astype('Int64') if kind == 'int' else numeric.astype('float64')
+        else:
+            out[field] = raw.astype('string')
+    out['label_error'] = pd.Series(errors, dtype='string')
+    return out
+
+
+def write_expanded(df, output_path, output_format=None):
+    """
+    保存展开结果，output_format 为 'parquet' 时写 Parquet（需要 pyarrow），否则写 CSV
+    Save the expanded frame; 'parquet' writes Parquet (requires pyarrow), anything else writes CSV
+
+    返回 Returns:
+    - 实际写入的路径 / The path actually written
+    """
+    if output_format is None:
+        output_format = 'parquet' if output_path.endswith('.parquet') else 'csv'
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    if output_format == 'parquet':
+        if not output_path.endswith('.parquet'):
+            output_path = os.path.splitext(output_path)[0] + '.parquet'
+        df.to_parquet(output_path, index=False)
+    else:
+        df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    return output_path
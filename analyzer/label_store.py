@@ -0,0 +1,136 @@
+"""
+微博打标系统 - 持久化标签库
+Weibo Labeling System - Persistent label store
+
+以微博 id 为键，把每次批量推理得到的有效标签保存在本地 SQLite 中，并记录打标时所用 prompt 的哈希。
+生成批量请求时跳过已用同一 prompt 打过标的微博，只为新微博（或 prompt 变化后的旧微博）生成请求。
+Valid labels from every batch run are kept in a local SQLite file keyed by post id, together with the
+hash of the prompt they were produced with. Batch generation skips posts already labeled under the same
+prompt, so only new posts (or posts labeled under an older prompt) are sent again.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from . import settings
+from .label_schema import parse_labels
+
+QUERY_BATCH = 500  # 每条 IN 查询的 id 数（低于 SQLite 变量上限）/ Ids per IN query (below SQLite's variable limit)
+
+
+def prompt_hash(prompt_text):
+    """打标 prompt 的哈希 / Hash of the labeling prompt"""
+    return hashlib.sha256(prompt_text.encode('utf-8')).hexdigest()
+
+
+def file_prompt_hash(prompt_file):
+    """prompt 文件内容的哈希 / Hash of a prompt file's content"""
+    with open(prompt_file, 'r', encoding='utf-8') as f:
+        return prompt_hash(f.read())
+
+
+def batch_prompt_hash(manifest_file, prompt_file='analyzer/prompts/labeling_prompt.txt'):
+    """
+    批量任务生成时所用 prompt 的哈希：优先读取清单中记录的值（prompt 之后可能被 update_labeling_prompt 修改），
+    清单不存在时退回当前 prompt 文件
+    Hash of the prompt a batch was generated with: read from the manifest when present (the prompt may
+    have been rewritten by update_labeling_prompt since), otherwise fall back to the current prompt file
+    """
+    if manifest_file and os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            recorded = json.load(f).get('prompt_hash')
+        if recorded:
+            return recorded
+    return file_prompt_hash(prompt_file)
+
+
+class LabelStore:
+    """
+    基于 SQLite 的标签库
+    SQLite-backed label store
+
+    参数 Parameters:
+    - path: 标签库文件路径 / Store file path
+    """
+
+    def __init__(self, path):
+        store_dir = os.path.dirname(path)
+        if store_dir and not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS labels ('
+            ' post_id TEXT PRIMARY KEY, prompt_hash TEXT NOT NULL, model TEXT,'
+            ' label TEXT NOT NULL, updated REAL NOT NULL) WITHOUT ROWID'
+        )
+        self._conn.commit()
+
+    def labeled_ids(self, ids, prompt_hash):
+        """ids 中已用该 prompt 打过标的 id 集合 / Ids among `ids` already labeled under this prompt"""
+        ids = list(ids)
+        found = set()
+        for start in range(0, len(ids), QUERY_BATCH):
+            part = ids[start:start + QUERY_BATCH]
+            placeholders = ','.join('?' * len(part))
+            found.update(row[0] for row in self._conn.execute(
+                f'SELECT post_id FROM labels WHERE prompt_hash = ? AND post_id IN ({placeholders})',
+                [prompt_hash] + part,
+            ))
+        return found
+
+    def upsert(self, ids, labels, prompt_hash, model=None):
+        """
+        写入（或覆盖）标签，只保存能解析为 JSON 对象的标签，失败的行下次会重新请求
+        Insert or replace labels; only labels that parse as a JSON object are kept, so failed rows are
+        requested again next time
+
+        返回 Returns:
+        - 写入的行数 / Rows written
+        """
+        ids = list(ids)
+        labels = list(labels)
+        _, errors = parse_labels(labels)
+        now = time.time()
+        rows = [
+            (str(post_id), prompt_hash, model, label, now)
+            for post_id, label, error in zip(ids, labels, errors)
+            if not error
+        ]
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO labels (post_id, prompt_hash, model, label, updated) VALUES (?, ?, ?, ?, ?)',
+            rows,
+        )
+        self._conn.commit()
+        return len(rows)
+
+    def export(self, prompt_hash=None):
+        """
+        导出标签库为 DataFrame（id、label），可只导出某个 prompt 下的标签
+        Export the store as a DataFrame (id, label), optionally only labels from one prompt
+        """
+        import pandas as pd
+
+        query = 'SELECT post_id AS id, label FROM labels'
+        params = ()
+        if prompt_hash is not None:
+            query += ' WHERE prompt_hash = ?'
+            params = (prompt_hash,)
+        return pd.read_sql_query(query, self._conn, params=params)
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+def open_store():
+    """按 settings.LABEL_STORE_PATH 打开标签库，未配置时返回 None / Open the store from settings, None if disabled"""
+    if not settings.LABEL_STORE_PATH:
+        return None
+    return LabelStore(settings.LABEL_STORE_PATH)
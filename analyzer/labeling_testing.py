@@ -5,9 +5,11 @@ Weibo Labeling System - Auto-update background knowledge & test labeling effects
 
 import pandas as pd
 from openai import OpenAI
-import json
 import re
 from . import settings
+from .llm_cache import get_cache
+from .metrics import CallTimer, get_metrics, record_success
+from .label_schema import expand_label_frame, write_expanded
 
 
 # ======================
@@ -102,6 +104,8 @@ def test_labeling(csv_file=None, n=None, api_key=None, model_name=None,
         # 初始化客户端 / Initialize OpenAI client
         client = OpenAI(api_key=api_key, base_url=settings.BASE_URL)
         
+        cache = get_cache()
+        metrics = get_metrics()
         results = []
         print(f"\n开始测试 {len(sample_df)} 条微博...")
         print(f"\nTesting {len(sample_df)} posts...")
@@ -115,21 +119,21 @@ def test_labeling(csv_file=None, n=None, api_key=None, model_name=None,
                 {'role': 'user', 'content': f"请对以下微博进行打标：\n{content}"}
             ]
             
+            timer = CallTimer()
+            response = None
             try:
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=messages,
-                    temperature=0.3
-                )
-                label_result = response.choices[0].message.content
-                results.append({
-                    'id': post_id,
-                    'content': content,
-                    'label': label_result
-                })
-                print(f"  [{idx}/{len(sample_df)}] {post_id[:20]}: ✓")
+                label_result = cache.get(model_name, 0.3, messages)
+                if label_result is None:
+                    timer.attempts += 1
+                    response = client.chat.completions.create(
+                        model=model_name,
+                        messages=messages,
+                        temperature=0.3
+                    )
+                    label_result = response.choices[0].message.content
             
             except Exception as e:
+                metrics.record('labeling', label=post_id, timer=timer, error=e)
                 error_msg = str(e)[:30]
                 results.append({
                     'id': post_id,
@@ -137,6 +141,20 @@ def test_labeling(csv_file=None, n=None, api_key=None, model_name=None,
                     'label': f"Error: {error_msg}"
                 })
                 print(f"  [{idx}/{len(sample_df)}] {post_id[:20]}: ✗")
+                continue
+            
+            # 缓存与指标写入失败不影响已拿到的标签 / Cache or metrics failures never discard the label
+            if response is not None:
+                record_success(cache, metrics, 'labeling', post_id, model_name, 0.3, messages,
+                               label_result, timer, response)
+            else:
+                metrics.record('labeling', label=post_id, cached=True)
+            results.append({
+                'id': post_id,
+                'content': content,
+                'label': label_result
+            })
+            print(f"  [{idx}/{len(sample_df)}] {post_id[:20]}: ✓")
         
         # 保存结果 / Save results to CSV
         results_df = pd.DataFrame(results)
@@ -144,13 +162,11 @@ def test_labeling(csv_file=None, n=None, api_key=None, model_name=None,
         
         # 拆解 label 列的 JSON，生成展开后的版本 / Parse JSON in label column and generate expanded version
         try:
-            results_df['label_parsed'] = results_df['label'].apply(lambda x: json.loads(x) if isinstance(x, str) else {})
-            results_expanded = pd.json_normalize(results_df['label_parsed'])
-            results_expanded_df = pd.concat([results_df[['id', 'content']], results_expanded], axis=1)
+            results_expanded_df = expand_label_frame(results_df)
             
             # 生成展开文件名 / Generate expanded file name
             expanded_file = output_file.replace('.csv', '_expanded.csv')
-            results_expanded_df.to_csv(expanded_file, index=False, encoding='utf-8-sig')
+            expanded_file = write_expanded(results_expanded_df, expanded_file, settings.LABEL_EXPANDED_FORMAT)
             
             print(f"✓ 展开版本已保存到 {expanded_file}")
             print(f"✓ Expanded version saved to {expanded_file}")
@@ -158,6 +174,8 @@ def test_labeling(csv_file=None, n=None, api_key=None, model_name=None,
             print(f"⚠ 拆解 JSON 失败: {e}")
             print(f"⚠ Failed to parse JSON: {e}")
         
+        cache.report()
+        metrics.report()
         print(f"\n✓ 测试完成，结果已保存到 {output_file}")
         print(f"✓ Testing complete, results saved to {output_file}")
         return results_df
@@ -0,0 +1,157 @@
+"""
+LLM 响应缓存
+LLM Response Cache
+
+以 (模型, 温度, messages) 的哈希为键，把成功的 API 响应保存在本地 SQLite 中，
+重跑时相同请求直接读取缓存。支持 TTL 过期和按总字节数的 LRU 淘汰。
+Successful API responses are stored in a local SQLite file keyed by a hash of
+(model, temperature, messages), so identical requests are served locally on reruns.
+Supports TTL expiry and size-based LRU eviction.
+
+缓存模式 Cache modes (settings.LLM_CACHE_MODE):
+- 'use': 读写缓存 / Read and write the cache
+- 'refresh': 不读缓存，但用新结果覆盖 / Skip reads, overwrite with fresh responses
+- 'bypass': 完全不使用缓存 / Do not touch the cache at all
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import settings
+
+CACHE_MODES = ('use', 'refresh', 'bypass')
+
+
+def request_key(model, temperature, messages):
+    """请求的缓存键 / Cache key of a request"""
+    payload = json.dumps(
+        {'model': model, 'temperature': temperature, 'messages': messages},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    基于 SQLite 的响应缓存
+    SQLite-backed response cache
+
+    参数 Parameters:
+    - path: 缓存文件路径 / Cache file path
+    - ttl: 过期秒数，None 表示不过期 / Expiry in seconds, None = never
+    - max_bytes: 响应内容总字节上限，None 表示不限 / Total response size cap, None = unlimited
+    - mode: 'use' / 'refresh' / 'bypass'
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=None, mode='use'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"LLM_CACHE_MODE 必须是 {CACHE_MODES} 之一 / must be one of {CACHE_MODES}")
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != 'bypass':
+            cache_dir = os.path.dirname(path)
+            if cache_dir and not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                ' key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,'
+                ' size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            self._conn.commit()
+
+    def get(self, model, temperature, messages):
+        """命中返回响应文本，否则返回 None / Return cached response text or None"""
+        if self.mode != 'use':
+            if self.mode == 'refresh':
+                self.misses += 1
+            return None
+        key = request_key(model, temperature, messages)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, temperature, messages, response):
+        """保存一次成功的响应 / Store one successful response"""
+        if self.mode == 'bypass' or not response:
+            return
+        key = request_key(model, temperature, messages)
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, response, size, now, now),
+            )
+            self._conn.commit()
+            self.writes += 1
+            self._evict()
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+        if self.max_bytes is not None:
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims, freed = [], 0
+                for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+                    victims.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany('DELETE FROM responses WHERE key = ?', victims)
+        self._conn.commit()
+
+    def report(self):
+        """打印本次运行的命中统计 / Print hit/miss counts for this run"""
+        if self.mode == 'bypass':
+            return
+        print(f"🗄️ LLM 缓存 [{self.mode}]: 命中 {self.hits}，未命中 {self.misses}，写入 {self.writes}")
+        print(f"🗄️ LLM cache [{self.mode}]: {self.hits} hits, {self.misses} misses, {self.writes} writes")
+
+
+_cache = None
+
+
+def get_cache():
+    """
+    按 settings 打开（或复用）全局响应缓存
+    Open (or reuse) the process-wide response cache according to settings
+    """
+    global _cache
+    mode = settings.LLM_CACHE_MODE
+    if _cache is None or _cache.path != settings.LLM_CACHE_PATH or _cache.mode != mode:
+        _cache = ResponseCache(
+            settings.LLM_CACHE_PATH,
+            ttl=settings.LLM_CACHE_TTL,
+            max_bytes=settings.LLM_CACHE_MAX_BYTES,
+            mode=mode,
+        )
+    return _cache
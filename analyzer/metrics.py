@@ -0,0 +1,240 @@
+"""
+微博热点分析器 - API 调用指标
+Weibo Hot Topic Analyzer - Per-call API metrics
+
+记录每次模型调用的延迟、重试次数、prompt / completion token 数、错误和缓存命中，
+可逐条写入 JSON lines 文件，或在运行结束时汇总为 Prometheus 文本文件（node_exporter textfile 格式）。
+Records latency, retries, prompt/completion tokens, errors and cache hits for every model call, either
+appended to a JSON lines file as they happen or aggregated into a Prometheus text file at the end of a run.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+from . import settings
+
+METRIC_PREFIX = 'weibo_llm'
+METRICS_FORMATS = ('jsonl', 'prometheus')
+
+
+def percentile(values, q):
+    """线性插值分位数（q 取 0-100）/ Linearly interpolated percentile (q in 0-100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100.0
+    low = int(math.floor(pos))
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def usage_tokens(completion):
+    """从响应中取出 (prompt_tokens, completion_tokens)，服务端未返回时为 None / Token usage of a response"""
+    usage = getattr(completion, 'usage', None)
+    if usage is None:
+        return None, None
+    return getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None)
+
+
+class CallTimer:
+    """
+    记录一次逻辑调用（含重试）的计时器
+    Timer for one logical call including its retries
+
+    用法 Usage:
+        timer = CallTimer()
+        ... timer.attempts += 1 / timer.wait += 限流等待 ...
+        get_metrics().record('completion', label=kw, timer=timer, completion=completion)
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.attempts = 0
+        self.wait = 0.0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+class CallMetrics:
+    """
+    API 调用指标收集器
+    Collector of per-call API metrics
+
+    参数 Parameters:
+    - path: 输出文件路径，None 则只在内存中统计 / Output path, None keeps metrics in memory only
+    - output_format: 'jsonl'（每次调用追加一行）或 'prometheus'（report 时写汇总）
+      / 'jsonl' (one line per call) or 'prometheus' (aggregate written by report)
+    """
+
+    def __init__(self, path=None, output_format='jsonl'):
+        if output_format not in METRICS_FORMATS:
+            raise ValueError(f"METRICS_FORMAT 必须是 {METRICS_FORMATS} 之一 / must be one of {METRICS_FORMATS}")
+        self.path = path
+        self.output_format = output_format
+        self.events = []
+        self._lock = threading.Lock()
+        if path:
+            metrics_dir = os.path.dirname(path)
+            if metrics_dir and not os.path.exists(metrics_dir):
+                os.makedirs(metrics_dir)
+
+    def record(self, kind, label=None, timer=None, completion=None, error=None, cached=False):
+        """
+        记录一次调用
+        Record one call
+
+        参数 Parameters:
+        - kind: 调用类型，如 'completion'、'labeling' / Call kind, e.g. 'completion', 'labeling'
+        - label: 关键词或微博 id 等标识 / Identifier such as the keyword or post id
+        - timer: CallTimer，提供延迟、尝试次数和限流等待 / Provides latency, attempts and limiter wait
+        - completion: 成功时的响应对象，用于读取 token 用量 / Response object for token usage
+        - error: 最终失败时的异常或信息 / Final error, if the call failed
+        - cached: 是否命中响应缓存 / Whether the response came from the cache
+        """
+        prompt_tokens, completion_tokens = usage_tokens(completion)
+        attempts = timer.attempts if timer is not None else (0 if cached else 1)
+        event = {
+            'ts': round(time.time(), 3),
+            'kind': kind,
+            'label': label,
+            'model': settings.MODEL_NAME,
+            'status': 'cached' if cached else ('error' if error is not None else 'ok'),
+            'latency_seconds': round(timer.elapsed, 4) if timer is not None else 0.0,
+            'limiter_wait_seconds': round(timer.wait, 4) if timer is not None else 0.0,
+            'attempts': attempts,
+            'retries': max(attempts - 1, 0),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'error': str(error)[:200] if error is not None else None,
+        }
+        with self._lock:
+            self.events.append(event)
+            if self.path and self.output_format == 'jsonl':
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        return event
+
+    def summary(self):
+        """按调用类型汇总 / Aggregate per call kind"""
+        kinds = {}
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            kinds.setdefault(event['kind'], []).append(event)
+        out = {}
+        for kind, items in kinds.items():
+            called = [e for e in items if e['status'] != 'cached']
+            latencies = [e['latency_seconds'] for e in called]
+            out[kind] = {
+                'calls': len(items),
+                'ok': sum(e['status'] == 'ok' for e in items),
+                'errors': sum(e['status'] == 'error' for e in items),
+                'cached': len(items) - len(called),
+                'retries': sum(e['retries'] for e in items),
+                'prompt_tokens': sum(e['prompt_tokens'] or 0 for e in items),
+                'completion_tokens': sum(e['completion_tokens'] or 0 for e in items),
+                'latency_sum_seconds': sum(latencies),
+                'latency_p50_seconds': percentile(latencies, 50),
+                'latency_p95_seconds': percentile(latencies, 95),
+                'latency_p99_seconds': percentile(latencies, 99),
+            }
+        return out
+
+    def write_prometheus(self, path=None):
+        """把汇总写成 Prometheus 文本格式 / Write the aggregate in Prometheus text format"""
+        path = path or self.path
+        lines = [
+            f"# HELP {METRIC_PREFIX}_calls_total Model calls by outcome",
+            f"# TYPE {METRIC_PREFIX}_calls_total counter",
+        ]
+        summary = self.summary()
+        for kind, s in summary.items():
+            for status, field in (('ok', 'ok'), ('error', 'errors'), ('cached', 'cached')):
+                lines.append(f'{METRIC_PREFIX}_calls_total{{kind="{kind}",status="{status}"}} {s[field]}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_retries_total Retried attempts",
+            f"# TYPE {METRIC_PREFIX}_retries_total counter",
+        ]
+        lines += [f'{METRIC_PREFIX}_retries_total{{kind="{kind}"}} {s["retries"]}' for kind, s in summary.items()]
+        lines += [
+            f"# HELP {METRIC_PREFIX}_tokens_total Tokens reported by the API",
+            f"# TYPE {METRIC_PREFIX}_tokens_total counter",
+        ]
+        for kind, s in summary.items():
+            lines.append(f'{METRIC_PREFIX}_tokens_total{{kind="{kind}",type="prompt"}} {s["prompt_tokens"]}')
+            lines.append(f'{METRIC_PREFIX}_tokens_total{{kind="{kind}",type="completion"}} {s["completion_tokens"]}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_latency_seconds Call latency including retries (cache hits excluded)",
+            f"# TYPE {METRIC_PREFIX}_latency_seconds summary",
+        ]
+        for kind, s in summary.items():
+            for quantile, field in (('0.5', 'latency_p50_seconds'), ('0.95', 'latency_p95_seconds'),
+                                    ('0.99', 'latency_p99_seconds')):
+                if s[field] is not None:
+                    lines.append(f'{METRIC_PREFIX}_latency_seconds{{kind="{kind}",quantile="{quantile}"}} {s[field]:.4f}')
+            lines.append(f'{METRIC_PREFIX}_latency_seconds_sum{{kind="{kind}"}} {s["latency_sum_seconds"]:.4f}')
+            lines.append(f'{METRIC_PREFIX}_latency_seconds_count{{kind="{kind}"}} {s["calls"] - s["cached"]}')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """
+        打印本次运行的调用汇总，Prometheus 格式时同时写出文件
+        Print a per-kind summary of this run; in Prometheus mode also write the file
+        """
+        summary = self.summary()
+        for kind, s in summary.items():
+            p50 = s['latency_p50_seconds']
+            p95 = s['latency_p95_seconds']
+            latency = f"p50 {p50:.2f}s / p95 {p95:.2f}s" if p50 is not None else "-"
+            print(
+                f"📈 [{kind}] 调用 {s['calls']}（成功 {s['ok']}，失败 {s['errors']}，缓存 {s['cached']}），"
+                f"重试 {s['retries']}，tokens {s['prompt_tokens']}+{s['completion_tokens']}，延迟 {latency}"
+            )
+            print(
+                f"📈 [{kind}] {s['calls']} calls ({s['ok']} ok, {s['errors']} failed, {s['cached']} cached), "
+                f"{s['retries']} retries, tokens {s['prompt_tokens']}+{s['completion_tokens']}, latency {latency}"
+            )
+        if self.path and self.output_format == 'prometheus' and summary:
+            self.write_prometheus()
+
+
+_metrics = None
+
+
+def get_metrics():
+    """
+    按 settings 打开（或复用）全局调用指标收集器
+    Open (or reuse) the process-wide call metrics collector according to settings
+    """
+    global _metrics
+    if (_metrics is None or _metrics.path != settings.METRICS_PATH
+            or _metrics.output_format != settings.METRICS_FORMAT):
+        _metrics = CallMetrics(settings.METRICS_PATH, settings.METRICS_FORMAT)
+    return _metrics
+
+
+def record_success(cache, metrics, kind, label, model, temperature, messages, content, timer, completion):
+    """
+    把一次成功的响应写入缓存并记录指标。两者都是本地 I/O，失败时只打印警告：
+    响应已经拿到（且已计费），不应因此重试或丢弃
+    Store one successful response in the cache and record its metrics. Both are local I/O; a failure
+    only prints a warning, since the (already paid for) response must not be retried or discarded
+    """
+    try:
+        cache.put(model, temperature, messages, content)
+    except Exception as e:
+        print(f"⚠️ 写入 LLM 缓存失败，结果仍然有效: {e}")
+        print(f"⚠️ Failed to write the LLM cache, the response is still used: {e}")
+    try:
+        metrics.record(kind, label=label, timer=timer, completion=completion)
+    except Exception as e:
+        print(f"⚠️ 记录调用指标失败: {e}")
+        print(f"⚠️ Failed to record call metrics: {e}")
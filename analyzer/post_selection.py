@@ -0,0 +1,194 @@
+"""
+阶段一代表性微博选择
+Representative post selection for Stage 1
+
+按互动数（互动总数 → 点赞数 → 转发数）从高到低挑选微博，跳过与已选微博近似重复的转发，
+直到填满每个关键词的 token 预算。相比按文件顺序拼接后截断，高互动的微博不会因为排在后面而被丢掉，
+重复转发也不会占满预算。
+Posts are taken in descending engagement order (互动总数 → 点赞数 → 转发数), near-duplicates of
+already selected posts are skipped, and selection stops when the keyword's token budget is full.
+Unlike joining in file order and truncating, high-engagement posts late in the file are kept and
+reposts no longer fill the budget.
+"""
+
+import re
+
+# 判断近似重复前去掉的噪声：转发链、@用户、链接、话题标签、来源标注、标点与表情
+# Noise stripped before near-duplicate checks: repost chains, mentions, links, topic tags, source notes,
+# punctuation and emoji
+_NOISE = re.compile(r'转发微博|//@[^:：\s]*[:：]|@[^\s:：，,。!！?？]+|https?://\S+|#[^#]*#|【来源[^】]*】|[\W_]+')
+
+
+def normalize_text(text):
+    """去掉噪声后的正文，用于近似重复判断 / Post text without noise, used for near-duplicate checks"""
+    return _NOISE.sub('', str(text))
+
+
+def shingles(text, size):
+    """字符 n-gram 集合（短于 n 时为整段文本）/ Set of character n-grams (the whole text when shorter)"""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    已选微博的 n-gram 倒排索引，用于判断新微博是否与其中某条近似重复（Jaccard 相似度）
+    Inverted n-gram index of the selected posts; tells whether a new post near-duplicates one of them
+    (Jaccard similarity)
+    """
+
+    def __init__(self, threshold, shingle_size):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._exact = {}
+        self._sizes = []
+        self._postings = {}
+
+    def match(self, text):
+        """
+        返回与 text 近似重复的已选微博序号，没有则返回 None（同时返回 text 的 n-gram 集合供 add 使用）
+        Return the position of a selected post that text near-duplicates, or None
+        (also returns the shingle set of text for add)
+        """
+        normalized = normalize_text(text)
+        if normalized in self._exact:
+            return self._exact[normalized], normalized, None
+        grams = shingles(normalized, self.shingle_size)
+        overlap = {}
+        for gram in grams:
+            for position in self._postings.get(gram, ()):
+                overlap[position] = overlap.get(position, 0) + 1
+        for position, common in overlap.items():
+            if common / (len(grams) + self._sizes[position] - common) >= self.threshold:
+                return position, normalized, grams
+        return None, normalized, grams
+
+    def add(self, normalized, grams):
+        position = len(self._sizes)
+        self._exact.setdefault(normalized, position)
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(position)
+        return position
+
+
+def rank_posts(df, rank_columns):
+    """
+    按 rank_columns 依次降序排序（缺失的列跳过，非数值按 0），并列时保持原顺序
+    Sort by rank_columns in descending order (missing columns skipped, non-numeric as 0); ties keep file order
+    """
+    import pandas as pd
+
+    columns = [c for c in rank_columns if c in df.columns]
+    if not columns:
+        return df
+    keys = pd.DataFrame({c: pd.to_numeric(df[c], errors='coerce').fillna(0) for c in columns}, index=df.index)
+    return df.loc[keys.sort_values(columns, ascending=False, kind='stable').index]
+
+
+def select_posts(df, token_budget, text_column='微博正文', rank_columns=('互动总数', '点赞数', '转发数'),
+                 similarity_threshold=0.8, shingle_size=3, separator_tokens=0):
+    """
+    在 token 预算内为一个关键词挑选高互动、互不重复的微博
+    Pick high-engagement, mutually distinct posts of one keyword within a token budget
+
+    参数 Parameters:
+    - df: 一个关键词的微博 / Posts of one keyword
+    - token_budget: token 预算（按 estimate_tokens 的口径，约 1 字 1 token）/ Token budget (estimate_tokens units)
+    - text_column: 正文列 / Text column
+    - rank_columns: 排序列，依次降序 / Ranking columns, each descending
+    - similarity_threshold: 与已选微博的 n-gram Jaccard 相似度不低于该值即视为重复 / Jaccard threshold for near-duplicates
+    - shingle_size: 字符 n-gram 长度 / Character n-gram length
+    - separator_tokens: 每条微博额外占用的分隔符 token / Tokens taken by the separator per post
+
+    返回 Returns:
+    - (selected, stats): selected 为选中的行（按排名顺序），另有 '排名'（在全部微博中的名次）、
+      '相似条数'（被跳过的近似重复数）两列；stats 为 {'posts', 'selected', 'duplicates', 'over_budget', 'tokens'}
+      selected holds the chosen rows in rank order plus '排名' (overall rank) and '相似条数'
+      (near-duplicates skipped in its favour); stats summarises the selection
+    """
+    ranked = rank_posts(df, rank_columns)
+    texts = ranked[text_column].astype(str).tolist()
+    index = NearDuplicateIndex(similarity_threshold, shingle_size)
+    chosen, duplicates = [], []
+    remaining = token_budget
+    skipped_duplicates = over_budget = 0
+
+    for position, text in enumerate(texts):
+        cost = len(text) + separator_tokens
+        # 先做代价很低的长度检查，只对放得下的微博判断重复
+        # Cheap length check first; only posts that fit are checked for duplicates
+        if cost > remaining and chosen:
+            over_budget += 1
+            continue
+        match, normalized, grams = index.match(text)
+        if match is not None:
+            duplicates[match] += 1
+            skipped_duplicates += 1
+            continue
+        if grams is None:
+            grams = shingles(normalized, shingle_size)
+        index.add(normalized, grams)
+        chosen.append(position)
+        duplicates.append(0)
+        remaining -= min(cost, remaining)
+
+    selected = ranked.iloc[chosen].copy()
+    selected['排名'] = [p + 1 for p in chosen]
+    selected['相似条数'] = duplicates
+    # 单条微博超出整个预算时截断 / A single post larger than the whole budget is truncated
+    if len(selected) == 1 and len(texts[chosen[0]]) + separator_tokens > token_budget:
+        selected[text_column] = texts[chosen[0]][:max(token_budget - separator_tokens, 0)]
+    stats = {
+        'posts': len(texts),
+        'selected': len(chosen),
+        'duplicates': skipped_duplicates,
+        'over_budget': over_budget,
+        'tokens': token_budget - remaining,
+    }
+    return selected, stats
+
+
+def select_posts_by_keyword(df, token_budget, keyword_column='关键词', text_column='微博正文',
+                            id_column='id', rank_columns=('互动总数', '点赞数', '转发数'),
+                            similarity_threshold=0.8, shingle_size=3, separator_tokens=0, log_path=None):
+    """
+    对每个关键词调用 select_posts，打印选取情况，并把选中的微博 id 写入 log_path
+    Run select_posts for every keyword, print a summary and log the selected post ids to log_path
+
+    返回 Returns:
+    - 选中的微博（按关键词分组、组内按排名），列同 select_posts
+      Selected posts grouped by keyword, in rank order within each keyword
+    """
+    import pandas as pd
+
+    parts = []
+    total_posts = total_selected = 0
+    for kw, group in df.groupby(keyword_column, sort=True):
+        selected, stats = select_posts(
+            group,
+            token_budget,
+            text_column=text_column,
+            rank_columns=rank_columns,
+            similarity_threshold=similarity_threshold,
+            shingle_size=shingle_size,
+            separator_tokens=separator_tokens,
+        )
+        parts.append(selected)
+        total_posts += stats['posts']
+        total_selected += stats['selected']
+        print(f"   -> [{kw}] 选取 {stats['selected']}/{stats['posts']} 条，约 {stats['tokens']} tokens，"
+              f"跳过近似重复 {stats['duplicates']} 条、超出预算 {stats['over_budget']} 条")
+        print(f"   -> [{kw}] selected {stats['selected']}/{stats['posts']} posts (~{stats['tokens']} tokens), "
+              f"skipped {stats['duplicates']} near-duplicate(s) and {stats['over_budget']} over budget")
+
+    selected = pd.concat(parts) if parts else df.iloc[:0].assign(排名=[], 相似条数=[])
+    if log_path:
+        columns = [c for c in (keyword_column, id_column, '排名', '相似条数', *rank_columns) if c in selected.columns]
+        selected[columns].to_csv(log_path, index=False, encoding='utf-8-sig')
+        print(f"📝 已选微博 id 已记录至 {log_path}")
+        print(f"📝 Selected post ids logged to {log_path}")
+    print(f"📊 共选取 {total_selected}/{total_posts} 条微博作为阶段一输入")
+    print(f"📊 Selected {total_selected}/{total_posts} posts as Stage 1 input")
+    return selected
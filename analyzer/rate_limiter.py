@@ -0,0 +1,75 @@
+"""
+异步限流器 (令牌桶)
+Async rate limiter (token bucket)
+
+同时限制每分钟请求数 (RPM) 和每分钟 token 数 (TPM)，用于并发调用 API 时不触发服务端限流。
+Limits both requests per minute (RPM) and tokens per minute (TPM) so concurrent API calls
+stay under the provider's quota.
+"""
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    令牌桶限流器，rpm / tpm 为 None 时不限制对应维度
+    Token-bucket limiter; a None rpm / tpm disables that dimension
+
+    参数 Parameters:
+    - rpm: 每分钟请求数上限 / Max requests per minute
+    - tpm: 每分钟 token 数上限 / Max tokens per minute
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self._buckets = []
+        if rpm:
+            self._buckets.append({'name': 'requests', 'capacity': float(rpm), 'rate': rpm / 60.0})
+        if tpm:
+            self._buckets.append({'name': 'tokens', 'capacity': float(tpm), 'rate': tpm / 60.0})
+        now = time.monotonic()
+        for bucket in self._buckets:
+            bucket['level'] = bucket['capacity']
+            bucket['last'] = now
+        self._lock = asyncio.Lock()
+        self.total_wait = 0.0  # 累计等待秒数 / Accumulated wait time in seconds
+
+    def _refill(self):
+        now = time.monotonic()
+        for bucket in self._buckets:
+            bucket['level'] = min(
+                bucket['capacity'],
+                bucket['level'] + (now - bucket['last']) * bucket['rate'],
+            )
+            bucket['last'] = now
+
+    async def acquire(self, tokens=0):
+        """
+        等待直到可以发出一个估算为 tokens 个 token 的请求
+        Wait until one request of roughly `tokens` tokens may be sent
+        """
+        if not self._buckets:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                for bucket in self._buckets:
+                    need = 1.0 if bucket['name'] == 'requests' else min(float(tokens), bucket['capacity'])
+                    if bucket['level'] < need:
+                        wait = max(wait, (need - bucket['level']) / bucket['rate'])
+                if wait <= 0:
+                    for bucket in self._buckets:
+                        need = 1.0 if bucket['name'] == 'requests' else min(float(tokens), bucket['capacity'])
+                        bucket['level'] -= need
+                    return
+                self.total_wait += wait
+                await asyncio.sleep(wait)
+
+
+def estimate_tokens(messages):
+    """
+    粗略估算消息的 token 数（中文约 1 字 1 token，按字符数计，偏保守）
+    Rough token estimate for messages (about one token per Chinese character; conservative)
+    """
+    return sum(len(m.get('content') or '') for m in messages)
@@ -9,20 +9,86 @@ generate CSV with id, content, label, and support JSON parsing to separate colum
 """
 
 import pandas as pd
+import base64
+import csv
+import gzip
+import hashlib
 import json
 import requests
 import os
+import sqlite3
+import tempfile
+import time
+import urllib3
+from collections import Counter
 from . import settings
+from .batch_generator import PACK_ID_PREFIX, ids_file_for, manifest_file_for
+from .label_store import open_store, batch_prompt_hash
+from .label_schema import expand_label_frame, write_expanded
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # 可选依赖，未安装时退回标准库 / Optional dependency, falls back to stdlib
+    _json_loads = json.loads
 
-def download_batch_results(result_url=None, output_file='analyzer/data/batch_results_raw.jsonl'):
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _scan_file(path, md5=None, chunk_size=1024 * 1024):
+    """
+    统计已下载部分的换行数，并可同时更新 md5（仅续传时需要）
+    Count newlines in an already-downloaded part, optionally feeding an md5 (only needed on resume)
+    """
+    newlines = 0
+    last = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            newlines += block.count(b'\n')
+            last = block[-1:]
+            if md5 is not None:
+                md5.update(block)
+    return newlines, last
+
+
+def _gunzip_file(src, dst, chunk_size=1024 * 1024):
+    """流式解压并统计行数 / Stream-decompress src into dst and count lines"""
+    newlines = 0
+    last = b''
+    with gzip.open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            block = fin.read(chunk_size)
+            if not block:
+                break
+            fout.write(block)
+            newlines += block.count(b'\n')
+            last = block[-1:]
+    return newlines + (1 if last and last != b'\n' else 0)
+
+
+def download_batch_results(result_url=None, output_file='analyzer/data/batch_results_raw.jsonl',
+                           expected_md5=None, chunk_size=None, retries=None):
     """
     从阿里云百炼批量推理 URL 下载结果 JSONL 文件
     Download batch inference result JSONL from Alibaba Bailian URL
     
+    以分块流式方式写入 <output_file>.part，中断后（包括下次运行）通过 HTTP Range 从断点续传；
+    gzip 压缩的结果会在下载完成后流式解压。行数在写入过程中统计，不再二次读取文件。
+    Streams the body in chunks into <output_file>.part and resumes from the break point with HTTP Range
+    after a failure (also across runs); gzip-compressed results are stream-decompressed once complete.
+    Lines are counted while writing instead of re-reading the file.
+    
     参数 Parameters:
     - result_url: 批量推理结果 URL（默认从 settings.RESULT_URL 读取）/ Batch result URL
     - output_file: 保存的原始 JSONL 文件路径 / Path to save raw JSONL
+    - expected_md5: 预期的 md5 十六进制值（可选；未提供时使用响应头 Content-MD5）/
+      Expected md5 hex digest (optional; falls back to the Content-MD5 response header)
+    - chunk_size: 每次读取的字节数（默认 settings.DOWNLOAD_CHUNK_SIZE）/ Bytes per read
+    - retries: 失败后续传的最大次数（默认 settings.DOWNLOAD_RETRIES）/ Max resume attempts after a failure
     
     返回 Returns:
     - 下载成功返回 True，否则返回 False / True if successful, False otherwise
@@ -30,6 +96,13 @@ def download_batch_results(result_url=None, output_file='analyzer/data/batch_res
     
     if result_url is None:
         result_url = settings.RESULT_URL
+    if chunk_size is None:
+        chunk_size = settings.DOWNLOAD_CHUNK_SIZE
+    if retries is None:
+        retries = settings.DOWNLOAD_RETRIES
+    
+    part_file = output_file + '.part'
+    meta_file = part_file + '.json'
     
     try:
         print("正在从阿里云百炼下载批量推理结果...")
@@ -40,16 +113,40 @@ def download_batch_results(result_url=None, output_file='analyzer/data/batch_res
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        # 下载 JSONL 文件 / Download JSONL file
-        response = requests.get(result_url, timeout=30)
-        response.raise_for_status()
+        attempt = 0
+        while True:
+            try:
+                newlines, last, md5, header_md5 = _download_to_part(
+                    result_url, part_file, meta_file, chunk_size, expected_md5
+                )
+                break
+            except (requests.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                wait = min(2 ** attempt, 30)
+                print(f"  [WARN] 下载中断，{wait} 秒后续传 ({attempt}/{retries}) / "
+                      f"Download interrupted, resuming in {wait}s: {e}")
+                time.sleep(wait)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(response.text)
+        # 完整性校验（大小已在下载时校验）/ Integrity check (size is verified while downloading)
+        want_md5 = expected_md5 or header_md5
+        if want_md5 and md5 is not None and md5.hexdigest() != want_md5.lower():
+            os.remove(part_file)
+            os.remove(meta_file)
+            raise IOError(f"md5 校验失败 / md5 mismatch: {md5.hexdigest()} != {want_md5}")
         
-        # 统计行数 / Count lines
-        with open(output_file, 'r', encoding='utf-8') as f:
-            line_count = sum(1 for _ in f)
+        with open(part_file, 'rb') as f:
+            compressed = f.read(2) == GZIP_MAGIC
+        if compressed:
+            print("  检测到 gzip 压缩，正在解压 / gzip payload detected, decompressing")
+            line_count = _gunzip_file(part_file, output_file, chunk_size)
+            os.remove(part_file)
+        else:
+            line_count = newlines + (1 if last and last != b'\n' else 0)
+            os.replace(part_file, output_file)
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
         
         print(f"[OK] 下载完成，包含 {line_count} 条结果")
         print(f"[OK] Download complete with {line_count} results")
@@ -62,9 +159,216 @@ def download_batch_results(result_url=None, output_file='analyzer/data/batch_res
         return False
 
 
+def _download_to_part(result_url, part_file, meta_file, chunk_size, expected_md5):
+    """
+    下载（或续传）到 .part 文件，返回 (换行数, 最后一个字节, md5, 响应头 md5)
+    Download (or resume) into the .part file; returns (newlines, last byte, md5, header md5)
+    """
+    offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    validator = None
+    saved_md5 = None
+    if offset and os.path.exists(meta_file):
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        validator = meta.get('validator')
+        saved_md5 = meta.get('md5')
+    
+    # 保留服务端的原始字节（不自动解码），Range 偏移才与磁盘上的 .part 一致
+    # Keep the raw bytes as served (no transparent decoding) so Range offsets match the .part on disk
+    headers = {}
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+        if validator:
+            headers['If-Range'] = validator
+    
+    with requests.get(result_url, headers=headers, stream=True,
+                      timeout=(10, settings.DOWNLOAD_READ_TIMEOUT)) as response:
+        if offset and response.status_code == 416:
+            # 已经完整下载 / Already complete
+            content_range = response.headers.get('Content-Range', '')
+            total = int(content_range.rsplit('/', 1)[1]) if content_range.rsplit('/', 1)[-1].isdigit() else None
+            if total is None or total == offset:
+                md5 = hashlib.md5() if (expected_md5 or saved_md5) else None
+                newlines, last = _scan_file(part_file, md5, chunk_size)
+                return newlines, last, md5, saved_md5
+            # 本地 .part 比远端文件还大，丢弃后重新下载 / Local part is larger than the remote file; start over
+            os.remove(part_file)
+            raise IOError(f"断点文件无效 / Invalid partial file: {offset} > {total}")
+        response.raise_for_status()
+        
+        if offset and response.status_code == 206:
+            print(f"  从 {offset / 1024 / 1024:.1f} MB 处续传 / Resuming at {offset / 1024 / 1024:.1f} MB")
+            content_range = response.headers.get('Content-Range', '')
+            total_text = content_range.rsplit('/', 1)[-1]
+            total = int(total_text) if total_text.isdigit() else None
+            # 沿用首次完整响应的 Content-MD5 / Reuse the Content-MD5 of the original full response
+            header_md5 = saved_md5
+        else:
+            offset = 0
+            length = response.headers.get('Content-Length')
+            total = int(length) if length else None
+            header_md5 = response.headers.get('Content-MD5')
+            if header_md5:
+                header_md5 = base64.b64decode(header_md5).hex()
+        
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        with open(meta_file, 'w', encoding='utf-8') as f:
+            json.dump({'url': result_url, 'validator': validator, 'md5': header_md5}, f)
+        
+        md5 = hashlib.md5() if (expected_md5 or header_md5 or offset == 0) else None
+        if offset:
+            newlines, last = _scan_file(part_file, md5, chunk_size)
+        else:
+            newlines, last = 0, b''
+        
+        received = offset
+        next_report = received + settings.DOWNLOAD_PROGRESS_BYTES
+        with open(part_file, 'ab' if offset else 'wb') as f:
+            for block in response.raw.stream(chunk_size, decode_content=False):
+                f.write(block)
+                newlines += block.count(b'\n')
+                last = block[-1:] or last
+                if md5 is not None:
+                    md5.update(block)
+                received += len(block)
+                if received >= next_report:
+                    percent = f" ({received / total:.0%})" if total else ''
+                    print(f"  已下载 {received / 1024 / 1024:.1f} MB{percent} / Downloaded {received / 1024 / 1024:.1f} MB{percent}")
+                    next_report = received + settings.DOWNLOAD_PROGRESS_BYTES
+    
+    # 连接提前关闭时大小不足，抛出异常以便续传 / A short body means the connection dropped; raise so it resumes
+    if total is not None and received != total:
+        raise IOError(f"文件大小不符 / Size mismatch: {received} != {total}")
+    return newlines, last, md5, header_md5
+
+
+def extract_message_content(data):
+    """
+    从一行批量推理结果中提取模型输出文本，尝试多个可能的路径
+    Extract the model output from one batch result line, trying several possible paths
+    """
+    message_content = ''
+    
+    # 路径 1: response.body.choices[0].message.content（百炼的实际结构）
+    # Path 1: response.body.choices[0].message.content (Alibaba actual structure)
+    if 'response' in data and isinstance(data['response'], dict):
+        response_obj = data['response']
+        if 'body' in response_obj and isinstance(response_obj['body'], dict):
+            body_obj = response_obj['body']
+            if 'choices' in body_obj and isinstance(body_obj['choices'], list) and len(body_obj['choices']) > 0:
+                choice = body_obj['choices'][0]
+                if isinstance(choice, dict) and 'message' in choice:
+                    message_obj = choice['message']
+                    if isinstance(message_obj, dict) and 'content' in message_obj:
+                        message_content = message_obj['content']
+    
+    # 路径 2: result.message.content（备用）/ Path 2: result.message.content (backup)
+    if not message_content and 'result' in data and isinstance(data['result'], dict):
+        result_obj = data['result']
+        if 'message' in result_obj and isinstance(result_obj['message'], dict):
+            message_content = result_obj['message'].get('content', '')
+    
+    return message_content
+
+
+def load_pack_members(ids_file):
+    """
+    从 id 对照表读取每个打包请求包含的微博 id
+    Read which post ids each packed request carries from the id table
+
+    返回 Returns:
+    - {custom_id: [post_id, ...]}，只包含打包请求 / Only packed requests are included
+    """
+    members = {}
+    table = pd.read_csv(ids_file, dtype=str, usecols=['post_id', 'custom_id'])
+    for post_id, custom_id in zip(table['post_id'], table['custom_id']):
+        if custom_id.startswith(PACK_ID_PREFIX):
+            members.setdefault(custom_id, []).append(post_id)
+    return members
+
+
+def parse_packed_labels(message_content):
+    """
+    解析打包请求返回的 JSON 数组（容忍 ```json 代码块包裹）
+    Parse the JSON array returned for a packed request (tolerates ```json fences)
+    """
+    text = message_content.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    labels = json.loads(text)
+    if not isinstance(labels, list):
+        raise ValueError("打包结果不是 JSON 数组 / Packed result is not a JSON array")
+    return labels
+
+
+def demux_pack(custom_id, message_content, expected_ids, id_content_map, counts=None):
+    """
+    按 id 把一个打包请求的结果拆回单条微博
+    Split the answer of one packed request back into per-post rows
+
+    pack_error 取值 Values:
+    - '': 正常 / OK
+    - 'missing': 请求中有该微博但结果中没有 / Post was sent but not answered
+    - 'extra': 结果中的 id 不属于该请求 / Answered id was not part of the request
+    - 'duplicate': 同一 id 出现多次，保留第一次 / Id answered more than once, first kept
+    - 'parse_error': 整个结果无法解析为数组 / Whole answer could not be parsed
+
+    无法落到任何一行的情况计入 counts / Outcomes that cannot become a row are tallied in counts:
+    - 'no_id': 数组元素缺少 id，已丢弃 / Array item without an id, dropped
+    - 'unparsed': 结果无法解析且没有 id 对照表，整个请求没有产出任何行 /
+      Unparseable answer with no id table, the whole request produced no rows
+
+    参数 Parameters:
+    - expected_ids: 该请求包含的微博 id（未知时为 None，此时无法判断缺失）/ Ids sent, None if unknown
+    - counts: collections.Counter，累计上述计数（可选）/ Counter accumulating the tallies above (optional)
+    """
+    def row(post_id, label, error):
+        return {
+            'id': post_id,
+            'content': id_content_map.get(post_id, ''),
+            'label': label,
+            'pack_error': error,
+        }
+
+    try:
+        labels = parse_packed_labels(message_content)
+    except ValueError:
+        if not expected_ids and counts is not None:
+            counts['unparsed'] += 1
+        return [row(post_id, '', 'parse_error') for post_id in expected_ids or []]
+
+    answered = {}
+    rows_extra = []
+    for item in labels:
+        if not isinstance(item, dict) or 'id' not in item:
+            if counts is not None:
+                counts['no_id'] += 1
+            continue
+        item = dict(item)
+        post_id = str(item.pop('id')).strip()
+        label = json.dumps(item, ensure_ascii=False)
+        if expected_ids is not None and post_id not in expected_ids:
+            rows_extra.append(row(post_id, label, 'extra'))
+        elif post_id in answered:
+            rows_extra.append(row(post_id, label, 'duplicate'))
+        else:
+            answered[post_id] = label
+
+    if expected_ids is None:
+        rows = [row(post_id, label, '') for post_id, label in answered.items()]
+    else:
+        rows = [
+            row(post_id, answered[post_id], '') if post_id in answered else row(post_id, '', 'missing')
+            for post_id in expected_ids
+        ]
+    return rows + rows_extra
+
+
 def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl',
                          csv_file=None,
-                         output_csv='analyzer/data/batch_results_final.csv'):
+                         output_csv='analyzer/data/batch_results_final.csv',
+                         ids_file=None, prompt_hash=None):
     """
     处理批量推理结果 JSONL，与去重后的原始 CSV 关联，生成最终的 id、content、label 三列 CSV
     Process batch inference results JSONL, associate with deduplicated original CSV,
@@ -74,6 +378,17 @@ def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl'
     - raw_jsonl_file: 从百炼下载的原始 JSONL 文件 / Raw JSONL from Alibaba
     - csv_file: 原始 post_list.csv 路径（包含 id 和 微博正文）/ Original post_list.csv
     - output_csv: 输出 CSV 文件路径 / Output CSV file path
+    - ids_file: batch_generator 生成的 id 对照表，用于检查打包请求中缺失的 id /
+      Id table written by batch_generator, used to detect ids missing from packed answers
+    - prompt_hash: 写入标签库时记录的 prompt 哈希（默认为当前 prompt 文件的哈希）/
+      Prompt hash recorded in the label store (default: hash of the current prompt file)
+    
+    配置了 settings.LABEL_STORE_PATH 时，有效标签会写入（覆盖）标签库。
+    When settings.LABEL_STORE_PATH is set, valid labels are upserted into the label store.
+    
+    打包请求（custom_id 以 pack- 开头）的结果会按 id 拆分为多行，并增加 pack_error 列。
+    Answers to packed requests (custom_id starting with pack-) are split into one row per post
+    and a pack_error column is added.
     
     返回 Returns:
     - 处理成功返回 DataFrame，否则返回 None / DataFrame if successful, None otherwise
@@ -103,6 +418,10 @@ def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl'
         # 建立 id->content 映射 / Build id->content mapping
         id_content_map = dict(zip(df_deduped['id'].astype(str), df_deduped['微博正文'].astype(str)))
         
+        pack_members = load_pack_members(ids_file) if ids_file and os.path.exists(ids_file) else {}
+        packed_requests = 0
+        pack_dropped = Counter()
+        
         # 读取百炼返回的 JSONL 结果 / Read Alibaba results JSONL
         # 百炼返回格式：{"custom_id": "...", "result": {"message": {"content": "..."}}, ...}
         results = []
@@ -131,27 +450,17 @@ def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl'
                     # 提取 custom_id (对应原始的 post_id) 和标注结果 / Extract custom_id and labeling result
                     custom_id = str(data.get('custom_id', ''))
                     
-                    # 尝试多个可能的路径来提取标注结果 / Try multiple possible paths to extract label
-                    message_content = ''
-                    
-                    # 路径 1: response.body.choices[0].message.content（百炼的实际结构）
-                    # Path 1: response.body.choices[0].message.content (Alibaba actual structure)
-                    if 'response' in data and isinstance(data['response'], dict):
-                        response_obj = data['response']
-                        if 'body' in response_obj and isinstance(response_obj['body'], dict):
-                            body_obj = response_obj['body']
-                            if 'choices' in body_obj and isinstance(body_obj['choices'], list) and len(body_obj['choices']) > 0:
-                                choice = body_obj['choices'][0]
-                                if isinstance(choice, dict) and 'message' in choice:
-                                    message_obj = choice['message']
-                                    if isinstance(message_obj, dict) and 'content' in message_obj:
-                                        message_content = message_obj['content']
+                    # 提取标注结果 / Extract the label text
+                    message_content = extract_message_content(data)
                     
-                    # 路径 2: result.message.content（备用）/ Path 2: result.message.content (backup)
-                    if not message_content and 'result' in data and isinstance(data['result'], dict):
-                        result_obj = data['result']
-                        if 'message' in result_obj and isinstance(result_obj['message'], dict):
-                            message_content = result_obj['message'].get('content', '')
+                    # 打包请求按 id 拆分 / Demultiplex packed requests by id
+                    if custom_id.startswith(PACK_ID_PREFIX):
+                        packed_requests += 1
+                        results.extend(demux_pack(
+                            custom_id, message_content or '', pack_members.get(custom_id), id_content_map,
+                            pack_dropped,
+                        ))
+                        continue
                     
                     # 从映射表中获取原始微博内容 / Get original post content from mapping
                     content = id_content_map.get(custom_id, '')
@@ -174,10 +483,24 @@ def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl'
                     continue
         
         if not results:
+            if pack_dropped:
+                print(f"  打包结果未产出任何行 / Packed answers produced no rows: {dict(pack_dropped)}")
             raise ValueError("没有成功解析的结果 / No successful results parsed")
         
         # 转换为 DataFrame / Convert to DataFrame
         results_df = pd.DataFrame(results)
+        if packed_requests:
+            results_df['pack_error'] = results_df['pack_error'].fillna('')
+            if not pack_members:
+                print("  [WARN] 未提供 id 对照表，无法检查打包结果中缺失的 id")
+                print("  [WARN] No id table given, ids missing from packed answers cannot be detected")
+            flagged = results_df['pack_error'].value_counts().drop('', errors='ignore')
+            print(f"\n  打包请求 / Packed requests: {packed_requests}")
+            for error, count in flagged.items():
+                print(f"    {error}: {count}")
+            # 没有产出行的情况单独列出 / Outcomes that produced no row are listed separately
+            for error, count in pack_dropped.items():
+                print(f"    {error} (未产出行 / no row): {count}")
         
         # 输出目录检查 / Check output directory
         output_dir = os.path.dirname(output_csv)
@@ -188,6 +511,17 @@ def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl'
         # Save results CSV (same format as labeling_test_results.csv)
         results_df.to_csv(output_csv, index=False, encoding='utf-8-sig')
         
+        # 写入标签库 / Upsert into the label store
+        store = open_store()
+        if store is not None:
+            ok = results_df['pack_error'] == '' if 'pack_error' in results_df.columns else slice(None)
+            stored = store.upsert(
+                results_df.loc[ok, 'id'], results_df.loc[ok, 'label'],
+                prompt_hash or batch_prompt_hash(None), settings.MODEL_NAME,
+            )
+            store.close()
+            print(f"  写入标签库 / Stored in label store: {stored}")
+        
         print(f"\n[OK] 结果已保存到 {output_csv}")
         print(f"[OK] Results saved to {output_csv}")
         print(f"  总行数 / Total rows: {len(results_df)}")
@@ -201,48 +535,250 @@ def process_batch_results(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl'
         return None
 
 
+def build_post_index(csv_file, index_path, ids_file=None, chunksize=None):
+    """
+    把 post_list.csv 分块写入磁盘上的 SQLite 索引（id → 正文），按 id 保留第一次出现的行，
+    与 batch_generator 的去重一致；可同时写入打包请求的 id 对照表。
+    Write post_list.csv in chunks into an on-disk SQLite index (id → content), keeping the first
+    occurrence of each id like batch_generator does; optionally also loads the packed-request id table.
+
+    返回 Returns:
+    - (sqlite3.Connection, 原始行数 / original rows, 去重后行数 / unique rows)
+    """
+    if chunksize is None:
+        chunksize = settings.BATCH_CHUNKSIZE
+    conn = sqlite3.connect(index_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('CREATE TABLE posts (id TEXT PRIMARY KEY, content TEXT) WITHOUT ROWID')
+    conn.execute('CREATE TABLE packs (custom_id TEXT, seq INTEGER, post_id TEXT, PRIMARY KEY (custom_id, seq))'
+                 ' WITHOUT ROWID')
+
+    total_rows = 0
+    for chunk in pd.read_csv(csv_file, chunksize=chunksize, dtype={'id': str}):
+        if 'id' not in chunk.columns or '微博正文' not in chunk.columns:
+            raise ValueError("CSV 文件必须包含 'id' 和 '微博正文' 列")
+        total_rows += len(chunk)
+        conn.executemany(
+            'INSERT OR IGNORE INTO posts (id, content) VALUES (?, ?)',
+            zip(chunk['id'].astype(str), chunk['微博正文'].astype(str)),
+        )
+
+    if ids_file and os.path.exists(ids_file):
+        seq = 0
+        for chunk in pd.read_csv(ids_file, chunksize=chunksize, dtype=str, usecols=['post_id', 'custom_id']):
+            packed = chunk[chunk['custom_id'].str.startswith(PACK_ID_PREFIX)]
+            rows = [(custom_id, seq + i, post_id)
+                    for i, (post_id, custom_id) in enumerate(zip(packed['post_id'], packed['custom_id']))]
+            conn.executemany('INSERT INTO packs (custom_id, seq, post_id) VALUES (?, ?, ?)', rows)
+            seq += len(rows)
+    conn.commit()
+    unique_rows = conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+    return conn, total_rows, unique_rows
+
+
+def _lookup_contents(conn, ids, batch=500):
+    """按批从索引中查询正文 / Fetch contents from the index in batches"""
+    found = {}
+    ids = list(set(ids))
+    for start in range(0, len(ids), batch):
+        part = ids[start:start + batch]
+        placeholders = ','.join('?' * len(part))
+        found.update(conn.execute(f'SELECT id, content FROM posts WHERE id IN ({placeholders})', part))
+    return found
+
+
+def process_batch_results_streaming(raw_jsonl_file='analyzer/data/batch_results_raw.jsonl',
+                                    csv_file=None,
+                                    output_csv='analyzer/data/batch_results_final.csv',
+                                    ids_file=None, batch_size=None, index_path=None, prompt_hash=None):
+    """
+    process_batch_results 的单遍流式版本：逐行解析结果（安装了 orjson 时使用 orjson），
+    通过磁盘上的 SQLite 索引关联正文，按批写出 CSV，内存占用与输入规模无关。
+    输出文件与 process_batch_results 相同。
+    Single-pass streaming version of process_batch_results: parses results line by line (with orjson
+    when installed), joins contents through an on-disk SQLite index and writes the CSV in bounded
+    batches, so memory stays flat regardless of input size. The output file is the same as
+    process_batch_results.
+
+    参数 Parameters:
+    - raw_jsonl_file / csv_file / output_csv / ids_file / prompt_hash: 同 process_batch_results / Same as process_batch_results
+    - batch_size: 每批写出的行数（默认 settings.RESULT_BATCH_SIZE）/ Rows per write batch
+    - index_path: 索引文件路径（默认在输出目录下建临时文件，结束后删除）/
+      Index file path (default: a temporary file next to the output, removed afterwards)
+
+    返回 Returns:
+    - 处理成功返回统计 dict，否则返回 None / Stats dict if successful, None otherwise
+    """
+    if csv_file is None:
+        csv_file = settings.TEST_POST_LIST
+    if batch_size is None:
+        batch_size = settings.RESULT_BATCH_SIZE
+
+    conn = None
+    temp_dir = None
+    store = open_store()
+    if store is not None and prompt_hash is None:
+        prompt_hash = batch_prompt_hash(None)
+    stored = 0
+    try:
+        print("\n正在流式处理批量推理结果...")
+        print("Streaming batch inference results...")
+
+        output_dir = os.path.dirname(output_csv)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        if index_path is None:
+            temp_dir = tempfile.TemporaryDirectory(dir=output_dir or None)
+            index_path = os.path.join(temp_dir.name, 'post_index.sqlite')
+        elif os.path.exists(index_path):
+            os.remove(index_path)
+
+        conn, total_rows, unique_rows = build_post_index(csv_file, index_path, ids_file)
+        has_pack_table = conn.execute('SELECT 1 FROM packs LIMIT 1').fetchone() is not None
+        print(f"  原始 CSV 行数 / Original CSV rows: {total_rows}")
+        print(f"  去重后行数 / Deduplicated rows: {unique_rows}")
+        print(f"  删除重复数 / Duplicates removed: {total_rows - unique_rows}")
+
+        with open(raw_jsonl_file, 'rb') as f:
+            first_line = f.readline()
+            f.seek(0)
+            try:
+                first_id = str(_json_loads(first_line).get('custom_id', '')) if first_line else ''
+            except ValueError:
+                first_id = ''
+            packed = has_pack_table or first_id.startswith(PACK_ID_PREFIX)
+
+            columns = ['id', 'content', 'label'] + (['pack_error'] if packed else [])
+            written = 0
+            error_count = 0
+            packed_requests = 0
+            pack_errors = Counter()
+            pending = []
+
+            with open(output_csv, 'w', encoding='utf-8-sig', newline='') as out:
+                writer = csv.writer(out, lineterminator='\n')
+                writer.writerow(columns)
+
+                def flush():
+                    nonlocal written, stored
+                    contents = _lookup_contents(conn, [row['id'] for row in pending])
+                    for row in pending:
+                        row['content'] = contents.get(row['id'], '')
+                    writer.writerows([[row.get(c, '') for c in columns] for row in pending])
+                    written += len(pending)
+                    if store is not None:
+                        ok = [row for row in pending if not row.get('pack_error')]
+                        stored += store.upsert([row['id'] for row in ok], [row['label'] for row in ok],
+                                               prompt_hash, settings.MODEL_NAME)
+                    pending.clear()
+
+                for idx, line in enumerate(f, 1):
+                    try:
+                        data = _json_loads(line)
+                    except ValueError as e:
+                        error_count += 1
+                        print(f"  行 {idx} JSON 格式错误 / Line {idx} JSON decode error: {e}")
+                        continue
+
+                    custom_id = str(data.get('custom_id', ''))
+                    message_content = extract_message_content(data)
+                    if custom_id.startswith(PACK_ID_PREFIX):
+                        packed_requests += 1
+                        expected = None
+                        if has_pack_table:
+                            expected = [r[0] for r in conn.execute(
+                                'SELECT post_id FROM packs WHERE custom_id = ? ORDER BY seq', (custom_id,)
+                            )] or None
+                        rows = demux_pack(custom_id, message_content or '', expected, {}, pack_errors)
+                        pack_errors.update(row['pack_error'] for row in rows if row['pack_error'])
+                        pending.extend(rows)
+                    else:
+                        pending.append({'id': custom_id, 'label': message_content})
+
+                    if len(pending) >= batch_size:
+                        flush()
+                        print(f"  已处理 {idx} 条结果 / Processed {idx} results")
+                if pending:
+                    flush()
+
+        if not written:
+            raise ValueError("没有成功解析的结果 / No successful results parsed")
+
+        print(f"\n[OK] 结果已保存到 {output_csv}")
+        print(f"[OK] Results saved to {output_csv}")
+        print(f"  总行数 / Total rows: {written}")
+        print(f"  失败 / Failed: {error_count} 条")
+        if packed_requests:
+            print(f"  打包请求 / Packed requests: {packed_requests}")
+            for error, count in pack_errors.items():
+                print(f"    {error}: {count}")
+        if store is not None:
+            print(f"  写入标签库 / Stored in label store: {stored}")
+
+        return {
+            'output_csv': output_csv,
+            'rows': written,
+            'errors': error_count,
+            'packed_requests': packed_requests,
+            'pack_errors': dict(pack_errors),
+            'stored': stored,
+        }
+
+    except Exception as e:
+        print(f"[ERROR] 处理失败 / Processing failed: {e}")
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+        if store is not None:
+            store.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
 def expand_labels(csv_file='analyzer/data/batch_results_final.csv',
-                  output_expanded='analyzer/data/batch_results_final_expanded.csv'):
+                  output_expanded='analyzer/data/batch_results_final_expanded.csv',
+                  output_format=None):
     """
-    将 label 列的 JSON 拆解为单独的列（与 labeling_testing.py 逻辑一致）
-    Parse JSON in label column and generate expanded version (same as labeling_testing.py)
+    按 label_schema.LABEL_SCHEMA 将 label 列的 JSON 拆解为带类型的单独列；
+    无法解析或取值不在结构中的行记录在 label_error 列，不会中断展开
+    Expand the label JSON into typed columns following label_schema.LABEL_SCHEMA; rows that cannot be
+    parsed or carry out-of-schema values are reported in label_error instead of aborting
     
     参数 Parameters:
     - csv_file: 包含 label 列的 CSV 文件 / CSV file with label column
-    - output_expanded: 输出展开后的 CSV 文件 / Output expanded CSV file
+    - output_expanded: 输出展开后的文件 / Output expanded file
+    - output_format: 'csv' 或 'parquet'（默认 settings.LABEL_EXPANDED_FORMAT）/ 'csv' or 'parquet'
     
     返回 Returns:
     - 展开成功返回 DataFrame，否则返回 None / DataFrame if successful, None otherwise
     """
     
+    if output_format is None:
+        output_format = settings.LABEL_EXPANDED_FORMAT
+    
     try:
         print("\n正在拆解标签 JSON...")
         print("Expanding label JSON to separate columns...")
         
         # 读取结果 CSV / Read results CSV
-        df = pd.read_csv(csv_file)
+        df = pd.read_csv(csv_file, dtype={'id': str})
         
         if 'label' not in df.columns:
             raise ValueError("CSV 文件必须包含 'label' 列")
         
-        # 解析 JSON 并展开 / Parse JSON and expand
-        df['label_parsed'] = df['label'].apply(lambda x: json.loads(x) if isinstance(x, str) else {})
-        df_expanded = pd.json_normalize(df['label_parsed'])
-        
-        # 合并 id、content 和展开的标签列 / Merge id, content, and expanded label columns
-        df_final = pd.concat([df[['id', 'content']], df_expanded], axis=1)
-        
-        # 输出目录检查 / Check output directory
-        output_dir = os.path.dirname(output_expanded)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        # 批量解析并按结构展开 / Parse in bulk and expand by schema
+        df_final = expand_label_frame(df, keep_columns=('id', 'content', 'pack_error'))
         
         # 保存展开版本 / Save expanded version
-        df_final.to_csv(output_expanded, index=False, encoding='utf-8-sig')
+        output_expanded = write_expanded(df_final, output_expanded, output_format)
         
+        failed = int((df_final['label_error'] != '').sum())
         print(f"[OK] 展开版本已保存到 {output_expanded}")
         print(f"[OK] Expanded version saved to {output_expanded}")
         print(f"  列数 / Columns: {len(df_final.columns)}")
+        print(f"  label_error 非空行数 / Rows with label_error: {failed}")
         
         return df_final
     
@@ -266,7 +802,12 @@ if __name__ == '__main__':
         exit(1)
     
     # 2. 处理结果并与原始数据关联 / Step 2: Process results and associate with original data
-    results_df = process_batch_results()
+    ids_file = ids_file_for('analyzer/data/batch_list.jsonl')
+    labels_hash = batch_prompt_hash(manifest_file_for('analyzer/data/batch_list.jsonl'))
+    if settings.RESULT_STREAMING:
+        results_df = process_batch_results_streaming(ids_file=ids_file, prompt_hash=labels_hash)
+    else:
+        results_df = process_batch_results(ids_file=ids_file, prompt_hash=labels_hash)
     if results_df is None:
         print("无法继续，请检查结果格式")
         print("Cannot continue, please check result format")
@@ -43,6 +43,48 @@ MAX_TEXT_LENGTH = 25000
 # Retry count on API call failure
 MAX_RETRIES = 3
 
+# 阶段一并发请求数 (1 表示逐个串行调用)
+# Stage 1 concurrent requests (1 = sequential calls)
+STAGE1_CONCURRENCY = 1
+
+# 限流：每分钟请求数 / 每分钟 token 数上限 (None 表示不限制，token 按字符数估算)
+# Rate limits: requests / tokens per minute (None = unlimited; tokens estimated from characters)
+RATE_LIMIT_RPM = None
+RATE_LIMIT_TPM = None
+
+# 分层 Map-Reduce 模式：超长关键词按 CHUNK_BUDGET 切分后并行分析再归并 (不截断)；
+# 阶段二输入超过 STAGE2_BUDGET 时先分层压缩各关键词摘要
+# Hierarchical map-reduce: oversized keywords are split into CHUNK_BUDGET-sized chunks,
+# analysed in parallel and reduced (no truncation); Stage 2 input beyond STAGE2_BUDGET is tree-condensed
+HIERARCHICAL_MODE = False
+CHUNK_BUDGET = 25000  # 每次调用的最大输入字符数 / Max input characters per call
+STAGE2_BUDGET = 60000  # 阶段二摘要的最大字符数 / Max characters of Stage 2 summaries
+
+# 阶段一代表性微博选择：每个关键词按 互动总数 → 点赞数 → 转发数 降序挑选微博，跳过近似重复的转发，
+# 直到填满 token 预算（约 1 字 1 token），代替按文件顺序拼接后截断；选中的微博 id 写入 OUTPUT_STAGE1_SELECTION_CSV
+# Stage 1 representative selection: per keyword, take posts by 互动总数 → 点赞数 → 转发数 (descending),
+# skip near-duplicate reposts and stop at the token budget (about one token per character) instead of
+# joining in file order and truncating; selected post ids are logged to OUTPUT_STAGE1_SELECTION_CSV
+STAGE1_SELECTION = False
+STAGE1_TOKEN_BUDGET = 8000  # 每个关键词的输入 token 预算 / Input token budget per keyword
+STAGE1_RANK_COLUMNS = ['互动总数', '点赞数', '转发数']  # 排序列，缺失的列跳过 / Ranking columns, missing ones skipped
+STAGE1_SIMILARITY_THRESHOLD = 0.8  # 与已选微博的字符 n-gram Jaccard 相似度阈值 / Near-duplicate Jaccard threshold
+STAGE1_SHINGLE_SIZE = 3  # 字符 n-gram 长度 / Character n-gram length
+STAGE1_ID_COLUMN = 'id'  # 微博 id 列 / Post id column
+
+# LLM 响应缓存：'use' 读写缓存，'refresh' 忽略已有缓存并覆盖，'bypass' 不使用缓存（默认，需主动开启）
+# 可用环境变量 LLM_CACHE_MODE 临时覆盖，例如 LLM_CACHE_MODE=use python analyzer/summary.py
+# LLM response cache: 'use' read/write, 'refresh' ignore existing entries and overwrite, 'bypass' disabled (default, opt in)
+# Override per run with the LLM_CACHE_MODE environment variable
+LLM_CACHE_MODE = os.environ.get('LLM_CACHE_MODE', 'bypass')
+LLM_CACHE_PATH = 'analyzer/data/llm_cache.sqlite'
+LLM_CACHE_TTL = 7 * 24 * 3600  # 缓存有效期（秒），None 表示不过期 / Entry lifetime in seconds, None = forever
+LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 缓存总大小上限，超出按 LRU 淘汰 / Size cap, LRU eviction beyond it
+
+# 每次 API 调用的指标（延迟、重试、token、错误）/ Per-call API metrics (latency, retries, tokens, errors)
+METRICS_PATH = None  # 输出文件，None 则只在结束时打印汇总 / Output file, None only prints a summary at the end
+METRICS_FORMAT = 'jsonl'  # 'jsonl' 每次调用一行；'prometheus' 结束时写 textfile 汇总 / One line per call, or a Prometheus textfile
+
 
 # =======================================================
 # 📂 文件路径配置 (File Paths)
@@ -60,16 +102,35 @@ PROMPT_DIR = 'analyzer/prompts'
 PROMPT_SYSTEM_FILE = os.path.join(PROMPT_DIR, 'sys_prompt.txt')
 PROMPT_STAGE1_FILE = os.path.join(PROMPT_DIR, 'keyword_prompt.txt')
 PROMPT_STAGE2_FILE = os.path.join(PROMPT_DIR, 'correlation_prompt.txt')
+PROMPT_KEYWORD_REDUCE_FILE = os.path.join(PROMPT_DIR, 'keyword_reduce_prompt.txt')  # 分层模式：合并分段摘要 / Merge chunk summaries
+PROMPT_SUMMARY_REDUCE_FILE = os.path.join(PROMPT_DIR, 'summary_reduce_prompt.txt')  # 分层模式：压缩阶段二输入 / Condense Stage 2 input
 
 # [输出] 结果保存路径
 # [OUTPUT] Result save path
 OUTPUT_STAGE1_CSV = 'analyzer/data/stage1_keyword_analysis.csv'        # 阶段一结果 / Stage 1 results
 OUTPUT_STAGE2_MD = 'analyzer/data/stage2_correlation_analysis_report.md'   # 阶段二报告 / Stage 2 report
 OUTPUT_FINAL_CONTEXT = 'analyzer/data/final_context_knowledge_base.txt' # 最终生成的背景库 / Final knowledge base
+OUTPUT_STAGE1_SELECTION_CSV = 'analyzer/data/stage1_selected_posts.csv'  # 阶段一选中的微博 id / Post ids selected for Stage 1
 
 TEST_POST_LIST = 'analyzer/data/post_list.csv'  # 用于打标测试的微博列表 / Post list for labeling test
 TEST_SAMPLE_SIZE = 20  # 抽取的测试条数 / Number of test samples
 
+# [批量请求生成] 流式分片模式 / [Batch Generation] Streaming sharded mode
+BATCH_STREAMING = False  # 分块读取 CSV 并写入多个分片文件 / Read CSV in chunks and write numbered shards
+BATCH_CHUNKSIZE = 50000  # 每次读取的 CSV 行数 / CSV rows per chunk
+BATCH_MAX_LINES = 50000  # 每个分片最大请求数 / Max requests per shard
+BATCH_MAX_BYTES = 500 * 1024 * 1024  # 每个分片最大字节数 / Max bytes per shard
+BATCH_GZIP = False  # 分片是否 gzip 压缩 / Gzip shards
+LABEL_STORE_PATH = None  # 持久化标签库路径（如 'analyzer/data/label_store.sqlite'），设置后只为未打标的微博生成请求 / Persistent label store; when set only unlabeled posts are requested
+BATCH_PACK_SIZE = 1  # 每个请求打包的微博条数 K，>1 时共享 system prompt / Posts per request; >1 shares the system prompt
+
 # [批量推理结果] 百炼批量推理的结果下载 URL（带临时访问凭证）
 # [Batch Results] Batch inference result URL from Alibaba Qwen (with temporary credentials)
-RESULT_URL = "your_url"  # 替换为你的批量推理结果 URL / Replace with your batch result URL
\ No newline at end of file
+RESULT_URL = "your_url"  # 替换为你的批量推理结果 URL / Replace with your batch result URL
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 流式下载每次读取的字节数 / Bytes per streamed read
+DOWNLOAD_READ_TIMEOUT = 60  # 两次读取之间的超时秒数（不是整个下载的超时）/ Per-read timeout, not a whole-download timeout
+DOWNLOAD_RETRIES = 5  # 中断后自动续传的次数 / Automatic resume attempts after an interruption
+DOWNLOAD_PROGRESS_BYTES = 50 * 1024 * 1024  # 每下载多少字节打印一次进度 / Print progress every N bytes
+RESULT_STREAMING = False  # 单遍流式处理结果，内存占用恒定 / Single-pass streaming result processing with flat memory
+RESULT_BATCH_SIZE = 10000  # 流式处理每批写出的行数 / Rows per write batch in streaming mode
+LABEL_EXPANDED_FORMAT = 'csv'  # 标签展开文件格式：'csv' 或 'parquet'（需 pyarrow）/ Expanded label format: 'csv' or 'parquet' (needs pyarrow)
\ No newline at end of file
@@ -0,0 +1,377 @@
+"""
+离线 OpenAI 兼容桩服务
+Offline OpenAI-compatible stand-in server
+
+在本地实现 /v1/chat/completions，用于在无网络的情况下对 analyzer 做压测和回归：
+可配置延迟分布、500 错误和 429 限流注入，返回打标 JSON、回显或固定文本。
+Implements /v1/chat/completions locally so analyzer can be load-tested without network access:
+configurable latency distributions, 500 / 429 injection, and labeling JSON, echo or canned responses.
+
+接口 Endpoints:
+- POST /v1/chat/completions: 聊天补全 / Chat completions
+- GET  /stats: 请求数、状态码分布、服务端延迟分位数 / Request counts, status codes, latency percentiles
+- POST /stats/reset: 清空统计 / Reset statistics
+- GET  /files/<name>: 下载通过 add_file 注册的文件（支持 Range）/ Serve files registered with add_file (Range aware)
+
+用法 Usage:
+    python -m analyzer.stub_server --latency-ms 300 --latency-dist lognormal --error-rate 0.02
+然后把 settings.py 中的 BASE_URL 设为启动时打印的地址 / then set BASE_URL in settings.py to the printed address:
+    BASE_URL = "http://127.0.0.1:<端口/port>/v1"
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .batch_generator import PACKED_MESSAGE_PREFIX
+from .label_schema import LABEL_SCHEMA
+from .metrics import percentile
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+RESPONSE_MODES = ('auto', 'label', 'echo', 'canned')
+
+_PACKED_HEAD = PACKED_MESSAGE_PREFIX.split('{n}')[0]
+_PACKED_ID = re.compile(r'^【(.+?)】$', re.M)
+
+
+def fake_label(text):
+    """
+    按正文哈希确定性地生成一条符合 LABEL_SCHEMA 的标签
+    Deterministically build one label that satisfies LABEL_SCHEMA from a hash of the text
+    """
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    label = {}
+    for i, (field, spec) in enumerate(LABEL_SCHEMA.items()):
+        if spec['type'] == 'category':
+            label[field] = spec['values'][digest[i] % len(spec['values'])]
+        elif spec['type'] in ('float', 'int'):
+            label[field] = digest[i] / 255.0 if spec['type'] == 'float' else int(digest[i])
+        else:
+            label[field] = f"桩服务生成的理由 #{digest[:4].hex()}"
+    return label
+
+
+class StubConfig:
+    """
+    桩服务配置
+    Stand-in server configuration
+
+    参数 Parameters:
+    - latency_ms: 延迟中位数/均值（毫秒）/ Median or mean latency in ms
+    - latency_dist: 'fixed' / 'uniform'（0 到 2 倍）/ 'exponential' / 'lognormal'
+    - latency_sigma: lognormal 分布的 sigma / Sigma of the lognormal distribution
+    - error_rate: 返回 500 的概率 / Probability of answering 500
+    - rate_limit_rate: 返回 429 的概率 / Probability of answering 429
+    - rpm: 服务端每分钟请求上限（超出返回 429，None 不限）/ Server-side requests-per-minute cap
+    - retry_after_ms: 429 响应中建议的重试等待 / Suggested retry delay in 429 responses
+    - mode: 'auto'（打标请求返回标签 JSON，其余返回固定文本）/ 'label' / 'echo' / 'canned'
+    - canned: mode 为 canned 或 auto 时返回的文本 / Text returned in canned (and auto) mode
+    - seed: 随机种子，保证可复现 / Random seed for reproducibility
+    """
+
+    def __init__(self, latency_ms=200, latency_dist='lognormal', latency_sigma=0.5, error_rate=0.0,
+                 rate_limit_rate=0.0, rpm=None, retry_after_ms=200, mode='auto',
+                 canned="【桩服务】这是一段固定的分析结果。\n[Stub] This is a canned analysis result.",
+                 seed=0):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist 必须是 {LATENCY_DISTRIBUTIONS} 之一 / must be one of {LATENCY_DISTRIBUTIONS}")
+        if mode not in RESPONSE_MODES:
+            raise ValueError(f"mode 必须是 {RESPONSE_MODES} 之一 / must be one of {RESPONSE_MODES}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.retry_after_ms = retry_after_ms
+        self.mode = mode
+        self.canned = canned
+        self.seed = seed
+
+
+class StubServer:
+    """
+    在后台线程中运行的桩服务
+    Stand-in server running in a background thread
+
+    示例 Example:
+        server = StubServer(StubConfig(latency_ms=50)).start()
+        settings.BASE_URL = server.base_url
+        ...
+        print(server.stats())
+        server.stop()
+    """
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or StubConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._window = []
+        self.reset_stats()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        """供 OpenAI 客户端使用的 base_url / base_url for OpenAI clients"""
+        return self.url + '/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def add_file(self, name, data):
+        """注册一个可通过 /files/<name> 下载的文件 / Register bytes served at /files/<name>"""
+        self._files[name] = data
+        return f"{self.url}/files/{name}"
+
+    # --- 统计 / Statistics ---
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'requests': 0, 'status': {}, 'latencies_ms': [],
+                           'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._stats['latencies_ms'])
+            return {
+                'requests': self._stats['requests'],
+                'status': dict(self._stats['status']),
+                'prompt_tokens': self._stats['prompt_tokens'],
+                'completion_tokens': self._stats['completion_tokens'],
+                'latency_p50_ms': percentile(latencies, 50),
+                'latency_p95_ms': percentile(latencies, 95),
+            }
+
+    def _record(self, status, latency_ms, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['status'][str(status)] = self._stats['status'].get(str(status), 0) + 1
+            self._stats['latencies_ms'].append(latency_ms)
+            self._stats['prompt_tokens'] += prompt_tokens
+            self._stats['completion_tokens'] += completion_tokens
+
+    # --- 行为 / Behaviour ---
+
+    def _sample_latency(self):
+        cfg = self.config
+        with self._lock:
+            if cfg.latency_dist == 'fixed':
+                ms = cfg.latency_ms
+            elif cfg.latency_dist == 'uniform':
+                ms = self._random.uniform(0, 2 * cfg.latency_ms)
+            elif cfg.latency_dist == 'exponential':
+                ms = self._random.expovariate(1.0 / cfg.latency_ms) if cfg.latency_ms else 0
+            else:
+                ms = cfg.latency_ms * math.exp(self._random.gauss(0, cfg.latency_sigma))
+        return ms / 1000.0
+
+    def _inject(self):
+        """决定本次请求是否注入错误，返回状态码或 None / Decide whether to inject an error"""
+        cfg = self.config
+        with self._lock:
+            if cfg.rpm:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 60]
+                if len(self._window) >= cfg.rpm:
+                    return 429
+                self._window.append(now)
+            roll = self._random.random()
+        if roll < cfg.rate_limit_rate:
+            return 429
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            return 500
+        return None
+
+    def respond(self, body):
+        """
+        为一个请求体生成回复文本（也用于离线生成批量推理结果）
+        Build the reply text for one request body (also used to fake batch results offline)
+        """
+        messages = body.get('messages') or []
+        system = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+        user = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        mode = self.config.mode
+        if mode == 'echo':
+            return user
+        if mode == 'canned':
+            return self.config.canned
+        if mode == 'label' or 'validity' in system:
+            if user.startswith(_PACKED_HEAD):
+                parts = _PACKED_ID.split(user)[1:]
+                items = [dict(fake_label(text.strip()), id=post_id) for post_id, text in zip(parts[::2], parts[1::2])]
+                return json.dumps(items, ensure_ascii=False)
+            return json.dumps(fake_label(user), ensure_ascii=False)
+        return self.config.canned
+
+    def completion(self, body, content):
+        """OpenAI 格式的补全响应 / Completion response in OpenAI format"""
+        prompt_tokens = sum(len(m.get('content') or '') for m in body.get('messages') or [])
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(content),
+                'total_tokens': prompt_tokens + len(content),
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    self._send_json(200, server.stats())
+                elif self.path.startswith('/files/'):
+                    self._send_file(self.path[len('/files/'):])
+                elif self.path == '/v1/models':
+                    self._send_json(200, {'object': 'list', 'data': [{'id': 'stub', 'object': 'model'}]})
+                else:
+                    self._send_json(404, {'error': {'message': 'not found'}})
+
+            def do_POST(self):
+                if self.path == '/stats/reset':
+                    server.reset_stats()
+                    self._send_json(200, {'ok': True})
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': 'not found'}})
+                    return
+                start = time.monotonic()
+                try:
+                    body = self._read_body()
+                except ValueError:
+                    self._send_json(400, {'error': {'message': 'invalid JSON body', 'type': 'invalid_request_error'}})
+                    server._record(400, (time.monotonic() - start) * 1000)
+                    return
+                time.sleep(server._sample_latency())
+                status = server._inject()
+                if status == 429:
+                    self._send_json(429, {'error': {'message': 'Rate limit exceeded (stub)', 'type': 'rate_limit_error',
+                                                    'code': 'rate_limit_exceeded'}},
+                                    headers={'retry-after-ms': str(server.config.retry_after_ms)})
+                    server._record(429, (time.monotonic() - start) * 1000)
+                    return
+                if status == 500:
+                    self._send_json(500, {'error': {'message': 'Injected server error (stub)', 'type': 'server_error'}})
+                    server._record(500, (time.monotonic() - start) * 1000)
+                    return
+                payload = server.completion(body, server.respond(body))
+                self._send_json(200, payload)
+                server._record(200, (time.monotonic() - start) * 1000,
+                               payload['usage']['prompt_tokens'], payload['usage']['completion_tokens'])
+
+            def _send_file(self, name):
+                data = server._files.get(name)
+                if data is None:
+                    self._send_json(404, {'error': {'message': 'not found'}})
+                    return
+                start = 0
+                match = re.match(r'bytes=(\d+)-', self.headers.get('Range') or '')
+                if match:
+                    start = int(match.group(1))
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{len(data)}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+                else:
+                    self.send_response(200)
+                chunk = data[start:]
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(chunk)))
+                self.send_header('ETag', '"' + hashlib.md5(data).hexdigest() + '"')
+                self.end_headers()
+                self.wfile.write(chunk)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线 OpenAI 兼容桩服务 / Offline OpenAI-compatible stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0,
+                        help='监听端口，默认0为系统分配的空闲端口（启动时打印）/ Listen port; 0 (default) picks a free one')
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=None)
+    parser.add_argument('--mode', choices=RESPONSE_MODES, default='auto')
+    parser.add_argument('--canned-file', default=None, help='canned 模式返回的文本文件 / Text file for canned mode')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms, latency_dist=args.latency_dist, latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, rpm=args.rpm,
+        mode=args.mode, seed=args.seed,
+    )
+    if args.canned_file:
+        with open(args.canned_file, 'r', encoding='utf-8') as f:
+            config.canned = f.read()
+    server = StubServer(config, host=args.host, port=args.port)
+    print(f"🧪 桩服务已启动 / Stub server listening on {server.url}")
+    print(f"   BASE_URL = \"{server.base_url}\"")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,22 @@
 import pandas as pd
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
+import contextlib
 import time
 import os
 from . import settings  # 导入配置文件 / Import configuration file
+from .rate_limiter import RateLimiter, estimate_tokens
+from .llm_cache import get_cache
+from .metrics import CallTimer, get_metrics, record_success
+from .post_selection import select_posts_by_keyword
 
-# --- 初始化客户端 ---
-# --- Initialize Client ---
-client = OpenAI(
-    api_key=settings.API_KEY, 
-    base_url=settings.BASE_URL
-)
+# --- 客户端（首次调用时创建）---
+# --- Client (created on first use) ---
+client = None
+
+# 拼接同一关键词下多条微博时使用的分隔符
+# Separator used when joining the posts of one keyword
+POST_SEPARATOR = "\n\n【---下一条微博---】\n\n"
 
 # --- 辅助函数 ---
 # --- Utility Functions ---
@@ -25,23 +32,307 @@ def load_prompt(filename):
         print(f"❌ Error: File not found {filename}, please check the path.")
         return ""
 
-def get_completion(messages, temperature):
-    """封装 API 调用，带重试机制"""
-    """Wrap API call with retry mechanism"""
+def get_client():
+    """返回同步客户端，首次调用时才创建，导入本模块不会连接或校验 API 密钥"""
+    """Return the sync client, created on first call so importing this module never builds one"""
+    global client
+    if client is None:
+        client = OpenAI(api_key=settings.API_KEY, base_url=settings.BASE_URL)
+    return client
+
+def get_completion(messages, temperature, label=None):
+    """封装 API 调用，带重试机制；每次调用的延迟、重试、token 和错误记录到 get_metrics()"""
+    """Wrap API call with retry mechanism; latency, retries, tokens and errors go to get_metrics()"""
+    cache = get_cache()
+    metrics = get_metrics()
+    cached = cache.get(settings.MODEL_NAME, temperature, messages)
+    if cached is not None:
+        metrics.record('completion', label=label, cached=True)
+        return cached
+    timer = CallTimer()
+    error = None
     for i in range(settings.MAX_RETRIES):
+        timer.attempts += 1
         try:
-            completion = client.chat.completions.create(
+            completion = get_client().chat.completions.create(
                 model=settings.MODEL_NAME,
                 messages=messages,
                 temperature=temperature,
             )
-            return completion.choices[0].message.content
+            content = completion.choices[0].message.content
         except Exception as e:
+            error = e
             print(f"⚠️ API调用波动 (第{i+1}/{settings.MAX_RETRIES}次): {e}")
             print(f"⚠️ API call fluctuation (Attempt {i+1}/{settings.MAX_RETRIES}): {e}")
             time.sleep(2)
+            continue
+        # 缓存与指标在重试之外写入，本地 I/O 失败不会触发重试
+        # Cache and metrics are written outside the retry, so a local I/O failure never triggers one
+        record_success(cache, metrics, 'completion', label, settings.MODEL_NAME, temperature, messages,
+                       content, timer, completion)
+        return content
+    metrics.record('completion', label=label, timer=timer, error=error)
+    return None
+
+async def get_completion_async(async_client, messages, temperature, limiter, label=None):
+    """异步版本的 get_completion，每次请求前先经过限流器"""
+    """Async get_completion; every attempt passes through the rate limiter first"""
+    cache = get_cache()
+    metrics = get_metrics()
+    cached = cache.get(settings.MODEL_NAME, temperature, messages)
+    if cached is not None:
+        metrics.record('completion', label=label, cached=True)
+        return cached
+    timer = CallTimer()
+    error = None
+    for i in range(settings.MAX_RETRIES):
+        timer.attempts += 1
+        wait_start = time.perf_counter()
+        await limiter.acquire(estimate_tokens(messages))
+        timer.wait += time.perf_counter() - wait_start
+        try:
+            completion = await async_client.chat.completions.create(
+                model=settings.MODEL_NAME,
+                messages=messages,
+                temperature=temperature,
+            )
+            content = completion.choices[0].message.content
+        except Exception as e:
+            error = e
+            print(f"⚠️ API调用波动 (第{i+1}/{settings.MAX_RETRIES}次): {e}")
+            print(f"⚠️ API call fluctuation (Attempt {i+1}/{settings.MAX_RETRIES}): {e}")
+            await asyncio.sleep(2)
+            continue
+        record_success(cache, metrics, 'completion', label, settings.MODEL_NAME, temperature, messages,
+                       content, timer, completion)
+        return content
+    metrics.record('completion', label=label, timer=timer, error=error)
     return None
 
+@contextlib.asynccontextmanager
+async def completion_session():
+    """
+    并发调用会话：共享同一个异步客户端、并发信号量和限流器
+    Concurrent call session sharing one async client, semaphore and rate limiter
+
+    产出 complete(label, messages, temperature) 协程函数
+    Yields a coroutine function complete(label, messages, temperature)
+    """
+    semaphore = asyncio.Semaphore(settings.STAGE1_CONCURRENCY)
+    limiter = RateLimiter(rpm=settings.RATE_LIMIT_RPM, tpm=settings.RATE_LIMIT_TPM)
+    async_client = AsyncOpenAI(api_key=settings.API_KEY, base_url=settings.BASE_URL)
+
+    async def complete(label, messages, temperature):
+        async with semaphore:
+            start = time.time()
+            result = await get_completion_async(async_client, messages, temperature, limiter, label=label)
+            print(f"   <- [{label}] 完成 / done ({time.time() - start:.1f}s)")
+            return result
+
+    try:
+        yield complete
+    finally:
+        await async_client.close()
+        if limiter.total_wait > 0:
+            print(f"⏳ 限流累计等待 {limiter.total_wait:.1f}s / Rate limiter waited {limiter.total_wait:.1f}s in total")
+
+async def run_map_phase(tasks, temperature):
+    """
+    并发执行阶段一，返回与 tasks 顺序一致的结果列表
+    Run Stage 1 concurrently; results are returned in the same order as tasks
+
+    参数 Parameters:
+    - tasks: [(关键词, messages)] 列表 / List of (keyword, messages)
+    - temperature: 温度参数 / Sampling temperature
+    """
+    async with completion_session() as complete:
+        return await asyncio.gather(*(complete(kw, messages, temperature) for kw, messages in tasks))
+
+# --- 分层 Map-Reduce ---
+# --- Hierarchical Map-Reduce ---
+
+def split_into_chunks(posts, budget, separator=POST_SEPARATOR):
+    """
+    按字符预算把微博切分为若干段，不拆开单条微博（单条超长时截断到预算内）
+    Split posts into budget-sized chunks without breaking a post (an oversized post is truncated)
+    """
+    if budget <= 0:
+        return [separator.join(posts)]
+    chunks, current, size = [], [], 0
+    for post in posts:
+        post = post[:budget]
+        extra = len(post) + (len(separator) if current else 0)
+        if current and size + extra > budget:
+            chunks.append(separator.join(current))
+            current, size = [], 0
+            extra = len(post)
+        current.append(post)
+        size += extra
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+def pack_by_budget(texts, budget):
+    """
+    把文本按预算分组用于归并：每组文本总长度不超过 budget（不含提示词模板和片段分隔符），
+    相邻文本尽量放进同一组；超过 budget 的单条文本先按 budget 切成多段。
+    与相邻文本放不进同一组的文本单独成组
+    Group texts for a reduce step: the texts of a group never total more than budget characters
+    (prompt template and part separators excluded) and neighbours share a group whenever they fit;
+    a single text longer than budget is first cut into budget-sized pieces. A text that fits with
+    neither neighbour forms a group of its own
+    """
+    if budget <= 0:
+        return [list(texts)]
+    groups, current, size = [], [], 0
+    for text in texts:
+        for piece in (text[i:i + budget] for i in range(0, max(len(text), 1), budget)):
+            if current and size + len(piece) > budget:
+                groups.append(current)
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece)
+    if current:
+        groups.append(current)
+    return groups
+
+async def tree_reduce(texts, budget, build_messages, complete, label, until_fits=False):
+    """
+    分层归并：每一层把文本按预算分组、每组调用一次模型合并，直到只剩一条
+    （until_fits=True 时，总长度不超过预算即停止）。每次调用的输入都不超过预算（见 pack_by_budget）。
+    某层有多条文本的组时只合并这些组，单条的组原样进入下一层；所有组都只有一条时（相邻文本两两放不下），
+    逐条压缩，压缩后总长度没有减少则停止。
+    某组归并失败时，该组的输入原样进入下一层，不会丢失；某一层全部失败时提前停止，返回未归并完的文本
+    Tree reduce: each level groups texts by budget and merges every group with one call, until one
+    text remains (or, with until_fits=True, until the total fits the budget). No call's input exceeds the
+    budget (see pack_by_budget). When a level has multi-text groups only those are merged and single
+    texts pass through; when every group holds a single text (no two neighbours fit together) each text
+    is condensed on its own, and reduction stops if that does not shrink the total.
+    A failed group carries its inputs forward unreduced, so nothing is dropped; if every call of a
+    level fails, reduction stops and the remaining texts are returned as they are
+
+    返回 Returns:
+    - (texts, failed): 归并后的文本（输入非空时不为空）与失败的归并调用数
+      The reduced texts (never empty for non-empty input) and the number of failed merge calls
+    """
+    level = failed_total = 0
+    while len(texts) > 1 and (not until_fits or sum(len(t) for t in texts) > budget):
+        level += 1
+        groups = pack_by_budget(texts, budget)
+        condense_only = all(len(group) == 1 for group in groups)
+        calls = [i for i, group in enumerate(groups) if condense_only or len(group) > 1]
+        results = await asyncio.gather(*(
+            complete(f"{label} L{level}-{n + 1}/{len(calls)}", build_messages(groups[i]), settings.TEMP_STAGE_1)
+            for n, i in enumerate(calls)
+        ))
+        merged = dict(zip(calls, results))
+        failed = sum(1 for r in results if not r)
+        failed_total += failed
+        previous_size = sum(len(t) for t in texts)
+        next_texts = []
+        for i, group in enumerate(groups):
+            if merged.get(i):
+                next_texts.append(merged[i])
+            else:
+                next_texts.extend(group)
+        texts = next_texts
+        if failed == len(calls):
+            print(f"⚠️ [{label}] 第{level}层全部 {failed} 组归并失败，保留 {len(texts)} 段未归并文本")
+            print(f"⚠️ [{label}] all {failed} group(s) failed at level {level}, keeping {len(texts)} unreduced text(s)")
+            break
+        if failed:
+            print(f"⚠️ [{label}] 第{level}层有 {failed} 组归并失败，原文进入下一层")
+            print(f"⚠️ [{label}] {failed} group(s) failed at level {level}, inputs carried forward")
+        if condense_only and sum(len(t) for t in texts) >= previous_size:
+            print(f"⚠️ [{label}] 第{level}层逐条压缩后总长度没有减少，停止归并，保留 {len(texts)} 段文本")
+            print(f"⚠️ [{label}] condensing did not shrink the texts at level {level}, "
+                  f"stopping with {len(texts)} text(s)")
+            break
+    return texts, failed_total
+
+async def run_hierarchical_stage1(keyword_posts, sys_prompt, stage1_prompt, reduce_prompt):
+    """
+    分层阶段一：超长关键词切分为多段并行分析，再把各段摘要归并为关键词摘要。
+    分析失败的分段以原文参与归并；全部分段失败时该关键词失败
+    Hierarchical Stage 1: oversized keywords are split into chunks analysed in parallel,
+    then the partial summaries are reduced into one keyword summary. A failed chunk takes part
+    in the reduce as raw posts; the keyword fails only when every chunk fails
+
+    参数 Parameters:
+    - keyword_posts: [(关键词, [微博正文...])] / List of (keyword, posts)
+    返回 Returns:
+    - 与 keyword_posts 顺序一致的 (摘要, 覆盖情况) 列表，摘要失败为 None；
+      覆盖情况为 {'chunks', 'failed_chunks', 'failed_merges', 'unreduced'}
+      (summary, coverage) pairs in keyword order (summary None on failure); coverage counts the chunks,
+      failed chunk analyses, failed merge calls and texts left unreduced in the summary
+    """
+    async with completion_session() as complete:
+        async def analyze(kw, posts):
+            chunks = split_into_chunks(posts, settings.CHUNK_BUDGET)
+            print(f"   -> [{kw}] {len(posts)} 条微博，切分为 {len(chunks)} 段 / {len(posts)} posts in {len(chunks)} chunk(s)")
+            partials = await asyncio.gather(*(
+                complete(
+                    f"{kw} {i + 1}/{len(chunks)}",
+                    [
+                        {'role': 'system', 'content': sys_prompt},
+                        {'role': 'user', 'content': stage1_prompt.format(keyword=kw, content=chunk)},
+                    ],
+                    settings.TEMP_STAGE_1,
+                )
+                for i, chunk in enumerate(chunks)
+            ))
+            coverage = {
+                'chunks': len(chunks),
+                'failed_chunks': sum(1 for p in partials if not p),
+                'failed_merges': 0,
+                'unreduced': 0,
+            }
+            if coverage['failed_chunks'] == len(chunks):
+                return None, coverage
+            if coverage['failed_chunks']:
+                print(f"⚠️ [{kw}] {coverage['failed_chunks']}/{len(chunks)} 段分析失败，以原文参与归并")
+                print(f"⚠️ [{kw}] {coverage['failed_chunks']}/{len(chunks)} chunk(s) failed, reducing their raw posts")
+            partials = [p if p else chunk for p, chunk in zip(partials, chunks)]
+            if len(partials) == 1:
+                return partials[0], coverage
+
+            def build_messages(group):
+                joined = "\n\n".join(f"--- 片段 {i + 1} / Part {i + 1} ---\n{text}" for i, text in enumerate(group))
+                return [
+                    {'role': 'system', 'content': sys_prompt},
+                    {'role': 'user', 'content': reduce_prompt.format(keyword=kw, partial_summaries=joined)},
+                ]
+
+            reduced, coverage['failed_merges'] = await tree_reduce(
+                partials, settings.CHUNK_BUDGET, build_messages, complete, kw,
+            )
+            if len(reduced) > 1:
+                coverage['unreduced'] = len(reduced)
+            return "\n\n".join(reduced), coverage
+
+        return await asyncio.gather(*(analyze(kw, posts) for kw, posts in keyword_posts))
+
+async def condense_summaries(blocks, sys_prompt, condense_prompt):
+    """
+    阶段二输入超出预算时，分层压缩各关键词的事实摘要
+    Tree-condense the keyword summaries when the Stage 2 input exceeds its budget
+
+    返回 Returns:
+    - (blocks, failed): 压缩后的文本块（失败的组保留原摘要）与失败的压缩调用数
+      Condensed blocks (failed groups keep their original summaries) and the number of failed calls
+    """
+    async with completion_session() as complete:
+        def build_messages(group):
+            return [
+                {'role': 'system', 'content': sys_prompt},
+                {'role': 'user', 'content': condense_prompt.format(summaries="".join(group))},
+            ]
+
+        condensed, failed = await tree_reduce(
+            blocks, settings.STAGE2_BUDGET, build_messages, complete, 'stage2', until_fits=True,
+        )
+    return [text if text.endswith("\n\n") else text + "\n\n" for text in condensed], failed
+
 # --- 主逻辑 ---
 # --- Main Logic ---
 
@@ -77,12 +368,25 @@ def main():
         print(f"❌ Failed to read data file: {e}")
         return
 
-    # C. 预处理：按关键词合并文本
-    # C. Preprocessing: Merge text by keyword
-    separator = "\n\n【---下一条微博---】\n\n"
+    # C. 预处理：按互动数挑选代表性微博（可选），再按关键词合并文本
+    # C. Preprocessing: optionally pick representative posts by engagement, then merge text by keyword
+    if settings.STAGE1_SELECTION:
+        df = select_posts_by_keyword(
+            df,
+            settings.STAGE1_TOKEN_BUDGET,
+            id_column=settings.STAGE1_ID_COLUMN,
+            rank_columns=settings.STAGE1_RANK_COLUMNS,
+            similarity_threshold=settings.STAGE1_SIMILARITY_THRESHOLD,
+            shingle_size=settings.STAGE1_SHINGLE_SIZE,
+            separator_tokens=len(POST_SEPARATOR),
+            log_path=settings.OUTPUT_STAGE1_SELECTION_CSV,
+        )
+
+    # 按关键词合并文本（选取后的微博按排名顺序）
+    # Merge text by keyword (selected posts stay in rank order)
     # 确保内容转为字符串并合并
     # Ensure content is converted to string and merged
-    grouped = df.groupby('关键词')['微博正文'].apply(lambda x: separator.join(x.astype(str))).reset_index()
+    grouped = df.groupby('关键词')['微博正文'].apply(lambda x: POST_SEPARATOR.join(x.astype(str))).reset_index()
     
     stage1_results_dict = {}
     
@@ -96,25 +400,54 @@ def main():
     print("\n--- Step 1: 微观事实提取 ---")
     print("\n--- Step 1: Micro-fact Extraction ---")
     
-    for index, row in grouped.iterrows():
-        kw = row['关键词']
-        raw_text = row['微博正文']
-        
-        # 长度截断
-        # Length truncation
-        if settings.MAX_TEXT_LENGTH > 0 and len(raw_text) > settings.MAX_TEXT_LENGTH:
-            raw_text = raw_text[:settings.MAX_TEXT_LENGTH] + "\n...(内容过长已截断)... / ...(content truncated due to length)..."
-            
-        print(f"   -> 正在分析 [{kw}] (长度: {len(raw_text)})")
-        print(f"   -> Analyzing [{kw}] (length: {len(raw_text)})")
-        
-        messages = [
-            {'role': 'system', 'content': sys_prompt},
-            {'role': 'user', 'content': stage1_prompt.format(keyword=kw, content=raw_text)}
+    if settings.HIERARCHICAL_MODE:
+        # 分层模式：按预算切分后并行分析，再归并，不丢弃超长部分
+        # Hierarchical mode: split by budget, analyse in parallel and reduce, nothing is truncated
+        reduce_prompt = load_prompt(settings.PROMPT_KEYWORD_REDUCE_FILE)
+        if not reduce_prompt:
+            return
+        keyword_posts = [
+            (kw, posts.astype(str).tolist()) for kw, posts in df.groupby('关键词')['微博正文']
         ]
+        start = time.time()
+        outcomes = asyncio.run(run_hierarchical_stage1(keyword_posts, sys_prompt, stage1_prompt, reduce_prompt))
+        print(f"⏱️ 阶段一耗时 {time.time() - start:.1f}s (并发数 {settings.STAGE1_CONCURRENCY})")
+        print(f"⏱️ Stage 1 took {time.time() - start:.1f}s (concurrency {settings.STAGE1_CONCURRENCY})")
+        keywords = [kw for kw, _ in keyword_posts]
+        results = [summary for summary, _ in outcomes]
+        stage1_coverage = {kw: coverage for kw, (_, coverage) in zip(keywords, outcomes)}
+    else:
+        tasks = []
+        for index, row in grouped.iterrows():
+            kw = row['关键词']
+            raw_text = row['微博正文']
+            
+            # 长度截断
+            # Length truncation
+            if settings.MAX_TEXT_LENGTH > 0 and len(raw_text) > settings.MAX_TEXT_LENGTH:
+                raw_text = raw_text[:settings.MAX_TEXT_LENGTH] + "\n...(内容过长已截断)... / ...(content truncated due to length)..."
+                
+            print(f"   -> 正在分析 [{kw}] (长度: {len(raw_text)})")
+            print(f"   -> Analyzing [{kw}] (length: {len(raw_text)})")
+            
+            messages = [
+                {'role': 'system', 'content': sys_prompt},
+                {'role': 'user', 'content': stage1_prompt.format(keyword=kw, content=raw_text)}
+            ]
+            tasks.append((kw, messages))
         
-        result = get_completion(messages, temperature=settings.TEMP_STAGE_1)
-        
+        if settings.STAGE1_CONCURRENCY > 1:
+            # 并发调用，结果顺序与关键词顺序一致
+            # Concurrent calls; results keep the keyword order
+            start = time.time()
+            results = asyncio.run(run_map_phase(tasks, temperature=settings.TEMP_STAGE_1))
+            print(f"⏱️ 阶段一耗时 {time.time() - start:.1f}s (并发数 {settings.STAGE1_CONCURRENCY})")
+            print(f"⏱️ Stage 1 took {time.time() - start:.1f}s (concurrency {settings.STAGE1_CONCURRENCY})")
+        else:
+            results = [get_completion(messages, temperature=settings.TEMP_STAGE_1, label=kw) for kw, messages in tasks]
+        keywords = [kw for kw, _ in tasks]
+    
+    for kw, result in zip(keywords, results):
         if result:
             stage1_results_dict[kw] = result
         else:
@@ -122,8 +455,20 @@ def main():
 
     # 保存阶段一结果
     # Save Stage 1 results
-    pd.DataFrame(list(stage1_results_dict.items()), columns=['关键词', '微观分析结果'])\
-      .to_csv(settings.OUTPUT_STAGE1_CSV, index=False, encoding='utf-8-sig')
+    stage1_df = pd.DataFrame(list(stage1_results_dict.items()), columns=['关键词', '微观分析结果'])
+    if settings.HIERARCHICAL_MODE:
+        # 分层模式下记录每个关键词的覆盖情况，便于发现失败的分段与未归并的摘要
+        # In hierarchical mode record per-keyword coverage so failed chunks and unreduced summaries are visible
+        stage1_df['分段数'] = [stage1_coverage[kw]['chunks'] for kw in stage1_df['关键词']]
+        stage1_df['失败分段数'] = [stage1_coverage[kw]['failed_chunks'] for kw in stage1_df['关键词']]
+        stage1_df['失败归并数'] = [stage1_coverage[kw]['failed_merges'] for kw in stage1_df['关键词']]
+        stage1_df['未归并片段数'] = [stage1_coverage[kw]['unreduced'] for kw in stage1_df['关键词']]
+        incomplete = [kw for kw, c in stage1_coverage.items() if c['failed_chunks'] or c['unreduced']]
+        if incomplete:
+            print(f"⚠️ {len(incomplete)} 个关键词的摘要含失败分段或未归并片段，详见 {settings.OUTPUT_STAGE1_CSV}")
+            print(f"⚠️ {len(incomplete)} keyword summaries include failed chunks or unreduced parts, "
+                  f"see {settings.OUTPUT_STAGE1_CSV}")
+    stage1_df.to_csv(settings.OUTPUT_STAGE1_CSV, index=False, encoding='utf-8-sig')
     print(f"✅ 阶段一完成，已保存至 {settings.OUTPUT_STAGE1_CSV}")
     print(f"✅ Stage 1 completed, saved to {settings.OUTPUT_STAGE1_CSV}")
 
@@ -136,16 +481,35 @@ def main():
     
     # 拼接所有的微观摘要
     # Concatenate all micro-summaries
-    combined_summaries = ""
-    for kw, summary in stage1_results_dict.items():
-        combined_summaries += f"=== 关于关键词【{kw}】的事实摘要 === / === Fact Summary for Keyword 【{kw}】 ===\n{summary}\n\n"
+    summary_blocks = [
+        f"=== 关于关键词【{kw}】的事实摘要 === / === Fact Summary for Keyword 【{kw}】 ===\n{summary}\n\n"
+        for kw, summary in stage1_results_dict.items()
+    ]
+    combined_summaries = "".join(summary_blocks)
+    stage2_input = combined_summaries
+    
+    if settings.HIERARCHICAL_MODE and len(combined_summaries) > settings.STAGE2_BUDGET:
+        # 摘要总长超出预算时先分层压缩，知识库 PART 2 仍保留完整摘要
+        # Condense in a tree when the summaries exceed the budget; PART 2 of the knowledge base keeps them in full
+        condense_prompt = load_prompt(settings.PROMPT_SUMMARY_REDUCE_FILE)
+        if condense_prompt:
+            print(f"   -> 摘要总长 {len(combined_summaries)} 超出预算 {settings.STAGE2_BUDGET}，分层压缩中")
+            print(f"   -> Summaries ({len(combined_summaries)}) exceed budget {settings.STAGE2_BUDGET}, condensing")
+            condensed, failed = asyncio.run(condense_summaries(summary_blocks, sys_prompt, condense_prompt))
+            stage2_input = "".join(condensed)
+            if failed:
+                # 失败的组保留原摘要，阶段二输入不会缺少关键词，但可能仍超出预算
+                # Failed groups keep their original summaries: no keyword is lost, but the input may exceed the budget
+                print(f"⚠️ {failed} 次压缩失败，阶段二输入长度 {len(stage2_input)}（预算 {settings.STAGE2_BUDGET}）")
+                print(f"⚠️ {failed} condense call(s) failed, Stage 2 input is {len(stage2_input)} "
+                      f"(budget {settings.STAGE2_BUDGET})")
         
     messages_s2 = [
         {'role': 'system', 'content': sys_prompt},
-        {'role': 'user', 'content': stage2_prompt.format(all_summaries=combined_summaries)}
+        {'role': 'user', 'content': stage2_prompt.format(all_summaries=stage2_input)}
     ]
     
-    final_analysis = get_completion(messages_s2, temperature=settings.TEMP_STAGE_2)
+    final_analysis = get_completion(messages_s2, temperature=settings.TEMP_STAGE_2, label='stage2')
     
     if final_analysis:
         # 保存分析报告
@@ -181,5 +545,8 @@ def main():
         print("❌ 阶段二分析失败，无法生成最终报告。")
         print("❌ Stage 2 analysis failed, unable to generate final report.")
 
+    get_cache().report()
+    get_metrics().report()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,14 +1,25 @@
 """
 命令行入口
 支持: python -m utils --load_files_from_folder 等参数
+      python -m utils serve / submit（常驻处理服务，见 server.py）
+      python -m utils watch（增量监视模式，见 watch.py）
 """
 
 import argparse
 import sys
 from .data_processing import data_processing
+from . import settings
+from .checkpoint import RESUME_STAGES
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ('serve', 'submit'):
+        from .server import main as server_main
+        return server_main(sys.argv[1:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'watch':
+        from .watch import main as watch_main
+        return watch_main(sys.argv[2:])
+    
     parser = argparse.ArgumentParser(
         description='微博数据处理工具',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -16,6 +27,12 @@ def main():
 示例：
   python -m utils --load_files_from_folder --tokenize
   python -m utils --load_files_from_folder --dedupe --tokenize --create_wordcloud
+  python -m utils --load_files_from_folder --tokenize --tokenize_workers 8
+  python -m utils --load_files_from_folder --dedupe --index_tokens
+  python -m utils --resume-from create_wordcloud
+  python -m utils serve                    # 常驻服务，预热依赖后通过HTTP接收任务
+  python -m utils submit --stages load_files_from_folder tokenize --set LOAD_POSTS_FOLDER_PATH=data
+  python -m utils watch --once             # 只处理新增的CSV，增量更新去重索引、词频和词云
         """
     )
     
@@ -39,6 +56,11 @@ def main():
         action='store_true',
         help='执行分词和词频统计'
     )
+    parser.add_argument(
+        '--index_tokens',
+        action='store_true',
+        help='为每条微博分词并构建分词倒排索引（保存到settings.TOKEN_INDEX_PATH）'
+    )
     parser.add_argument(
         '--word_frequency',
         action='store_true',
@@ -49,6 +71,19 @@ def main():
         action='store_true',
         help='生成词云图片'
     )
+    parser.add_argument(
+        '--tokenize_workers',
+        type=int,
+        default=None,
+        help='分词进程数（覆盖settings.TOKENIZE_WORKERS，0表示使用全部CPU核）'
+    )
+    parser.add_argument(
+        '--resume-from',
+        dest='resume_from',
+        choices=RESUME_STAGES,
+        default=None,
+        help='从指定阶段恢复，上游阶段读取settings.CHECKPOINT_DIR中最近的有效检查点'
+    )
     
     args = parser.parse_args()
     
@@ -58,12 +93,17 @@ def main():
         args.extract_topics,
         args.dedupe,
         args.tokenize,
+        args.index_tokens,
         args.word_frequency,
         args.create_wordcloud,
+        args.resume_from,
     ]):
         parser.print_help()
         sys.exit(0)
     
+    if args.tokenize_workers is not None:
+        settings.TOKENIZE_WORKERS = args.tokenize_workers or None
+    
     # 执行数据处理
     try:
         result = data_processing(
@@ -71,8 +111,10 @@ def main():
             extract_topics=args.extract_topics,
             dedupe=args.dedupe,
             tokenize=args.tokenize,
+            index_tokens=args.index_tokens,
             word_frequency=args.word_frequency,
             create_wordcloud=args.create_wordcloud,
+            resume_from=args.resume_from,
         )
         print("\n✓ 处理完成！")
         return result
@@ -0,0 +1,219 @@
+"""
+data_processing 分阶段基准测试
+在合成语料（见 synthetic_corpus.py）上按规模运行完整流程，记录每个阶段的耗时、CPU时间、峰值内存和行数，
+结果保存为JSON，便于不同提交之间比较
+
+用法：
+    python -m utils.benchmark --sizes 10k 100k --output bench.json
+    python -m utils.benchmark --sizes 10k --compare bench_old.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from . import settings
+from .data_processing import data_processing
+from .synthetic_corpus import SIZES, generate_corpus
+
+STAGES = ['load', 'extract_topics', 'dedupe', 'tokenize', 'word_frequency', 'create_wordcloud']
+
+# 基准测试时覆盖的设置：不弹出窗口、不写检查点和指标文件（但仍采样峰值内存）、字体使用系统默认；
+# 不读写用户的加载缓存、分词缓存和话题索引（既不能被合成语料污染，命中缓存也会让计时失真）
+BENCH_SETTINGS = {
+    'CHECKPOINT_DIR': None,
+    'METRICS_PATH': None,
+    'METRICS_PROFILE_DIR': None,
+    'METRICS_SAMPLE_RSS': True,
+    'LOAD_POSTS_CACHE_DIR': None,
+    'TOKENIZE_CACHE_PATH': None,
+    'TOPIC_INDEX_PATH': None,
+    'DEDUPE_AUTO_CLEAN': True,
+    'WORDCLOUD_SHOW': False,
+}
+
+
+@contextlib.contextmanager
+def override_settings(**values):
+    """临时修改 settings 中的值，退出时恢复"""
+    saved = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+
+def run_size(folder_path, stages=None):
+    """
+    在一个语料文件夹上运行一次 data_processing 并返回各阶段指标
+
+    参数：
+    -----------
+    folder_path : str
+        语料文件夹
+    stages : list of str or None
+        要运行的阶段（会自动补上依赖的上游阶段），None则运行全部
+
+    返回值：
+    -----------
+    dict
+        {'total_seconds', 'stages': {阶段名: 指标}}
+    """
+    stages = set(stages or STAGES)
+    last = max(STAGES.index(s) for s in stages)
+    # 下游阶段依赖上游输出，自动补上所需的上游阶段
+    required = {'load'}
+    if last >= STAGES.index('word_frequency'):
+        required.add('tokenize')
+    if last >= STAGES.index('create_wordcloud'):
+        required.add('word_frequency')
+    flags = stages | required
+
+    font_path = settings.WORDCLOUD_FONT_PATH
+    if font_path and not os.path.exists(font_path):
+        font_path = None
+    # 无界面词云输出到临时目录：写入真实的 WORDCLOUD_OUTPUT_DIR 会按合成语料清理掉用户已有的图片
+    with tempfile.TemporaryDirectory() as workdir:
+        overrides = dict(
+            BENCH_SETTINGS,
+            LOAD_POSTS_FOLDER_PATH=folder_path,
+            WORDCLOUD_FONT_PATH=font_path,
+            WORDCLOUD_OUTPUT_DIR=os.path.join(workdir, 'wordclouds'),
+        )
+        with override_settings(**overrides):
+            start = time.perf_counter()
+            result = data_processing(
+                load_files_from_folder='load' in flags,
+                extract_topics='extract_topics' in flags,
+                dedupe='dedupe' in flags,
+                tokenize='tokenize' in flags,
+                word_frequency='word_frequency' in flags,
+                create_wordcloud='create_wordcloud' in flags,
+            )
+            total = time.perf_counter() - start
+    stage_metrics = {}
+    for record in result['metrics']:
+        stage_metrics[record['stage']] = {
+            'wall_seconds': record['wall_seconds'],
+            'cpu_seconds': record['cpu_seconds'],
+            'peak_rss_mb': round(record['peak_rss_bytes'] / 1024 / 1024, 1),
+            'rows_in': record['rows_in'],
+            'rows_out': record['rows_out'],
+        }
+    return {'total_seconds': round(total, 4), 'stages': stage_metrics}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _settings_snapshot():
+    return {
+        name: getattr(settings, name) for name in dir(settings)
+        if name.isupper() and isinstance(getattr(settings, name), (str, int, float, bool, type(None), tuple, list))
+    }
+
+
+def run_benchmark(sizes, data_dir='bench_data', stages=None, n_keywords=20, seed=0, regenerate=False):
+    """
+    按规模生成（或复用）合成语料并逐一运行基准测试
+
+    参数：
+    -----------
+    sizes : list of str
+        规模列表，取值见 synthetic_corpus.SIZES（'10k', '100k', '1m'）
+    data_dir : str
+        合成语料的存放目录，每个规模一个子文件夹，已存在则复用
+    stages : list of str or None
+        要测试的阶段，None则为全部
+    n_keywords : int
+        关键词数量
+    seed : int
+        随机种子
+    regenerate : bool
+        是否强制重新生成语料
+
+    返回值：
+    -----------
+    dict
+        基准测试报告
+    """
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': _settings_snapshot(),
+        'sizes': {},
+    }
+    for size in sizes:
+        folder = os.path.join(data_dir, size)
+        if regenerate or not os.path.isdir(folder) or not os.listdir(folder):
+            generate_corpus(folder, SIZES[size], n_keywords=n_keywords, seed=seed)
+        print(f"\n=== 基准测试：{size}（{SIZES[size]}行）===")
+        entry = run_size(folder, stages)
+        entry['rows'] = SIZES[size]
+        report['sizes'][size] = entry
+    return report
+
+
+def print_report(report, baseline=None):
+    """打印各规模各阶段的指标，提供 baseline 时显示与其耗时的比值"""
+    for size, entry in report['sizes'].items():
+        print(f"\n{size}（{entry['rows']}行），总耗时 {entry['total_seconds']:.2f}s")
+        print(f"  {'阶段':<18}{'耗时(s)':>10}{'CPU(s)':>10}{'峰值内存(MB)':>14}{'输入行':>10}{'输出行':>10}{'对比':>8}")
+        base_stages = (baseline or {}).get('sizes', {}).get(size, {}).get('stages', {})
+        for stage, record in entry['stages'].items():
+            ratio = ''
+            base = base_stages.get(stage)
+            if base and base.get('wall_seconds'):
+                ratio = f"{record['wall_seconds'] / base['wall_seconds']:.2f}x"
+            print(
+                f"  {stage:<18}{record['wall_seconds']:>10.3f}{record['cpu_seconds']:>10.3f}"
+                f"{record['peak_rss_mb']:>14.1f}{str(record['rows_in']):>10}{str(record['rows_out']):>10}{ratio:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='data_processing 分阶段基准测试')
+    parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['10k'], help='语料规模')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=None, help='要测试的阶段，默认全部')
+    parser.add_argument('--data_dir', default='bench_data', help='合成语料目录（已存在则复用）')
+    parser.add_argument('--keywords', type=int, default=20, help='关键词数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--regenerate', action='store_true', help='强制重新生成语料')
+    parser.add_argument('--output', default=None, help='结果JSON路径')
+    parser.add_argument('--compare', default=None, help='用于对比的历史结果JSON')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sizes, args.data_dir, args.stages, args.keywords, args.seed, args.regenerate)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"\n✓ 基准测试结果已保存：{args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+处理阶段的检查点
+每个阶段的输出以 pickle 保存，并附带指纹：指纹由输入文件签名、上游阶段指纹以及该阶段相关的 settings 值计算，
+恢复时用当前输入和 settings 重新计算整条链的指纹，只有完全一致的检查点才被视为有效
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+
+from . import settings
+from .parallel_loader import list_csv_files, file_signature
+
+# 可保存检查点的阶段（按执行顺序）及其输出在 result 中的键
+STAGES = ['load', 'extract_topics', 'dedupe', 'tokenize', 'word_frequency']
+STAGE_OUTPUTS = {
+    'load': 'df',
+    'extract_topics': 'df',
+    'dedupe': 'df',
+    'tokenize': 'word_freq_by_keyword',
+    'word_frequency': 'word_freq_df',
+}
+
+# 可用于 --resume-from 的阶段
+RESUME_STAGES = ['extract_topics', 'dedupe', 'tokenize', 'word_frequency', 'create_wordcloud']
+
+# 影响各阶段输出的 settings（并行度、缓存、debug等不影响结果的参数不计入）
+STAGE_SETTINGS = {
+    'load': [
+        'LOAD_POSTS_FOLDER_PATH',
+        'LOAD_POSTS_KEYWORD_COLUMN',
+    ],
+    'extract_topics': [
+        'EXTRACT_TOPICS_TOPICS_COLUMN',
+        'EXTRACT_TOPICS_ID_COLUMN',
+    ],
+    'dedupe': [
+        'DEDUPE_KEYWORD_COL',
+        'DEDUPE_TEXT_COL',
+        'DEDUPE_TIME_COL',
+        'DEDUPE_SUM_COLS',
+        'DEDUPE_SIMILARITY_THRESHOLD',
+        'DEDUPE_MIN_LEN_FOR_SIMILARITY',
+        'DEDUPE_AUTO_CLEAN',
+        'DEDUPE_ENGINE',
+        'DEDUPE_MINHASH_NUM_PERM',
+        'DEDUPE_MINHASH_BANDS',
+        'DEDUPE_MINHASH_SHINGLE_SIZE',
+    ],
+    'tokenize': [
+        'TOKENIZE_TEXT_COLUMN',
+        'TOKENIZE_KEYWORD_COLUMN',
+        'TOKENIZE_WORD_LENGTH_RANGE',
+        'TOKENIZE_SPARSE',
+    ],
+    'word_frequency': [
+        'WORD_FREQ_TOP_N',
+    ],
+}
+
+
+def stage_fingerprint(stage, upstream):
+    """
+    计算阶段指纹
+
+    参数：
+    -----------
+    stage : str
+        阶段名
+    upstream : str or None
+        上游阶段的指纹，load 阶段为 None
+
+    返回值：
+    -----------
+    str
+        sha256 十六进制字符串
+    """
+    payload = {
+        'stage': stage,
+        'upstream': upstream,
+        'settings': {name: getattr(settings, name) for name in STAGE_SETTINGS[stage]},
+    }
+    if stage == 'load':
+        folder = settings.LOAD_POSTS_FOLDER_PATH
+        payload['inputs'] = [file_signature(p) for p in list_csv_files(folder)] if folder else []
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class CheckpointStore:
+    """
+    检查点目录
+
+    参数：
+    -----------
+    directory : str
+        检查点保存目录
+    keep : int
+        每个阶段最多保留的检查点数量
+    """
+
+    def __init__(self, directory, keep=3):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, stage, fingerprint, ext):
+        return os.path.join(self.directory, f"{stage}-{fingerprint[:16]}.{ext}")
+
+    def save(self, stage, chain, value):
+        """保存阶段输出；chain 为到该阶段为止的 [(阶段, 指纹)] 列表"""
+        fingerprint = chain[-1][1]
+        data_path = self._path(stage, fingerprint, 'pkl')
+        tmp_path = data_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, data_path)
+        meta = {
+            'stage': stage,
+            'fingerprint': fingerprint,
+            'chain': chain,
+            'created': time.time(),
+        }
+        with open(self._path(stage, fingerprint, 'json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._prune(stage)
+
+    def _prune(self, stage):
+        metas = sorted(self._metas(stage), key=lambda m: m['created'], reverse=True)
+        for meta in metas[self.keep:]:
+            for ext in ('pkl', 'json'):
+                path = self._path(stage, meta['fingerprint'], ext)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _metas(self, stage):
+        metas = []
+        for path in glob.glob(os.path.join(self.directory, f"{stage}-*.json")):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    metas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return metas
+
+    @staticmethod
+    def _is_valid(meta):
+        """用当前输入和 settings 重新计算整条链的指纹"""
+        upstream = None
+        for stage, fingerprint in meta['chain']:
+            upstream = stage_fingerprint(stage, upstream)
+            if upstream != fingerprint:
+                return False
+        return True
+
+    def _metas_before(self, before_stage):
+        stop = STAGES.index(before_stage) if before_stage in STAGES else len(STAGES)
+        metas = []
+        for stage in STAGES[:stop]:
+            metas.extend(self._metas(stage))
+        return sorted(metas, key=lambda m: m['created'], reverse=True)
+
+    def latest_chain(self, before_stage):
+        """before_stage 之前最近一次保存的检查点（无论是否有效）所经过的阶段"""
+        metas = self._metas_before(before_stage)
+        return [stage for stage, _ in metas[0]['chain']] if metas else []
+
+    def latest_valid(self, before_stage):
+        """
+        在 before_stage 之前的阶段中，找到最近保存且仍然有效的检查点
+
+        返回值：
+        -----------
+        (dict, object) or (None, None)
+            检查点的元信息与保存的输出
+        """
+        for meta in self._metas_before(before_stage):
+            data_path = self._path(meta['stage'], meta['fingerprint'], 'pkl')
+            if not os.path.exists(data_path) or not self._is_valid(meta):
+                continue
+            with open(data_path, 'rb') as f:
+                return meta, pickle.load(f)
+        return None, None
+
+
+def plan_resume(resume_from, restored_stage, flags, available, previous_chain=()):
+    """
+    根据恢复点和已恢复的检查点调整各阶段开关
+
+    检查点及其之前的阶段不再执行；恢复点阶段一定执行；
+    上次运行中位于检查点与恢复点之间、但检查点已失效的阶段会重新执行；
+    若恢复点之后的阶段缺少必要输入（如词频表需要分词结果），自动补跑对应阶段
+
+    参数：
+    -----------
+    resume_from : str
+        恢复点阶段
+    restored_stage : str
+        已恢复的检查点所属阶段
+    flags : dict
+        {阶段: 是否执行}，键为 STAGES 加 'create_wordcloud'
+    available : set
+        已恢复到 result 中的键
+    previous_chain : list
+        上次运行在恢复点之前经过的阶段（见 CheckpointStore.latest_chain）
+
+    返回值：
+    -----------
+    dict
+        调整后的阶段开关
+    """
+    order = STAGES + ['create_wordcloud']
+    restored_index = order.index(restored_stage)
+    flags = dict(flags)
+    resume_index = order.index(resume_from)
+    for index, stage in enumerate(order):
+        if index <= restored_index:
+            flags[stage] = False
+        elif index < resume_index and stage in previous_chain:
+            flags[stage] = True
+    flags[resume_from] = True
+
+    if flags['create_wordcloud'] and 'word_freq_df' not in available:
+        flags['word_frequency'] = True
+    if flags['word_frequency'] and 'word_freq_by_keyword' not in available:
+        flags['tokenize'] = True
+    return flags
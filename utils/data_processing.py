@@ -3,16 +3,15 @@
 将processing模块的函数进行封装，参数由settings.py统一管理
 """
 
-from processing.post_analysis import (
-    load_posts_from_folder,
-    extract_top_topics,
-    dedupe_posts,
-    clean_text,
-    tokenize_and_count_words,
-    create_word_frequency_dataframe,
-    create_wordclouds,
-)
 from . import settings
+from .metrics import recorder_from_settings
+from .checkpoint import (
+    CheckpointStore,
+    RESUME_STAGES,
+    STAGE_OUTPUTS,
+    plan_resume,
+    stage_fingerprint,
+)
 
 
 def data_processing(
@@ -20,8 +19,10 @@ def data_processing(
     extract_topics=False,
     dedupe=False,
     tokenize=False,
+    index_tokens=False,
     word_frequency=False,
     create_wordcloud=False,
+    resume_from=None,
 ):
     """
     数据处理的统一入口函数
@@ -36,15 +37,21 @@ def data_processing(
         是否执行去重操作
     tokenize : bool
         是否执行分词和词频统计的操作
+    index_tokens : bool
+        是否为每条微博分词并构建分词倒排索引（保存到 settings.TOKEN_INDEX_PATH）
     word_frequency : bool
         是否生成词频DataFrame
     create_wordcloud : bool
         是否生成词云图片
+    resume_from : str or None
+        从指定阶段恢复（'extract_topics', 'dedupe', 'tokenize', 'word_frequency', 'create_wordcloud'），
+        上游阶段的输出从 settings.CHECKPOINT_DIR 中最近的有效检查点读取，不再重新计算
         
     返回值：
     -----------
     dict
-        包含各处理步骤输出的字典
+        包含各处理步骤输出的字典，'metrics' 为各阶段的耗时、CPU时间、峰值内存和行数
+        （见 settings.METRICS_*）
         
     示例：
     -----------
@@ -52,19 +59,97 @@ def data_processing(
     >>> df = result['df']
     >>> word_freq = result['word_freq_by_keyword']
     """
+    # pandas、jieba、matplotlib、wordcloud、scipy 等依赖较重，调用时才导入，
+    # 使 `import utils` 和 `python -m utils --help` 不必加载它们
+    from processing.post_analysis import (
+        load_posts_from_folder,
+        extract_top_topics,
+        dedupe_posts,
+        clean_text,
+        tokenize_and_count_words,
+        create_word_frequency_dataframe,
+        create_wordclouds,
+    )
+    from .parallel_loader import load_posts_parallel
+    from .dedupe_lsh import dedupe_posts_minhash, compare_with_exact
+    from .parallel_tokenize import tokenize_parallel
+    from .term_matrix import KeywordTermMatrix, tokenize_to_matrix
+    from .parallel_wordcloud import render_wordclouds_parallel
+    from .topic_index import build_topic_index
+    from .token_index import build_token_index
+
     result = {}
     df = None
+    store = None
+    chain = []
+    recorder = recorder_from_settings()
+    if settings.CHECKPOINT_DIR is not None:
+        store = CheckpointStore(settings.CHECKPOINT_DIR, keep=settings.CHECKPOINT_KEEP)
+    
+    def save_checkpoint(stage, value):
+        upstream = chain[-1][1] if chain else None
+        chain.append((stage, stage_fingerprint(stage, upstream)))
+        if store is not None:
+            store.save(stage, list(chain), value)
+    
+    # 0. 从检查点恢复
+    if resume_from is not None:
+        if resume_from not in RESUME_STAGES:
+            raise ValueError(f"resume_from 必须是 {RESUME_STAGES} 之一")
+        if store is None:
+            raise ValueError("CHECKPOINT_DIR未设置，无法从检查点恢复")
+        meta, value = store.latest_valid(resume_from)
+        if meta is None:
+            raise ValueError(f"没有可用于从 {resume_from} 恢复的有效检查点")
+        
+        chain = [tuple(item) for item in meta['chain']]
+        result[STAGE_OUTPUTS[meta['stage']]] = value
+        if STAGE_OUTPUTS[meta['stage']] == 'df':
+            df = value
+        print(f"✓ 已从检查点恢复 {meta['stage']} 阶段的输出")
+        
+        flags = plan_resume(
+            resume_from,
+            meta['stage'],
+            {
+                'load': load_files_from_folder,
+                'extract_topics': extract_topics,
+                'dedupe': dedupe,
+                'tokenize': tokenize,
+                'word_frequency': word_frequency,
+                'create_wordcloud': create_wordcloud,
+            },
+            set(result),
+            previous_chain=store.latest_chain(resume_from),
+        )
+        load_files_from_folder = flags['load']
+        extract_topics = flags['extract_topics']
+        dedupe = flags['dedupe']
+        tokenize = flags['tokenize']
+        word_frequency = flags['word_frequency']
+        create_wordcloud = flags['create_wordcloud']
     
     # 1. 加载文件
     if load_files_from_folder:
         if settings.LOAD_POSTS_FOLDER_PATH is None:
             raise ValueError("LOAD_POSTS_FOLDER_PATH未设置，请在settings.py中配置")
         
-        df = load_posts_from_folder(
-            folder_path=settings.LOAD_POSTS_FOLDER_PATH,
-            keyword_column=settings.LOAD_POSTS_KEYWORD_COLUMN,
-        )
-        result['df'] = df
+        with recorder.stage('load') as record:
+            if settings.LOAD_POSTS_PARALLEL or settings.LOAD_POSTS_CACHE_DIR is not None:
+                df = load_posts_parallel(
+                    folder_path=settings.LOAD_POSTS_FOLDER_PATH,
+                    keyword_column=settings.LOAD_POSTS_KEYWORD_COLUMN,
+                    workers=settings.LOAD_POSTS_WORKERS if settings.LOAD_POSTS_PARALLEL else 1,
+                    cache_dir=settings.LOAD_POSTS_CACHE_DIR,
+                )
+            else:
+                df = load_posts_from_folder(
+                    folder_path=settings.LOAD_POSTS_FOLDER_PATH,
+                    keyword_column=settings.LOAD_POSTS_KEYWORD_COLUMN,
+                )
+            record['rows_out'] = len(df)
+            result['df'] = df
+            save_checkpoint('load', df)
         print(f"✓ 已加载数据，共{len(df)}行")
     
     # 2. 提取话题
@@ -72,12 +157,23 @@ def data_processing(
         if df is None:
             raise ValueError("需要先执行load_files_from_folder")
         
-        df = extract_top_topics(
-            df=df,
-            topics_column=settings.EXTRACT_TOPICS_TOPICS_COLUMN,
-            id_column=settings.EXTRACT_TOPICS_ID_COLUMN,
-        )
-        result['df'] = df
+        with recorder.stage('extract_topics', rows_in=len(df)) as record:
+            if settings.TOPIC_INDEX_PATH is not None:
+                result['topic_index'] = build_topic_index(
+                    df=df,
+                    path=settings.TOPIC_INDEX_PATH,
+                    topics_column=settings.EXTRACT_TOPICS_TOPICS_COLUMN,
+                    id_column=settings.EXTRACT_TOPICS_ID_COLUMN,
+                    keyword_column=settings.LOAD_POSTS_KEYWORD_COLUMN,
+                )
+            df = extract_top_topics(
+                df=df,
+                topics_column=settings.EXTRACT_TOPICS_TOPICS_COLUMN,
+                id_column=settings.EXTRACT_TOPICS_ID_COLUMN,
+            )
+            record['rows_out'] = len(df)
+            result['df'] = df
+            save_checkpoint('extract_topics', df)
         print(f"✓ 已提取话题")
     
     # 3. 去重
@@ -85,8 +181,7 @@ def data_processing(
         if df is None:
             raise ValueError("需要先执行load_files_from_folder")
         
-        df = dedupe_posts(
-            df=df,
+        dedupe_kwargs = dict(
             keyword_col=settings.DEDUPE_KEYWORD_COL,
             text_col=settings.DEDUPE_TEXT_COL,
             time_col=settings.DEDUPE_TIME_COL,
@@ -97,7 +192,29 @@ def data_processing(
             debug_pairs_path=settings.DEDUPE_DEBUG_PAIRS_PATH,
             auto_clean=settings.DEDUPE_AUTO_CLEAN,
         )
-        result['df'] = df
+        if settings.DEDUPE_ENGINE not in ('minhash', 'exact'):
+            raise ValueError(f"未知的去重引擎: {settings.DEDUPE_ENGINE}")
+        with recorder.stage('dedupe', rows_in=len(df)) as record:
+            if settings.DEDUPE_ENGINE == 'minhash':
+                minhash_kwargs = dict(
+                    dedupe_kwargs,
+                    num_perm=settings.DEDUPE_MINHASH_NUM_PERM,
+                    bands=settings.DEDUPE_MINHASH_BANDS,
+                    shingle_size=settings.DEDUPE_MINHASH_SHINGLE_SIZE,
+                )
+                if settings.DEDUPE_MINHASH_VERIFY_SAMPLE:
+                    compare_with_exact(
+                        df,
+                        sample_size=settings.DEDUPE_MINHASH_VERIFY_SAMPLE,
+                        id_column=settings.EXTRACT_TOPICS_ID_COLUMN,
+                        **minhash_kwargs,
+                    )
+                df = dedupe_posts_minhash(df=df, **minhash_kwargs)
+            else:
+                df = dedupe_posts(df=df, **dedupe_kwargs)
+            record['rows_out'] = len(df)
+            result['df'] = df
+            save_checkpoint('dedupe', df)
         print(f"✓ 已去重，剩余{len(df)}行")
     
     # 4. 分词和词频统计
@@ -105,48 +222,133 @@ def data_processing(
         if df is None:
             raise ValueError("需要先执行load_files_from_folder")
         
-        word_freq_by_keyword = tokenize_and_count_words(
-            df=df,
-            text_column=settings.TOKENIZE_TEXT_COLUMN,
-            keyword_column=settings.TOKENIZE_KEYWORD_COLUMN,
-            word_length_range=settings.TOKENIZE_WORD_LENGTH_RANGE,
-        )
-        result['word_freq_by_keyword'] = word_freq_by_keyword
+        with recorder.stage('tokenize', rows_in=len(df)) as record:
+            if settings.TOKENIZE_SPARSE and settings.TOKENIZE_WORKERS == 1 and settings.TOKENIZE_CACHE_PATH is None:
+                word_freq_by_keyword = tokenize_to_matrix(
+                    df=df,
+                    text_column=settings.TOKENIZE_TEXT_COLUMN,
+                    keyword_column=settings.TOKENIZE_KEYWORD_COLUMN,
+                    word_length_range=settings.TOKENIZE_WORD_LENGTH_RANGE,
+                )
+            elif settings.TOKENIZE_WORKERS == 1 and settings.TOKENIZE_CACHE_PATH is None:
+                word_freq_by_keyword = tokenize_and_count_words(
+                    df=df,
+                    text_column=settings.TOKENIZE_TEXT_COLUMN,
+                    keyword_column=settings.TOKENIZE_KEYWORD_COLUMN,
+                    word_length_range=settings.TOKENIZE_WORD_LENGTH_RANGE,
+                )
+            else:
+                word_freq_by_keyword, cache_stats = tokenize_parallel(
+                    df=df,
+                    text_column=settings.TOKENIZE_TEXT_COLUMN,
+                    keyword_column=settings.TOKENIZE_KEYWORD_COLUMN,
+                    word_length_range=settings.TOKENIZE_WORD_LENGTH_RANGE,
+                    workers=settings.TOKENIZE_WORKERS,
+                    cache_path=settings.TOKENIZE_CACHE_PATH,
+                    cache_max_bytes=settings.TOKENIZE_CACHE_MAX_BYTES,
+                )
+                if cache_stats is not None:
+                    record['cache_hit_rate'] = cache_stats['hit_rate']
+                    print(
+                        f"  分词缓存：命中{cache_stats['hits']}，未命中{cache_stats['misses']}，"
+                        f"命中率{cache_stats['hit_rate']:.1%}"
+                    )
+                if settings.TOKENIZE_SPARSE:
+                    word_freq_by_keyword = KeywordTermMatrix.from_counters(word_freq_by_keyword)
+            record['rows_out'] = len(word_freq_by_keyword)
+            result['word_freq_by_keyword'] = word_freq_by_keyword
+            save_checkpoint('tokenize', word_freq_by_keyword)
         print(f"✓ 已完成分词统计")
     
-    # 5. 生成词频DataFrame
+    # 5. 构建分词倒排索引
+    if index_tokens:
+        if df is None:
+            raise ValueError("需要先执行load_files_from_folder")
+        if settings.TOKEN_INDEX_PATH is None:
+            raise ValueError("TOKEN_INDEX_PATH未设置，请在settings.py中配置")
+        
+        with recorder.stage('index_tokens', rows_in=len(df)) as record:
+            token_index = build_token_index(
+                df=df,
+                path=settings.TOKEN_INDEX_PATH,
+                text_column=settings.TOKENIZE_TEXT_COLUMN,
+                keyword_column=settings.TOKENIZE_KEYWORD_COLUMN,
+                id_column=settings.TOKEN_INDEX_ID_COLUMN,
+                word_length_range=settings.TOKENIZE_WORD_LENGTH_RANGE,
+                cache_path=settings.TOKENIZE_CACHE_PATH,
+                cache_max_bytes=settings.TOKENIZE_CACHE_MAX_BYTES,
+            )
+            record['rows_out'] = len(token_index)
+            result['token_index'] = token_index
+        print(f"✓ 已构建分词倒排索引")
+    
+    # 6. 生成词频DataFrame
     if word_frequency:
         if 'word_freq_by_keyword' not in result:
             raise ValueError("需要先执行tokenize")
         
-        word_freq_df = create_word_frequency_dataframe(
-            word_freq_by_keyword=result['word_freq_by_keyword'],
-            top_n=settings.WORD_FREQ_TOP_N,
-        )
-        result['word_freq_df'] = word_freq_df
+        with recorder.stage('word_frequency', rows_in=len(result['word_freq_by_keyword'])) as record:
+            word_freq_by_keyword = result['word_freq_by_keyword']
+            if isinstance(word_freq_by_keyword, KeywordTermMatrix):
+                # 稀疏矩阵先向量化取出前N个词，只把这部分交给 create_word_frequency_dataframe
+                word_freq_by_keyword = word_freq_by_keyword.top_counters(settings.WORD_FREQ_TOP_N)
+            word_freq_df = create_word_frequency_dataframe(
+                word_freq_by_keyword=word_freq_by_keyword,
+                top_n=settings.WORD_FREQ_TOP_N,
+            )
+            record['rows_out'] = len(word_freq_df)
+            result['word_freq_df'] = word_freq_df
+            save_checkpoint('word_frequency', word_freq_df)
         print(f"✓ 已生成词频DataFrame")
     
-    # 6. 生成词云
+    # 7. 生成词云
     if create_wordcloud:
         if 'word_freq_df' not in result:
             raise ValueError("需要先执行word_frequency")
         
-        create_wordclouds(
-            df=result['word_freq_df'],
-            keyword_column=settings.WORDCLOUD_KEYWORD_COLUMN,
-            word_column=settings.WORDCLOUD_WORD_COLUMN,
-            freq_column=settings.WORDCLOUD_FREQ_COLUMN,
-            top_n=settings.WORDCLOUD_TOP_N,
-            font_path=settings.WORDCLOUD_FONT_PATH,
-            colors_list=settings.WORDCLOUD_COLORS_LIST,
-            cols=settings.WORDCLOUD_COLS,
-            figsize=settings.WORDCLOUD_FIGSIZE,
-            prefer_horizontal=settings.WORDCLOUD_PREFER_HORIZONTAL,
-            relative_scaling=settings.WORDCLOUD_RELATIVE_SCALING,
-            min_font_size=settings.WORDCLOUD_MIN_FONT_SIZE,
-            show=settings.WORDCLOUD_SHOW,
-        )
+        with recorder.stage('create_wordcloud', rows_in=len(result['word_freq_df'])) as record:
+            if settings.WORDCLOUD_HEADLESS:
+                rendered = render_wordclouds_parallel(
+                    df=result['word_freq_df'],
+                    keyword_column=settings.WORDCLOUD_KEYWORD_COLUMN,
+                    word_column=settings.WORDCLOUD_WORD_COLUMN,
+                    freq_column=settings.WORDCLOUD_FREQ_COLUMN,
+                    top_n=settings.WORDCLOUD_TOP_N,
+                    output_dir=settings.WORDCLOUD_OUTPUT_DIR,
+                    font_path=settings.WORDCLOUD_FONT_PATH,
+                    colors_list=settings.WORDCLOUD_COLORS_LIST,
+                    tile_size=settings.WORDCLOUD_TILE_SIZE,
+                    prefer_horizontal=settings.WORDCLOUD_PREFER_HORIZONTAL,
+                    relative_scaling=settings.WORDCLOUD_RELATIVE_SCALING,
+                    min_font_size=settings.WORDCLOUD_MIN_FONT_SIZE,
+                    workers=settings.WORDCLOUD_WORKERS,
+                    composite=settings.WORDCLOUD_COMPOSITE,
+                    cols=settings.WORDCLOUD_COLS,
+                    figsize=settings.WORDCLOUD_FIGSIZE,
+                )
+                record['rows_out'] = rendered['rendered']
+                result['wordcloud_files'] = rendered
+            else:
+                create_wordclouds(
+                    df=result['word_freq_df'],
+                    keyword_column=settings.WORDCLOUD_KEYWORD_COLUMN,
+                    word_column=settings.WORDCLOUD_WORD_COLUMN,
+                    freq_column=settings.WORDCLOUD_FREQ_COLUMN,
+                    top_n=settings.WORDCLOUD_TOP_N,
+                    font_path=settings.WORDCLOUD_FONT_PATH,
+                    colors_list=settings.WORDCLOUD_COLORS_LIST,
+                    cols=settings.WORDCLOUD_COLS,
+                    figsize=settings.WORDCLOUD_FIGSIZE,
+                    prefer_horizontal=settings.WORDCLOUD_PREFER_HORIZONTAL,
+                    relative_scaling=settings.WORDCLOUD_RELATIVE_SCALING,
+                    min_font_size=settings.WORDCLOUD_MIN_FONT_SIZE,
+                    show=settings.WORDCLOUD_SHOW,
+                )
+                record['rows_out'] = result['word_freq_df'][settings.WORDCLOUD_KEYWORD_COLUMN].nunique()
         result['wordcloud_generated'] = True
         print(f"✓ 已生成词云")
-    
+
+    result['metrics'] = recorder.records
+    if settings.METRICS_PATH is not None and recorder.records:
+        print(f"✓ 阶段指标已写入 {settings.METRICS_PATH}")
     return result
@@ -0,0 +1,263 @@
+"""
+基于 MinHash + LSH 分桶的近似去重
+用字符 n-gram 的 MinHash 签名做候选生成，候选对再用与原流程相同的相似度阈值校验，
+保留/合并规则与 dedupe_posts 一致：保留发布时间最新的一条，数值列求和，可输出 debug 对
+"""
+
+import difflib
+import zlib
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SUM_COLS = ['点赞数', '评论数', '转发数', '互动总数']
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _shingle_hashes(text, shingle_size):
+    """文本的字符 n-gram 哈希集合"""
+    if len(text) <= shingle_size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+    return np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+
+def _permutations(num_perm, seed):
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, np.iinfo(np.int32).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+    b = rng.randint(0, np.iinfo(np.int32).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+    return a, b
+
+
+def minhash_signatures(texts, num_perm=128, shingle_size=3, seed=1):
+    """
+    计算一组文本的 MinHash 签名矩阵
+
+    返回值：
+    -----------
+    numpy.ndarray
+        形状为 (len(texts), num_perm) 的 uint64 矩阵
+    """
+    a, b = _permutations(num_perm, seed)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = _shingle_hashes(text, shingle_size)
+        values = (np.outer(hashes, a) + b) % _MERSENNE_PRIME & _MAX_HASH
+        signatures[i] = values.min(axis=0)
+    return signatures
+
+
+def _similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _dedupe_group(texts, order, signatures, bands, rows_per_band,
+                  similarity_threshold, min_len_for_similarity):
+    """
+    按时间从新到旧依次处理，每条文本只和同桶中已保留的代表文本比较
+
+    返回值：
+    -----------
+    (list, dict)
+        被保留的位置列表，以及 {被合并位置: (代表位置, 相似度)}
+    """
+    exact = {}
+    buckets = [dict() for _ in range(bands)]
+    kept = []
+    merged = {}
+
+    for pos in order:
+        text = texts[pos]
+        rep = exact.get(text)
+        if rep is not None:
+            merged[pos] = (rep, 1.0)
+            continue
+
+        long_enough = len(text) >= min_len_for_similarity
+        keys = None
+        if long_enough:
+            keys = [
+                signatures[pos, band * rows_per_band:(band + 1) * rows_per_band].tobytes()
+                for band in range(bands)
+            ]
+            candidates = []
+            seen = set()
+            for band, key in enumerate(keys):
+                for cand in buckets[band].get(key, ()):
+                    if cand not in seen:
+                        seen.add(cand)
+                        candidates.append(cand)
+            best, best_score = None, 0.0
+            for cand in candidates:
+                score = _similarity(text, texts[cand])
+                if score >= similarity_threshold and score > best_score:
+                    best, best_score = cand, score
+            if best is not None:
+                merged[pos] = (best, best_score)
+                continue
+
+        kept.append(pos)
+        exact[text] = pos
+        if long_enough:
+            for band, key in enumerate(keys):
+                buckets[band].setdefault(key, []).append(pos)
+
+    return kept, merged
+
+
+def dedupe_posts_minhash(
+    df,
+    keyword_col,
+    text_col,
+    time_col,
+    sum_cols=None,
+    similarity_threshold=0.88,
+    min_len_for_similarity=6,
+    debug=False,
+    debug_pairs_path=None,
+    auto_clean=False,
+    num_perm=128,
+    bands=32,
+    shingle_size=3,
+):
+    """
+    使用 MinHash/LSH 生成候选对的去重，参数含义与 dedupe_posts 相同
+
+    参数：
+    -----------
+    num_perm : int
+        MinHash 签名长度
+    bands : int
+        LSH 分桶的段数，num_perm 必须能被其整除；段数越多召回越高、候选越多
+    shingle_size : int
+        字符 n-gram 的长度
+
+    返回值：
+    -----------
+    pandas.DataFrame
+        去重后的DataFrame
+    """
+    if num_perm % bands != 0:
+        raise ValueError("DEDUPE_MINHASH_NUM_PERM 必须能被 DEDUPE_MINHASH_BANDS 整除")
+    rows_per_band = num_perm // bands
+
+    df = df.copy()
+    if text_col not in df.columns:
+        if not auto_clean:
+            raise ValueError(f"列 {text_col} 不存在，可设置 DEDUPE_AUTO_CLEAN=True 自动清洗")
+        from processing.post_analysis import clean_text
+        df[text_col] = df['微博正文'].map(clean_text)
+
+    if sum_cols is None:
+        sum_cols = DEFAULT_SUM_COLS
+    sum_cols = [c for c in sum_cols if c in df.columns]
+
+    times = pd.to_datetime(df[time_col], errors='coerce')
+    texts_all = df[text_col].fillna('').astype(str).to_numpy()
+    sums = df[sum_cols].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy() if sum_cols else None
+
+    keep_index = []
+    sum_updates = {}
+    debug_pairs = []
+
+    for keyword, positions in df.groupby(keyword_col, sort=False).indices.items():
+        texts = texts_all[positions]
+        # 最新的排在前面，时间缺失的排在最后
+        order = (
+            pd.Series(times.to_numpy()[positions])
+            .sort_values(ascending=False, kind='mergesort', na_position='last')
+            .index.to_numpy()
+        )
+        signatures = minhash_signatures(texts, num_perm=num_perm, shingle_size=shingle_size)
+        kept, merged = _dedupe_group(
+            texts, order, signatures, bands, rows_per_band,
+            similarity_threshold, min_len_for_similarity,
+        )
+
+        keep_index.extend(positions[kept])
+        if sums is not None:
+            totals = {pos: sums[positions[pos]].copy() for pos in kept}
+            for pos, (rep, _) in merged.items():
+                totals[rep] += sums[positions[pos]]
+            sum_updates.update({positions[pos]: total for pos, total in totals.items()})
+        if debug or debug_pairs_path:
+            for pos, (rep, score) in merged.items():
+                debug_pairs.append({
+                    keyword_col: keyword,
+                    'kept_text': texts[rep],
+                    'dropped_text': texts[pos],
+                    'similarity': round(score, 4),
+                })
+
+    keep_index = sorted(keep_index)
+    result = df.iloc[keep_index].copy()
+    if sums is not None:
+        new_sums = np.vstack([sum_updates[i] for i in keep_index]) if keep_index else sums[:0]
+        for j, col in enumerate(sum_cols):
+            result[col] = pd.Series(new_sums[:, j], index=result.index).astype(
+                df[col].dtype if pd.api.types.is_numeric_dtype(df[col]) else 'float64'
+            )
+
+    if debug:
+        print(f"  [debug] 合并了{len(debug_pairs)}对相似微博")
+    if debug_pairs_path:
+        pd.DataFrame(debug_pairs).to_csv(debug_pairs_path, index=False, encoding='utf-8-sig')
+
+    return result.reset_index(drop=True)
+
+
+def compare_with_exact(df, sample_size=2000, id_column='id', random_state=42, **dedupe_kwargs):
+    """
+    在样本上同时运行 dedupe_posts 与 MinHash 引擎，报告两者保留结果的一致程度
+
+    参数：
+    -----------
+    df : pandas.DataFrame
+        去重前的数据
+    sample_size : int
+        抽样行数
+    id_column : str
+        用于比较保留记录的ID列
+    **dedupe_kwargs
+        传给 dedupe_posts_minhash 的参数（MinHash专属参数不会传给 dedupe_posts）
+
+    返回值：
+    -----------
+    dict
+        各自保留的行数、保留ID的精确率/召回率/Jaccard
+    """
+    from processing.post_analysis import dedupe_posts
+
+    sample = df.sample(n=min(sample_size, len(df)), random_state=random_state)
+    exact_kwargs = {
+        k: v for k, v in dedupe_kwargs.items()
+        if k not in ('num_perm', 'bands', 'shingle_size')
+    }
+    exact_kwargs.update(debug=False, debug_pairs_path=None)
+    minhash_kwargs = dict(dedupe_kwargs, debug=False, debug_pairs_path=None)
+
+    exact_ids = set(dedupe_posts(df=sample, **exact_kwargs)[id_column].astype(str))
+    minhash_ids = set(dedupe_posts_minhash(df=sample, **minhash_kwargs)[id_column].astype(str))
+
+    common = len(exact_ids & minhash_ids)
+    report = {
+        'sample_rows': len(sample),
+        'exact_kept': len(exact_ids),
+        'minhash_kept': len(minhash_ids),
+        'precision': common / len(minhash_ids) if minhash_ids else 1.0,
+        'recall': common / len(exact_ids) if exact_ids else 1.0,
+        'jaccard': common / len(exact_ids | minhash_ids) if (exact_ids | minhash_ids) else 1.0,
+    }
+    print(
+        f"  MinHash与逐对比较一致性（样本{report['sample_rows']}行）："
+        f"保留 {report['minhash_kept']} / {report['exact_kept']}，"
+        f"精确率 {report['precision']:.3f}，召回率 {report['recall']:.3f}，Jaccard {report['jaccard']:.3f}"
+    )
+    return report
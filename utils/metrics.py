@@ -0,0 +1,193 @@
+"""
+分阶段运行指标
+记录 data_processing 每个阶段的耗时、CPU时间、峰值常驻内存和输入/输出行数，
+可写为JSON lines或Prometheus文本文件（node_exporter textfile格式），并可按阶段保存cProfile结果
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from . import settings
+
+METRIC_PREFIX = 'weibo_stage'
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """当前进程的常驻内存（字节），不支持 /proc 的系统退回 ru_maxrss"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return 0
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+class PeakRSSSampler:
+    """
+    后台线程定时采样常驻内存，记录区间内的峰值
+    （只统计当前进程，多进程分词/加载时子进程的内存不计入）
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return False
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus(path, records):
+    """把各阶段指标写成Prometheus文本格式（先写临时文件再替换，避免采集到半个文件）"""
+    fields = [
+        ('wall_seconds', 'Stage wall-clock time in seconds'),
+        ('cpu_seconds', 'Stage CPU time of this process in seconds'),
+        ('peak_rss_bytes', 'Peak resident set size of this process during the stage'),
+        ('rows_in', 'Rows entering the stage'),
+        ('rows_out', 'Rows leaving the stage'),
+    ]
+    lines = []
+    for field, help_text in fields:
+        name = f"{METRIC_PREFIX}_{field}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for record in records:
+            if record.get(field) is None:
+                continue
+            lines.append(f'{name}{{stage="{_escape_label(record["stage"])}"}} {record[field]}')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+class StageRecorder:
+    """
+    阶段指标记录器
+
+    参数：
+    -----------
+    path : str or None
+        指标输出路径，None则只在内存中保留（data_processing 的返回值中仍包含指标）
+    output_format : str
+        'jsonl' 每个阶段追加一行JSON；'prometheus' 每个阶段结束后重写整个文本文件
+    profile_dir : str or None
+        保存每个阶段cProfile结果（<阶段名>.prof，可用 snakeviz / pstats 查看）的目录，None则不做profile
+    sample_interval : float or None
+        峰值内存的采样间隔（秒），None则不启动采样线程，峰值内存取阶段开始和结束时常驻内存的较大值
+    """
+
+    def __init__(self, path=None, output_format='jsonl', profile_dir=None, sample_interval=0.01):
+        if output_format not in ('jsonl', 'prometheus'):
+            raise ValueError("METRICS_FORMAT 必须是 'jsonl' 或 'prometheus'")
+        self.path = path
+        self.output_format = output_format
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+        self.records = []
+        for directory in (os.path.dirname(path) if path else None, profile_dir):
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        记录一个阶段，产出的dict可在阶段内设置 rows_out 等附加字段
+
+        示例：
+        -----------
+        >>> with recorder.stage('dedupe', rows_in=len(df)) as record:
+        ...     df = dedupe_posts(df, ...)
+        ...     record['rows_out'] = len(df)
+        """
+        record = {'run': self.run_id, 'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        profiler = cProfile.Profile() if self.profile_dir else None
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        sampler = PeakRSSSampler(self.sample_interval) if self.sample_interval else None
+        start_rss = current_rss()
+        with sampler if sampler is not None else contextlib.nullcontext():
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield record
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        record['wall_seconds'] = round(time.perf_counter() - start_wall, 4)
+        record['cpu_seconds'] = round(time.process_time() - start_cpu, 4)
+        record['peak_rss_bytes'] = sampler.peak if sampler is not None else max(start_rss, current_rss())
+        record['finished'] = datetime.now().isoformat(timespec='seconds')
+        if profiler is not None:
+            record['profile'] = os.path.join(self.profile_dir, f"{name}.prof")
+            profiler.dump_stats(record['profile'])
+        self.records.append(record)
+        self._write(record)
+
+    def _write(self, record):
+        if not self.path:
+            return
+        if self.output_format == 'jsonl':
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            write_prometheus(self.path, self.records)
+
+    def summary(self):
+        """打印各阶段指标"""
+        for record in self.records:
+            print(
+                f"  {record['stage']:<18}{record['wall_seconds']:>9.2f}s  CPU {record['cpu_seconds']:>8.2f}s  "
+                f"峰值内存 {record['peak_rss_bytes'] / 1024 / 1024:>8.1f}MB  "
+                f"行数 {record['rows_in']} → {record['rows_out']}"
+            )
+
+
+def recorder_from_settings():
+    """
+    按 settings 中的 METRICS_* 参数创建记录器
+    METRICS_SAMPLE_RSS 为None时只在写指标文件（METRICS_PATH）时启动峰值内存采样线程
+    """
+    sample_rss = settings.METRICS_SAMPLE_RSS
+    if sample_rss is None:
+        sample_rss = settings.METRICS_PATH is not None
+    return StageRecorder(
+        path=settings.METRICS_PATH,
+        output_format=settings.METRICS_FORMAT,
+        profile_dir=settings.METRICS_PROFILE_DIR,
+        sample_interval=settings.METRICS_SAMPLE_INTERVAL if sample_rss else None,
+    )
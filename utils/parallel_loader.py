@@ -0,0 +1,166 @@
+"""
+多进程 + 缓存的CSV加载
+逐文件复用 load_posts_from_folder，在进程池中并行解析，
+并将每个文件的解析结果以Parquet格式缓存，按 (路径, mtime, 大小) 判断是否失效
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def list_csv_files(folder_path):
+    """列出文件夹下的CSV文件（按文件名排序）"""
+    names = sorted(
+        name for name in os.listdir(folder_path)
+        if name.lower().endswith('.csv') and os.path.isfile(os.path.join(folder_path, name))
+    )
+    return [os.path.join(folder_path, name) for name in names]
+
+
+def file_signature(path):
+    """文件签名：绝对路径、修改时间(ns)、文件大小"""
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    }
+
+
+def _cache_file_name(abs_path):
+    return hashlib.sha1(abs_path.encode('utf-8')).hexdigest() + '.parquet'
+
+
+def _load_manifest(cache_dir):
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(cache_dir, manifest):
+    manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _load_single_file(path, keyword_column, staging_root=None):
+    """
+    在临时目录中只放入这一个文件，再调用 load_posts_from_folder，
+    从而保证关键词列与整文件夹加载时的生成方式完全一致
+    """
+    from processing.post_analysis import load_posts_from_folder
+
+    with tempfile.TemporaryDirectory(dir=staging_root) as tmp_dir:
+        staged = os.path.join(tmp_dir, os.path.basename(path))
+        try:
+            os.link(path, staged)
+        except OSError:
+            shutil.copy2(path, staged)
+        return load_posts_from_folder(folder_path=tmp_dir, keyword_column=keyword_column)
+
+
+def load_posts_parallel(folder_path, keyword_column, workers=None, cache_dir=None):
+    """
+    并行加载文件夹中的CSV文件，并可选使用Parquet缓存
+
+    参数：
+    -----------
+    folder_path : str
+        CSV文件所在文件夹
+    keyword_column : str
+        新增关键词列的名称（与 load_posts_from_folder 相同）
+    workers : int or None
+        进程数，None则为CPU核数
+    cache_dir : str or None
+        缓存目录，None则不使用缓存
+
+    返回值：
+    -----------
+    pandas.DataFrame
+        所有文件合并后的DataFrame
+    """
+    import pandas as pd
+
+    paths = list_csv_files(folder_path)
+    if not paths:
+        raise ValueError(f"文件夹 {folder_path} 中没有CSV文件")
+
+    signatures = {path: file_signature(path) for path in paths}
+    manifest = {}
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = _load_manifest(cache_dir)
+
+    frames = {}
+    to_parse = []
+    for path in paths:
+        sig = signatures[path]
+        entry = manifest.get(sig['path'])
+        if (
+            entry is not None
+            and entry.get('mtime_ns') == sig['mtime_ns']
+            and entry.get('size') == sig['size']
+            and entry.get('keyword_column') == keyword_column
+        ):
+            cache_path = os.path.join(cache_dir, entry['cache_file'])
+            try:
+                frames[path] = pd.read_parquet(cache_path)
+                continue
+            except Exception:
+                pass
+        to_parse.append(path)
+
+    print(f"  共{len(paths)}个文件，命中缓存{len(paths) - len(to_parse)}个，需解析{len(to_parse)}个")
+
+    if to_parse:
+        staging_root = cache_dir
+        if len(to_parse) == 1 or workers == 1:
+            parsed = [_load_single_file(p, keyword_column, staging_root) for p in to_parse]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(
+                    _load_single_file,
+                    to_parse,
+                    [keyword_column] * len(to_parse),
+                    [staging_root] * len(to_parse),
+                ))
+
+        for path, df in zip(to_parse, parsed):
+            frames[path] = df
+            if cache_dir is None:
+                continue
+            sig = signatures[path]
+            cache_file = _cache_file_name(sig['path'])
+            try:
+                df.to_parquet(os.path.join(cache_dir, cache_file), index=False)
+            except Exception as e:
+                # 列类型混杂等情况无法写入Parquet时，仅跳过缓存
+                print(f"  ⚠️ 无法缓存 {path}: {e}")
+                manifest.pop(sig['path'], None)
+                continue
+            manifest[sig['path']] = dict(sig, cache_file=cache_file, keyword_column=keyword_column)
+
+    if cache_dir is not None:
+        # 清理已不存在的文件对应的缓存
+        current = {sig['path'] for sig in signatures.values()}
+        for abs_path in list(manifest):
+            if abs_path.startswith(os.path.abspath(folder_path) + os.sep) and abs_path not in current:
+                stale = os.path.join(cache_dir, manifest.pop(abs_path)['cache_file'])
+                if os.path.exists(stale):
+                    os.remove(stale)
+        _save_manifest(cache_dir, manifest)
+
+    return pd.concat([frames[path] for path in paths], ignore_index=True)
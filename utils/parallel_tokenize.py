@@ -0,0 +1,170 @@
+"""
+多进程分词统计
+将行切分为连续的分片，在每个工作进程中调用 tokenize_and_count_words（使用分词缓存时为 count_words），
+再按分片顺序合并各关键词的 Counter，结果与单进程执行一致
+"""
+
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .seg_cache import SegmentationCache, cached_lcut
+
+SHARDS_PER_WORKER = 4  # 每个进程分到的分片数，用于平衡各分片耗时差异
+MIN_ROWS_PER_SHARD = 500  # 行数过少时不值得启动进程池
+
+
+_worker_cache = None
+
+
+def _init_worker(cache_path=None, cache_max_bytes=None):
+    """每个工作进程只加载一次 jieba 词典，并打开各自的分词缓存连接"""
+    global _worker_cache
+    import jieba
+    jieba.initialize()
+    if cache_path is not None:
+        _worker_cache = SegmentationCache(cache_path, max_bytes=cache_max_bytes)
+
+
+def count_words(df, text_column, keyword_column, word_length_range, lcut):
+    """
+    按 tokenize_and_count_words 的规则统计各关键词的词频（jieba.lcut(clean_text(正文)) 加长度过滤），
+    分词函数由调用方传入（如 seg_cache.cached_lcut 返回的带缓存版本），不需要替换 jieba 的全局函数
+
+    参数：
+    -----------
+    df : pandas.DataFrame
+        包含文本和关键词的数据
+    text_column : str
+        文本列名
+    keyword_column : str
+        关键词列名
+    word_length_range : tuple
+        保留词的长度范围 (最小, 最大)
+    lcut : callable
+        分词函数 lcut(text) -> list of str
+
+    返回值：
+    -----------
+    dict
+        {关键词: Counter}，与 tokenize_and_count_words 相同
+    """
+    from processing.post_analysis import clean_text
+
+    low, high = word_length_range
+    counts = {}
+    for keyword, texts in df.groupby(keyword_column)[text_column]:
+        counter = Counter()
+        for text in texts.astype(str):
+            counter.update(w for w in lcut(clean_text(text)) if low <= len(w) <= high)
+        counts[keyword] = counter
+    return counts
+
+
+def _tokenize_shard(shard, text_column, keyword_column, word_length_range):
+    from processing.post_analysis import tokenize_and_count_words
+
+    kwargs = dict(
+        df=shard,
+        text_column=text_column,
+        keyword_column=keyword_column,
+        word_length_range=word_length_range,
+    )
+    stats = None
+    if _worker_cache is None:
+        counts = tokenize_and_count_words(**kwargs)
+    else:
+        hits, misses = _worker_cache.hits, _worker_cache.misses
+        counts = count_words(lcut=cached_lcut(_worker_cache), **kwargs)
+        _worker_cache.flush()
+        stats = (_worker_cache.hits - hits, _worker_cache.misses - misses)
+    return list(counts.keys()), {kw: dict(c) for kw, c in counts.items()}, stats
+
+
+def merge_word_counts(partials):
+    """
+    按分片顺序合并各分片的关键词词频（reduce 步骤）
+
+    同一关键词内词的插入顺序与单进程顺序扫描时一致，因此 most_common 的并列顺序也一致；
+    若每个分片内关键词都是有序的（groupby 默认排序），合并后的关键词也保持排序
+    """
+    merged = {}
+    all_sorted = True
+    for keys, counts, _ in partials:
+        if keys != sorted(keys):
+            all_sorted = False
+        for kw in keys:
+            merged.setdefault(kw, Counter()).update(counts[kw])
+    if all_sorted:
+        merged = {kw: merged[kw] for kw in sorted(merged)}
+    return merged
+
+
+def tokenize_parallel(df, text_column, keyword_column, word_length_range, workers=None,
+                      cache_path=None, cache_max_bytes=None):
+    """
+    多进程版本的 tokenize_and_count_words
+
+    参数：
+    -----------
+    df : pandas.DataFrame
+        包含文本和关键词的数据
+    text_column : str
+        文本列名
+    keyword_column : str
+        关键词列名
+    word_length_range : tuple
+        保留词的长度范围 (最小, 最大)
+    workers : int or None
+        进程数，None则为CPU核数
+    cache_path : str or None
+        分词缓存路径，None则不使用缓存
+    cache_max_bytes : int or None
+        分词缓存容量上限
+
+    返回值：
+    -----------
+    (dict, dict or None)
+        {关键词: Counter}（与 tokenize_and_count_words 相同），以及分词缓存的命中统计
+    """
+    workers = workers or os.cpu_count() or 1
+    data = df[[text_column, keyword_column]]
+    n_shards = min(workers * SHARDS_PER_WORKER, max(1, len(data) // MIN_ROWS_PER_SHARD))
+
+    if workers == 1 or n_shards == 1:
+        if cache_path is None:
+            _, counts, _ = _tokenize_shard(data, text_column, keyword_column, word_length_range)
+            return {kw: Counter(c) for kw, c in counts.items()}, None
+        cache = SegmentationCache(cache_path, cache_max_bytes)
+        counts = count_words(data, text_column, keyword_column, word_length_range, cached_lcut(cache))
+        cache.close()
+        return counts, cache.stats()
+
+    bounds = np.array_split(np.arange(len(data)), n_shards)
+    shards = [data.iloc[b[0]:b[-1] + 1] for b in bounds if len(b)]
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(cache_path, cache_max_bytes),
+    ) as executor:
+        partials = list(executor.map(
+            _tokenize_shard,
+            shards,
+            [text_column] * len(shards),
+            [keyword_column] * len(shards),
+            [word_length_range] * len(shards),
+        ))
+
+    stats = None
+    if cache_path is not None:
+        hits = sum(p[2][0] for p in partials)
+        misses = sum(p[2][1] for p in partials)
+        stats = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+        }
+    return merge_word_counts(partials), stats
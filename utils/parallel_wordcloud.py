@@ -0,0 +1,259 @@
+"""
+无界面并行词云
+每个关键词单独渲染为PNG（进程池 + Agg后端，不弹出窗口），可选拼成一张总图；
+每张图按 (词频、字体、布局参数) 的哈希缓存，参数和词频未变化的关键词不会重新布局
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+MANIFEST_NAME = 'manifest.json'
+RANDOM_STATE = 42  # 固定随机种子，相同输入的布局完全一致，缓存才有意义
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def keyword_frequencies(df, keyword_column, word_column, freq_column, top_n):
+    """从词频表中按关键词取出前N个 {词: 词频}（保持关键词和词的原有顺序）"""
+    out = {}
+    for keyword, group in df.groupby(keyword_column, sort=False):
+        group = group.head(top_n)
+        out[keyword] = dict(zip(group[word_column].astype(str), group[freq_column].astype(float)))
+    return out
+
+
+def _font_signature(font_path):
+    if font_path and os.path.exists(font_path):
+        stat = os.stat(font_path)
+        return [os.path.abspath(font_path), stat.st_mtime_ns, stat.st_size]
+    return [font_path]
+
+
+def render_key(frequencies, options):
+    """一个关键词词云的缓存键：词频、字体文件签名、布局参数和 wordcloud 版本"""
+    import wordcloud
+
+    payload = json.dumps(
+        {
+            'frequencies': list(frequencies.items()),
+            'font': _font_signature(options['font_path']),
+            'options': {k: v for k, v in options.items() if k != 'font_path'},
+            'wordcloud': wordcloud.__version__,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=list,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _file_name(keyword, key):
+    safe = _UNSAFE_CHARS.sub('_', str(keyword)).strip('_') or 'keyword'
+    return f"{safe}_{key[:12]}.png"
+
+
+def _init_worker():
+    # 只在进程池的工作进程中设置，调用方进程的 matplotlib 后端保持不变
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+def _render_one(keyword, frequencies, options, path):
+    """在工作进程中布局并保存一个关键词的词云"""
+    from wordcloud import WordCloud
+
+    colormap = None
+    if options['colors_list']:
+        from matplotlib.colors import LinearSegmentedColormap
+        colormap = LinearSegmentedColormap.from_list('wordcloud', list(options['colors_list']))
+    width, height = options['tile_size']
+    cloud = WordCloud(
+        font_path=options['font_path'],
+        width=width,
+        height=height,
+        background_color='white',
+        colormap=colormap or 'viridis',
+        prefer_horizontal=options['prefer_horizontal'],
+        relative_scaling=options['relative_scaling'],
+        min_font_size=options['min_font_size'],
+        max_words=max(len(frequencies), 1),
+        random_state=RANDOM_STATE,
+    )
+    if frequencies:
+        cloud.generate_from_frequencies(frequencies)
+        cloud.to_file(path)
+    else:
+        from PIL import Image
+        Image.new('RGB', (width, height), 'white').save(path)
+    return keyword, path
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    empty = {'keywords': {}, 'composite': None}
+    if not os.path.exists(path):
+        return empty
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty
+    return manifest if 'keywords' in manifest else empty
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compose_wordclouds(paths, output_path, cols, figsize, font_path=None):
+    """
+    把各关键词的PNG按 cols 列拼成一张带标题的总图
+    （直接使用 Agg 画布，不切换全局 matplotlib 后端，之后仍可用 show=True 弹出窗口）
+
+    参数：
+    -----------
+    paths : dict
+        {关键词: PNG路径}，按绘制顺序排列
+    output_path : str
+        总图保存路径
+    cols : int
+        列数
+    figsize : tuple
+        图像大小 (宽, 高)
+    font_path : str or None
+        标题字体（中文关键词需要中文字体）
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.font_manager import FontProperties
+    from PIL import Image
+
+    cols = max(1, min(cols, len(paths)))
+    rows = math.ceil(len(paths) / cols)
+    title_font = FontProperties(fname=font_path) if font_path and os.path.exists(font_path) else None
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(rows, cols, squeeze=False)
+    for ax in axes.flat:
+        ax.axis('off')
+    for ax, (keyword, path) in zip(axes.flat, paths.items()):
+        with Image.open(path) as image:
+            ax.imshow(image, interpolation='bilinear')
+        ax.set_title(str(keyword), fontproperties=title_font)
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=100)
+    return output_path
+
+
+def render_wordclouds_parallel(df, keyword_column, word_column, freq_column, top_n, output_dir,
+                               font_path=None, colors_list=None, tile_size=(800, 500),
+                               prefer_horizontal=1.0, relative_scaling=0.5, min_font_size=10,
+                               workers=None, composite=True, cols=3, figsize=(20, 10)):
+    """
+    无界面并行生成词云：每个关键词一张PNG，按哈希缓存，未变化的关键词直接复用
+
+    参数：
+    -----------
+    df : pandas.DataFrame
+        词频表（create_word_frequency_dataframe 的输出）
+    keyword_column, word_column, freq_column : str
+        关键词、词、词频列名
+    top_n : int
+        每个关键词取前N个词
+    output_dir : str
+        输出目录，PNG和缓存清单(manifest.json)都保存在这里
+    font_path : str or None
+        字体路径（None则使用 wordcloud 自带字体，无法显示中文）
+    colors_list : list or None
+        颜色列表，None则使用蓝绿黄渐变(viridis)
+    tile_size : tuple
+        每张词云的像素大小 (宽, 高)
+    prefer_horizontal, relative_scaling, min_font_size
+        同 WordCloud 参数
+    workers : int or None
+        进程数，None则为CPU核数
+    composite : bool
+        是否另外拼成一张总图 (all_keywords.png)
+    cols, figsize
+        总图的列数和大小
+
+    返回值：
+    -----------
+    dict
+        {'paths': {关键词: PNG路径}, 'composite': 总图路径或None, 'rendered': 渲染数, 'cached': 复用数}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    options = {
+        'font_path': font_path,
+        'colors_list': list(colors_list) if colors_list else None,
+        'tile_size': list(tile_size),
+        'prefer_horizontal': prefer_horizontal,
+        'relative_scaling': relative_scaling,
+        'min_font_size': min_font_size,
+    }
+    frequencies = keyword_frequencies(df, keyword_column, word_column, freq_column, top_n)
+    manifest = _load_manifest(output_dir)
+
+    paths, todo = {}, []
+    for keyword, freqs in frequencies.items():
+        key = render_key(freqs, options)
+        path = os.path.join(output_dir, _file_name(keyword, key))
+        paths[keyword] = path
+        entry = manifest['keywords'].get(str(keyword))
+        if entry and entry.get('key') == key and os.path.exists(path):
+            continue
+        todo.append((keyword, freqs, key, path))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) <= 1:
+        for keyword, freqs, _, path in todo:
+            _render_one(keyword, freqs, options, path)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo)), initializer=_init_worker) as executor:
+            list(executor.map(
+                _render_one,
+                [t[0] for t in todo],
+                [t[1] for t in todo],
+                [options] * len(todo),
+                [t[3] for t in todo],
+            ))
+
+    for keyword, _, key, path in todo:
+        old = manifest['keywords'].get(str(keyword))
+        if old and old.get('file') != os.path.basename(path):
+            old_path = os.path.join(output_dir, old['file'])
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        manifest['keywords'][str(keyword)] = {'key': key, 'file': os.path.basename(path)}
+
+    # 词频表中已不存在的关键词：删除其PNG和清单条目
+    current = {str(keyword) for keyword in frequencies}
+    for keyword in [k for k in manifest['keywords'] if k not in current]:
+        old_path = os.path.join(output_dir, manifest['keywords'].pop(keyword)['file'])
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+    composite_path = None
+    if composite and paths:
+        composite_path = os.path.join(output_dir, 'all_keywords.png')
+        composite_key = hashlib.sha256(json.dumps(
+            [[os.path.basename(p) for p in paths.values()], cols, list(figsize), _font_signature(font_path)],
+            ensure_ascii=False,
+        ).encode('utf-8')).hexdigest()
+        if manifest.get('composite') != composite_key or not os.path.exists(composite_path):
+            compose_wordclouds(paths, composite_path, cols, figsize, font_path)
+            manifest['composite'] = composite_key
+    _save_manifest(output_dir, manifest)
+    print(f"  词云：渲染{len(todo)}个，复用缓存{len(paths) - len(todo)}个，输出目录 {output_dir}")
+    return {
+        'paths': paths,
+        'composite': composite_path,
+        'rendered': len(todo),
+        'cached': len(paths) - len(todo),
+    }
@@ -0,0 +1,190 @@
+"""
+分词结果缓存
+以 (jieba词典版本, 分词参数, 清洗后文本) 的哈希为键，把 jieba 的分词结果存入 SQLite，
+重复运行时只对未见过的文本分词；超过容量上限时按最近使用时间(LRU)淘汰
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+FLUSH_EVERY = 2000  # 累积多少条写入/访问记录后落盘一次
+
+
+def jieba_dictionary_version():
+    """当前 jieba 词典的版本标识：jieba版本、词典文件、以及已加载词条数（含自定义词）"""
+    import jieba
+
+    jieba.initialize()
+    dt = jieba.dt
+    dict_path = dt.dictionary or os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME)
+    try:
+        stat = os.stat(dict_path)
+        dict_sig = f"{os.path.abspath(dict_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    except (OSError, TypeError):
+        dict_sig = str(dict_path)
+    return f"jieba-{jieba.__version__}|{dict_sig}|{len(dt.FREQ)}|{dt.total}"
+
+
+class SegmentationCache:
+    """
+    基于 SQLite 的分词缓存
+
+    参数：
+    -----------
+    path : str
+        缓存数据库路径
+    max_bytes : int or None
+        缓存中分词结果的总字节上限，None则不限制
+    """
+
+    def __init__(self, path, max_bytes=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._version = jieba_dictionary_version()
+        self._pending = {}
+        self._touched = set()
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS segments ('
+            ' key TEXT PRIMARY KEY, tokens TEXT NOT NULL,'
+            ' size INTEGER NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_segments_last_used ON segments(last_used)')
+        # 总字节数保存在 meta 表中，由触发器随插入/删除更新，淘汰检查不必扫描全表；
+        # 旧版本创建的缓存没有该行时，在这里统计一次
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value)"
+            " SELECT 'total_size', COALESCE(SUM(size), 0) FROM segments"
+        )
+        self._conn.execute(
+            'CREATE TRIGGER IF NOT EXISTS segments_size_insert AFTER INSERT ON segments BEGIN'
+            " UPDATE meta SET value = value + NEW.size WHERE name = 'total_size'; END"
+        )
+        self._conn.execute(
+            'CREATE TRIGGER IF NOT EXISTS segments_size_delete AFTER DELETE ON segments BEGIN'
+            " UPDATE meta SET value = value - OLD.size WHERE name = 'total_size'; END"
+        )
+        self._conn.commit()
+
+    def key(self, text, options=''):
+        material = f"{self._version}\x00{options}\x00{text}"
+        return hashlib.sha1(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if key in self._pending:
+            self.hits += 1
+            return self._pending[key]
+        row = self._conn.execute('SELECT tokens FROM segments WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.add(key)
+        if len(self._touched) >= FLUSH_EVERY:
+            self.flush()
+        return json.loads(row[0])
+
+    def put(self, key, tokens):
+        self._pending[key] = tokens
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        now = time.time()
+        with self._conn:
+            if self._touched:
+                self._conn.executemany(
+                    'UPDATE segments SET last_used = ? WHERE key = ?',
+                    [(now, k) for k in self._touched],
+                )
+            if self._pending:
+                rows = []
+                for k, tokens in self._pending.items():
+                    payload = json.dumps(tokens, ensure_ascii=False)
+                    rows.append((k, payload, len(payload.encode('utf-8')), now))
+                # 同一个键的分词结果相同，已存在（如其他进程刚写入）时直接跳过；
+                # 不用 REPLACE，否则被替换的旧行不会触发删除触发器，总字节数会偏大
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO segments (key, tokens, size, last_used) VALUES (?, ?, ?, ?)',
+                    rows,
+                )
+        self._touched.clear()
+        self._pending.clear()
+        self._evict()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 淘汰到上限的90%，避免每次写入都触发淘汰
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute('SELECT key, size FROM segments ORDER BY last_used'):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        with self._conn:
+            self._conn.executemany('DELETE FROM segments WHERE key = ?', victims)
+        self.evicted += len(victims)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evicted': self.evicted,
+        }
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def cached_lcut(cache, tokenizer=None):
+    """
+    返回先查缓存、未命中时才分词的 lcut(text) 函数，由调用方显式传给分词逻辑使用
+
+    不修改 jieba 模块的任何属性：不依赖调用方如何导入 jieba，
+    不同调用方（包括常驻服务中的其他线程）各自持有自己的函数和缓存，互不影响
+
+    参数：
+    -----------
+    cache : SegmentationCache
+        分词缓存
+    tokenizer : jieba.Tokenizer or None
+        未命中时使用的分词器，None则为 jieba.dt（与 jieba.lcut 相同的分词器和词典，含已加载的自定义词）
+
+    返回值：
+    -----------
+    callable
+        lcut(text) -> list of str，结果与 tokenizer.lcut(text) 相同
+    """
+    import jieba
+
+    tokenizer = tokenizer or jieba.dt
+
+    def lcut(text):
+        key = cache.key(text)
+        tokens = cache.get(key)
+        if tokens is None:
+            tokens = tokenizer.lcut(text)
+            cache.put(key, tokens)
+        return list(tokens)
+
+    return lcut
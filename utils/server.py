@@ -0,0 +1,428 @@
+"""
+常驻处理服务
+`python -m utils serve` 启动一个长期运行的进程：预先导入 pandas、matplotlib、wordcloud 和 processing，
+加载 jieba 词典和词云字体，然后通过本机 HTTP 端口或 Unix socket 接收 data_processing 任务。
+每个任务先在 settings 上应用自己的覆盖值，结束后无论成功与否都恢复到服务启动时的快照，
+任务串行执行，一个任务的设置不会带到下一个任务
+
+用法：
+    python -m utils serve                                  # 监听 settings.SERVE_HOST:SERVE_PORT
+    python -m utils serve --socket /tmp/weibo-utils.sock   # 监听 Unix socket
+    python -m utils submit job.json
+    python -m utils submit --stages load_files_from_folder tokenize word_frequency \\
+        --set LOAD_POSTS_FOLDER_PATH=data/0501
+    curl -s -X POST --data-binary @job.json http://127.0.0.1:8765/jobs
+
+任务格式（JSON）：
+    {
+        "stages": ["load_files_from_folder", "dedupe", "tokenize", "word_frequency"],
+        "resume_from": null,
+        "settings": {"LOAD_POSTS_FOLDER_PATH": "data/0501", "DEDUPE_ENGINE": "minhash"},
+        "output_dir": "output/0501"
+    }
+output_dir 可选，结果中的 DataFrame 保存为 <output_dir>/<键名>.csv
+
+接口：
+    POST /jobs    运行一个任务，返回耗时、排队时间、各阶段指标和结果概要（失败时状态码500）
+    GET  /health  存活检查
+    GET  /stats   已运行任务数、失败数、延迟分位数和预热耗时
+"""
+
+import argparse
+import copy
+import http.client
+import json
+import os
+import signal
+import socket
+import socketserver
+import statistics
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from . import settings
+from .checkpoint import RESUME_STAGES
+from .data_processing import data_processing
+
+JOB_STAGES = (
+    'load_files_from_folder',
+    'extract_topics',
+    'dedupe',
+    'tokenize',
+    'index_tokens',
+    'word_frequency',
+    'create_wordcloud',
+)
+
+# 服务进程没有窗口，不管 settings.py 如何设置都不弹出词云
+SERVE_SETTINGS = {'WORDCLOUD_SHOW': False}
+
+
+def settings_snapshot():
+    """settings 中全部大写常量的深拷贝"""
+    return {name: copy.deepcopy(getattr(settings, name)) for name in dir(settings) if name.isupper()}
+
+
+def restore_settings(snapshot):
+    """把 settings 恢复为快照：改过的值还原，任务新加的常量删除"""
+    for name in [n for n in dir(settings) if n.isupper() and n not in snapshot]:
+        delattr(settings, name)
+    for name, value in snapshot.items():
+        setattr(settings, name, copy.deepcopy(value))
+
+
+def parse_job(payload):
+    """
+    校验任务并转换为 data_processing 的参数
+
+    参数：
+    -----------
+    payload : dict
+        任务JSON（见模块说明）
+
+    返回值：
+    -----------
+    tuple
+        (flags, resume_from, overrides, output_dir)
+
+    异常：
+    -----------
+    ValueError
+        阶段名、恢复阶段或设置名不存在
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("任务必须是JSON对象")
+    stages = payload.get('stages') or []
+    unknown = [s for s in stages if s not in JOB_STAGES]
+    if unknown:
+        raise ValueError(f"未知阶段 {unknown}，可选 {list(JOB_STAGES)}")
+    resume_from = payload.get('resume_from')
+    if resume_from is not None and resume_from not in RESUME_STAGES:
+        raise ValueError(f"resume_from 必须是 {RESUME_STAGES} 之一")
+    if not stages and resume_from is None:
+        raise ValueError("任务至少需要一个阶段或 resume_from")
+
+    overrides = {}
+    for name, value in (payload.get('settings') or {}).items():
+        if not name.isupper() or not hasattr(settings, name):
+            raise ValueError(f"settings 中没有 {name}")
+        # JSON 没有元组，按原设置的类型转换回来（如 WORDCLOUD_FIGSIZE）
+        if isinstance(getattr(settings, name), tuple) and isinstance(value, list):
+            value = tuple(value)
+        overrides[name] = value
+    flags = {stage: stage in stages for stage in JOB_STAGES}
+    return flags, resume_from, overrides, payload.get('output_dir')
+
+
+def summarize_result(result, output_dir=None):
+    """
+    把 data_processing 的返回值转换为可JSON序列化的概要，DataFrame 可选保存为CSV
+    """
+    summary = {}
+    for key, value in result.items():
+        if key == 'metrics':
+            continue
+        if hasattr(value, 'to_csv'):
+            item = {'rows': len(value), 'columns': [str(c) for c in value.columns]}
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                item['path'] = os.path.join(output_dir, f"{key}.csv")
+                value.to_csv(item['path'], index=False, encoding='utf-8-sig')
+            summary[key] = item
+        elif key == 'word_freq_by_keyword':
+            summary[key] = {'keywords': len(value)}
+        else:
+            summary[key] = value
+    return summary
+
+
+def _quantile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class ProcessingService:
+    """
+    常驻的 data_processing 执行器：预热依赖，串行执行任务，并在每个任务后恢复 settings
+    """
+
+    def __init__(self):
+        restore_settings({**settings_snapshot(), **SERVE_SETTINGS})
+        self.base_settings = settings_snapshot()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.warm_seconds = None
+        self.latencies = []
+        self.errors = 0
+
+    def warm_up(self):
+        """导入重依赖、加载 jieba 词典和词云字体，返回耗时（秒）"""
+        start = time.perf_counter()
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot  # noqa: F401
+        import pandas  # noqa: F401
+        import wordcloud  # noqa: F401
+        import jieba
+        import processing.post_analysis  # noqa: F401
+        from . import dedupe_lsh, parallel_loader, parallel_tokenize, parallel_wordcloud, term_matrix  # noqa: F401
+
+        jieba.initialize()
+        font_path = settings.WORDCLOUD_FONT_PATH
+        if font_path and os.path.exists(font_path):
+            from matplotlib import font_manager
+            from PIL import ImageFont
+            font_manager.fontManager.addfont(font_path)
+            ImageFont.truetype(font_path, settings.WORDCLOUD_MIN_FONT_SIZE)
+        elif font_path:
+            print(f"⚠ 字体文件不存在，未预加载：{font_path}")
+        self.warm_seconds = time.perf_counter() - start
+        return self.warm_seconds
+
+    def run_job(self, payload):
+        """
+        执行一个任务
+
+        参数：
+        -----------
+        payload : dict
+            任务JSON（见模块说明），格式错误时抛出 ValueError
+
+        返回值：
+        -----------
+        dict
+            {'job_id', 'status', 'error', 'latency_seconds', 'queue_seconds', 'metrics', 'result'}
+        """
+        flags, resume_from, overrides, output_dir = parse_job(payload)
+        job_id = uuid.uuid4().hex[:12]
+        queued = time.perf_counter()
+        with self.lock:
+            start = time.perf_counter()
+            status, error, metrics, summary = 'ok', None, [], None
+            try:
+                for name, value in overrides.items():
+                    setattr(settings, name, value)
+                result = data_processing(resume_from=resume_from, **flags)
+                metrics = result.get('metrics', [])
+                summary = summarize_result(result, output_dir)
+            except Exception as e:
+                status, error = 'error', f"{type(e).__name__}: {e}"
+            finally:
+                restore_settings(self.base_settings)
+                if 'matplotlib.pyplot' in sys.modules:
+                    sys.modules['matplotlib.pyplot'].close('all')
+            latency = time.perf_counter() - start
+            self.latencies.append(latency)
+            self.errors += status == 'error'
+        print(f"  任务 {job_id}：{status}，耗时 {latency:.3f}s，排队 {start - queued:.3f}s"
+              + (f"，{error}" if error else ""))
+        return {
+            'job_id': job_id,
+            'status': status,
+            'error': error,
+            'latency_seconds': round(latency, 4),
+            'queue_seconds': round(start - queued, 4),
+            'metrics': metrics,
+            'result': summary,
+        }
+
+    def stats(self):
+        """服务状态：任务数、失败数、延迟分位数、预热耗时和运行时长"""
+        latencies = list(self.latencies)
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'warm_seconds': self.warm_seconds,
+            'jobs': len(latencies),
+            'errors': self.errors,
+            'latency_p50_seconds': statistics.median(latencies) if latencies else None,
+            'latency_p95_seconds': _quantile(latencies, 0.95),
+            'latency_max_seconds': max(latencies) if latencies else None,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        elif self.path == '/stats':
+            self._send(200, self.server.service.stats())
+        else:
+            self._send(404, {'error': f"未知路径 {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            self._send(404, {'error': f"未知路径 {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            response = self.server.service.run_job(payload)
+        except ValueError as e:
+            self._send(400, {'status': 'invalid', 'error': str(e)})
+            return
+        self._send(200 if response['status'] == 'ok' else 500, response)
+
+    def log_message(self, format, *args):
+        # 每个任务已单独打印耗时，不再输出访问日志
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host=None, port=None, socket_path=None):
+    """创建 HTTP 服务（指定 socket_path 时监听 Unix socket，只允许当前用户访问）"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    server.service = service
+    return server
+
+
+def _raise_interrupt(signum, frame):
+    # kill / systemd 停止时与 Ctrl+C 一样正常退出，删除 socket 文件
+    raise KeyboardInterrupt
+
+
+def serve(host=None, port=None, socket_path=None, warm=True):
+    """
+    启动常驻服务，直到 Ctrl+C
+
+    参数：
+    -----------
+    host, port : str, int
+        HTTP 监听地址，None则使用 settings.SERVE_HOST / SERVE_PORT
+    socket_path : str or None
+        Unix socket 路径，设置后不监听TCP端口
+    warm : bool
+        是否在启动时预热依赖、jieba 词典和字体
+    """
+    host = host or settings.SERVE_HOST
+    port = settings.SERVE_PORT if port is None else port
+    service = ProcessingService()
+    if warm:
+        print(f"✓ 已预热依赖、jieba词典和字体，耗时 {service.warm_up():.2f}s")
+    server = make_server(service, host, port, socket_path)
+    address = socket_path or f"http://{host}:{server.server_address[1]}"
+    print(f"✓ 处理服务已启动：{address}（POST /jobs，GET /health，GET /stats）")
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        print(f"\n✓ 处理服务已停止，共运行 {len(service.latencies)} 个任务")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def submit_job(job, url=None, socket_path=None, timeout=None):
+    """
+    向常驻服务提交一个任务并等待结果
+
+    返回值：
+    -----------
+    tuple
+        (HTTP状态码, 响应JSON)
+    """
+    if socket_path:
+        conn = _UnixHTTPConnection(socket_path, timeout=timeout)
+    else:
+        parsed = urlsplit(url or f"http://{settings.SERVE_HOST}:{settings.SERVE_PORT}")
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        body = json.dumps(job, ensure_ascii=False).encode('utf-8')
+        conn.request('POST', '/jobs', body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def _parse_assignment(text):
+    name, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"应为 NAME=VALUE：{text}")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utils', description='常驻处理服务')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='启动常驻服务')
+    serve_parser.add_argument('--host', default=None, help='监听地址（默认settings.SERVE_HOST）')
+    serve_parser.add_argument('--port', type=int, default=None, help='监听端口（默认settings.SERVE_PORT）')
+    serve_parser.add_argument('--socket', default=None, help='改为监听Unix socket（默认settings.SERVE_SOCKET）')
+    serve_parser.add_argument('--no-warm', dest='warm', action='store_false', help='启动时不预热')
+
+    submit_parser = commands.add_parser('submit', help='向常驻服务提交任务')
+    submit_parser.add_argument('job', nargs='?', default=None, help='任务JSON文件，- 表示标准输入')
+    submit_parser.add_argument('--stages', nargs='+', choices=JOB_STAGES, default=None, help='要运行的阶段')
+    submit_parser.add_argument('--resume-from', dest='resume_from', choices=RESUME_STAGES, default=None)
+    submit_parser.add_argument('--set', dest='overrides', action='append', type=_parse_assignment, default=[],
+                               metavar='NAME=VALUE', help='覆盖settings中的值（VALUE按JSON解析），可重复')
+    submit_parser.add_argument('--output_dir', default=None, help='DataFrame 结果保存目录')
+    submit_parser.add_argument('--url', default=None, help='服务地址（默认settings.SERVE_HOST/SERVE_PORT）')
+    submit_parser.add_argument('--socket', default=None, help='通过Unix socket提交（默认settings.SERVE_SOCKET）')
+    submit_parser.add_argument('--timeout', type=float, default=None, help='等待结果的超时（秒）')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        serve(args.host, args.port, args.socket or settings.SERVE_SOCKET, warm=args.warm)
+        return
+
+    job = {}
+    if args.job == '-':
+        job = json.load(sys.stdin)
+    elif args.job:
+        with open(args.job, 'r', encoding='utf-8') as f:
+            job = json.load(f)
+    if args.stages:
+        job['stages'] = args.stages
+    if args.resume_from:
+        job['resume_from'] = args.resume_from
+    if args.overrides:
+        job.setdefault('settings', {}).update(dict(args.overrides))
+    if args.output_dir:
+        job['output_dir'] = args.output_dir
+    status, response = submit_job(job, args.url, args.socket or settings.SERVE_SOCKET, args.timeout)
+    print(json.dumps(response, ensure_ascii=False, indent=2, default=str))
+    if status != 200:
+        sys.exit(1)
@@ -3,13 +3,40 @@
 所有processing模块使用的参数都在这里配置
 """
 
+# 检查点参数
+CHECKPOINT_DIR = None  # 各阶段输出的检查点目录，None则不保存（--resume-from 需要设置）
+CHECKPOINT_KEEP = 3  # 每个阶段最多保留的检查点数量
+
+# 运行指标参数
+METRICS_PATH = None  # 各阶段指标（耗时、CPU、峰值内存、行数）的输出文件，None则不写文件
+METRICS_FORMAT = 'jsonl'  # 指标格式：'jsonl' 每阶段追加一行；'prometheus' 写 node_exporter textfile 格式
+METRICS_PROFILE_DIR = None  # 每个阶段的cProfile结果目录（<阶段名>.prof），None则不做profile
+METRICS_SAMPLE_RSS = None  # 是否用后台线程采样各阶段峰值内存：None则只在设置了METRICS_PATH时采样；不采样时取阶段开始/结束时的较大值
+METRICS_SAMPLE_INTERVAL = 0.01  # 峰值内存采样间隔（秒）
+
+# 常驻服务参数（python -m utils serve / submit）
+SERVE_HOST = '127.0.0.1'  # HTTP监听地址，只建议监听本机
+SERVE_PORT = 8765  # HTTP监听端口
+SERVE_SOCKET = None  # Unix socket路径，设置后serve改为监听该socket，submit也通过它提交
+
+# 增量监视模式参数（python -m utils watch）
+WATCH_STATE_DIR = None  # 状态目录（已处理文件、去重索引、按关键词词频、word_freq_df.csv），必须指定
+WATCH_INTERVAL = 60  # 轮询间隔（秒）
+WATCH_SETTLE_SECONDS = 10  # 文件最后一次修改后至少经过多少秒才读取，避免读到爬虫正在写入的文件
+WATCH_ID_COLUMN = 'id'  # 微博ID列名，用于跳过已处理文件中追加前就有的行
+WATCH_WORDCLOUD = True  # 每次更新后刷新受影响关键词的词云（无界面渲染，输出到WORDCLOUD_OUTPUT_DIR）
+
 # load_posts_from_folder 参数
 LOAD_POSTS_FOLDER_PATH = None  # 输入文件夹路径，必须指定
 LOAD_POSTS_KEYWORD_COLUMN = '关键词'  # 新增列的名称
+LOAD_POSTS_PARALLEL = False  # 是否使用多进程并行加载（逐文件解析）
+LOAD_POSTS_WORKERS = None  # 并行加载的进程数，None则为CPU核数
+LOAD_POSTS_CACHE_DIR = None  # Parquet缓存目录，按文件路径、修改时间和大小复用结果，None则不缓存
 
 # extract_top_topics 参数
 EXTRACT_TOPICS_TOPICS_COLUMN = '话题'  # 包含话题的列名
 EXTRACT_TOPICS_ID_COLUMN = 'id'  # 微博ID列名
+TOPIC_INDEX_PATH = None  # 话题→微博ID倒排索引目录，extract_topics 阶段同时构建并保存（见 utils/topic_index.py），None则不构建
 
 # dedupe_posts 参数
 DEDUPE_KEYWORD_COL = '关键词'  # 用于分组的关键词列名
@@ -21,6 +48,11 @@ DEDUPE_MIN_LEN_FOR_SIMILARITY = 6  # 最小长度以计算相似度
 DEDUPE_DEBUG = False  # 是否输出debug信息
 DEDUPE_DEBUG_PAIRS_PATH = None  # debug对的保存路径
 DEDUPE_AUTO_CLEAN = False  # 当指定的text_col不存在时，是否自动基于'微博正文'进行清洗
+DEDUPE_ENGINE = 'exact'  # 去重引擎：'exact' 组内逐对比较；'minhash' MinHash/LSH 生成候选对
+DEDUPE_MINHASH_NUM_PERM = 128  # MinHash 签名长度
+DEDUPE_MINHASH_BANDS = 32  # LSH 分桶段数，需整除 DEDUPE_MINHASH_NUM_PERM
+DEDUPE_MINHASH_SHINGLE_SIZE = 3  # 字符 n-gram 长度
+DEDUPE_MINHASH_VERIFY_SAMPLE = None  # 抽样行数，用于报告 minhash 与 exact 的一致程度，None则不报告
 
 # clean_text 参数
 # clean_text是单文本清洗，无需全局参数
@@ -29,6 +61,14 @@ DEDUPE_AUTO_CLEAN = False  # 当指定的text_col不存在时，是否自动基
 TOKENIZE_TEXT_COLUMN = '微博正文'  # 包含文本的列名
 TOKENIZE_KEYWORD_COLUMN = '关键词'  # 包含关键词的列名
 TOKENIZE_WORD_LENGTH_RANGE = (2, 4)  # 保留词的长度范围 (最小, 最大)
+TOKENIZE_WORKERS = 1  # 分词进程数，1为单进程，None则为CPU核数
+TOKENIZE_CACHE_PATH = None  # 分词缓存(SQLite)路径，按清洗后文本和jieba词典版本缓存分词结果，None则不缓存
+TOKENIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 分词缓存容量上限（字节），超出后按LRU淘汰
+TOKENIZE_SPARSE = False  # 词频保存为整数编码词表+稀疏的关键词×词矩阵（KeywordTermMatrix），内存随非零项增长
+
+# 分词倒排索引参数（index_tokens 阶段，分词规则沿用 TOKENIZE_* 和分词缓存）
+TOKEN_INDEX_PATH = None  # 分词倒排索引目录（词→微博ID，差分+varint编码，内存映射加载），执行index_tokens时必须指定
+TOKEN_INDEX_ID_COLUMN = 'id'  # 微博ID列名
 
 # create_word_frequency_dataframe 参数
 WORD_FREQ_TOP_N = 50  # 保留词频前N的词
@@ -46,3 +86,8 @@ WORDCLOUD_PREFER_HORIZONTAL = 1.0  # 词云中词的水平倾向
 WORDCLOUD_RELATIVE_SCALING = 0.5  # 词云中词大小的相对缩放
 WORDCLOUD_MIN_FONT_SIZE = 10  # 词云中词的最小字体大小
 WORDCLOUD_SHOW = True  # 是否立即显示词云图
+WORDCLOUD_HEADLESS = False  # 无界面模式：进程池并行渲染，每个关键词一张PNG，按哈希缓存未变化的关键词（不使用WORDCLOUD_SHOW）
+WORDCLOUD_OUTPUT_DIR = 'output/wordclouds'  # 无界面模式的输出目录
+WORDCLOUD_WORKERS = None  # 无界面模式的进程数，None则为CPU核数
+WORDCLOUD_TILE_SIZE = (800, 500)  # 无界面模式下每张词云的像素大小 (宽, 高)
+WORDCLOUD_COMPOSITE = True  # 无界面模式下是否另外拼成一张总图（all_keywords.png，使用WORDCLOUD_COLS和WORDCLOUD_FIGSIZE）
@@ -0,0 +1,154 @@
+"""
+命令行启动时间基准
+在子进程中反复运行 `--help` 等轻量命令，记录墙钟时间，并用 `python -X importtime` 找出最慢的顶层导入，
+超出预算时返回非零退出码，便于在定时任务主机或CI上检查依赖是否又被提前导入
+
+用法：
+    python -m utils.startup_benchmark
+    python -m utils.startup_benchmark --repeat 10 --budget 0.5 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# (名称, 解释器参数)；都不应导入 pandas、jieba、matplotlib、wordcloud、openai 或创建 API 客户端
+COMMANDS = [
+    ('python (空解释器)', ['-c', 'pass']),
+    ('import utils', ['-c', 'import utils']),
+    ('python -m utils --help', ['-m', 'utils', '--help']),
+    ('python -m utils submit --help', ['-m', 'utils', 'submit', '--help']),
+    ('python -m utils.benchmark --help', ['-m', 'utils.benchmark', '--help']),
+    ('python -m utils.synthetic_corpus --help', ['-m', 'utils.synthetic_corpus', '--help']),
+    ('import analyzer', ['-c', 'import analyzer']),
+    ('python -m analyzer.stub_server --help', ['-m', 'analyzer.stub_server', '--help']),
+    ('python -m analyzer.benchmark --help', ['-m', 'analyzer.benchmark', '--help']),
+]
+HEAVY_MODULES = ('pandas', 'jieba', 'matplotlib', 'wordcloud', 'scipy', 'openai', 'processing')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(args, env, importtime=False):
+    argv = [sys.executable] + (['-X', 'importtime'] if importtime else []) + args
+    start = time.perf_counter()
+    proc = subprocess.run(argv, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, proc
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+
+    返回值：
+    -----------
+    list of dict
+        每个顶层导入一项 {'module', 'cumulative_seconds'}，按累计耗时降序；
+        以及所有已导入模块名的集合
+    """
+    top_level, modules = [], set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not cumulative_us.strip().isdigit():
+            continue
+        module = name.strip()
+        modules.add(module)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        if depth == 0:
+            top_level.append({'module': module, 'cumulative_seconds': int(cumulative_us) / 1e6})
+    top_level.sort(key=lambda item: -item['cumulative_seconds'])
+    return top_level, modules
+
+
+def measure(name, args, repeat, env):
+    """
+    运行一条命令 repeat 次取墙钟时间，再用 -X importtime 运行一次统计导入
+
+    返回值：
+    -----------
+    dict
+        {'command', 'median_seconds', 'max_seconds', 'returncode', 'top_imports', 'heavy_imports'}
+    """
+    times, returncode = [], 0
+    for _ in range(repeat):
+        elapsed, proc = _run(args, env)
+        times.append(elapsed)
+        returncode = returncode or proc.returncode
+    _, proc = _run(args, env, importtime=True)
+    top_level, modules = parse_importtime(proc.stderr)
+    heavy = sorted(m for m in HEAVY_MODULES if m in modules)
+    return {
+        'command': name,
+        'median_seconds': statistics.median(times),
+        'max_seconds': max(times),
+        'returncode': returncode,
+        'top_imports': top_level[:5],
+        'heavy_imports': heavy,
+    }
+
+
+def run_startup_benchmark(repeat=5, commands=None):
+    """
+    依次测量 COMMANDS 中的命令
+
+    参数：
+    -----------
+    repeat : int
+        每条命令的运行次数（取中位数）
+    commands : list of str or None
+        只测量名称包含这些字符串的命令，None则全部
+
+    返回值：
+    -----------
+    list of dict
+        每条命令的测量结果（见 measure）
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (REPO_ROOT, env.get('PYTHONPATH')) if p)
+    selected = [
+        (name, args) for name, args in COMMANDS
+        if commands is None or name == COMMANDS[0][0] or any(c in name for c in commands)
+    ]
+    return [measure(name, args, repeat, env) for name, args in selected]
+
+
+def print_report(results, budget):
+    """打印每条命令的启动时间、最慢的顶层导入和提前加载的重依赖"""
+    print(f"{'命令':<42}{'中位数':>10}{'最大':>10}")
+    for r in results:
+        flag = '  ✗ 超出预算' if r['median_seconds'] > budget else ''
+        flag += '  ✗ 退出码非零' if r['returncode'] else ''
+        print(f"{r['command']:<42}{r['median_seconds']:>9.3f}s{r['max_seconds']:>9.3f}s{flag}")
+        slow = ', '.join(f"{i['module']} {i['cumulative_seconds'] * 1000:.0f}ms" for i in r['top_imports'][:3])
+        if slow:
+            print(f"    最慢的顶层导入：{slow}")
+        if r['heavy_imports']:
+            print(f"    已加载重依赖：{', '.join(r['heavy_imports'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令行启动时间基准')
+    parser.add_argument('--repeat', type=int, default=5, help='每条命令运行次数')
+    parser.add_argument('--budget', type=float, default=0.5, help='每条命令的启动时间预算（秒，按中位数）')
+    parser.add_argument('--commands', nargs='+', default=None, help='只测量名称包含这些字符串的命令')
+    parser.add_argument('--output', default=None, help='结果JSON路径')
+    args = parser.parse_args()
+
+    results = run_startup_benchmark(args.repeat, args.commands)
+    print_report(results, args.budget)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'budget_seconds': args.budget, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ 启动时间结果已保存：{args.output}")
+    failed = [r for r in results if r['median_seconds'] > args.budget or r['returncode']]
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
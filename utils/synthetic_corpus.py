@@ -0,0 +1,184 @@
+"""
+合成微博语料生成器
+按关键词生成与爬虫输出格式相同的CSV文件（每个关键词一个文件，文件名即关键词），包含带#话题#的正文、
+话题列、发布时间、互动数，以及一定比例的近似重复转发，用于基准测试和回归比较
+
+用法：
+    python -m utils.synthetic_corpus --size 100k --output bench_data/100k
+"""
+
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+_SUBJECTS = ['这件事', '官方通报', '当事人', '网友', '品牌方', '剧组', '主办方', '博主', '专家', '学校']
+_VERBS = ['回应了', '曝光了', '否认了', '澄清了', '发布了', '质疑了', '支持了', '调查了', '讨论了', '转发了']
+_OBJECTS = ['最新进展', '相关视频', '事件经过', '处理结果', '网传截图', '道歉声明', '现场照片', '内部消息',
+            '完整名单', '后续安排']
+_OPINIONS = ['真的太离谱了', '希望尽快给个说法', '支持依法处理', '吃瓜看戏', '理性讨论不要网暴', '心疼了',
+             '这操作看不懂', '期待后续', '已经麻了', '必须严查到底', '哥哥太棒了', '求求别再反转了',
+             '路人觉得还好', '细思极恐', '建议加强监管', '笑死我了', '这波我站官方', '不信谣不传谣']
+_FILLERS = ['说实话', '讲真', '本来不想说的', '刚看到', '有一说一', '作为当地人', '我就想问', '不得不说']
+_EMOJIS = ['[哈哈]', '[doge]', '[允悲]', '[怒]', '[泪]', '[心]', '[吃瓜]', '[赞]', '[思考]', '[微笑]']
+_LOCATIONS = ['北京', '上海', '广东', '浙江', '四川', '江苏', '湖北', '山东', '其他', '']
+_TOOLS = ['iPhone客户端', 'Android', '微博 weibo.com', 'HUAWEI Mate', '小米手机', 'iPad客户端']
+
+
+def _post_text(rng, keyword, topics):
+    parts = []
+    if rng.random() < 0.7:
+        parts.append(''.join(f"#{t}#" for t in topics))
+    if rng.random() < 0.3:
+        parts.append(rng.choice(_FILLERS) + '，')
+    for _ in range(rng.randint(1, 4)):
+        parts.append(f"{keyword}{rng.choice(_SUBJECTS)}{rng.choice(_VERBS)}{rng.choice(_OBJECTS)}，{rng.choice(_OPINIONS)}")
+        parts.append(rng.choice(['。', '！', '？', '，']))
+    if rng.random() < 0.4:
+        parts.append(rng.choice(_EMOJIS) * rng.randint(1, 3))
+    if rng.random() < 0.15:
+        parts.append(f" http://t.cn/A6{rng.randrange(16 ** 6):06x}")
+    if rng.random() < 0.1:
+        parts.append(f" @用户{rng.randint(1000, 99999)}")
+    return ''.join(parts)
+
+
+def _near_duplicate(rng, text):
+    """生成一条近似重复的转发 / Build one near-duplicate repost"""
+    kind = rng.random()
+    if kind < 0.3:
+        return text
+    if kind < 0.55:
+        return f"转发微博 //@用户{rng.randint(1000, 99999)}:{text}"
+    if kind < 0.75:
+        return text + rng.choice(_EMOJIS)
+    if kind < 0.9 and len(text) > 4:
+        pos = rng.randrange(len(text))
+        return text[:pos] + rng.choice('的了呢啊吧哈') + text[pos + 1:]
+    return text + f" 【来源：{rng.choice(_SUBJECTS)}】"
+
+
+def generate_keyword_frame(keyword, n_rows, start_id, duplicate_rate=0.15, seed=0,
+                           start_time=datetime(2024, 5, 1)):
+    """
+    生成一个关键词的微博DataFrame
+
+    参数：
+    -----------
+    keyword : str
+        关键词（也是文件名）
+    n_rows : int
+        行数
+    start_id : int
+        起始微博id
+    duplicate_rate : float
+        近似重复转发的比例
+    seed : int
+        随机种子
+
+    返回值：
+    -----------
+    pandas.DataFrame
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = random.Random(f"{seed}-{keyword}")
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    topic_pool = [keyword] + [f"{keyword}{suffix}" for suffix in ('最新进展', '回应', '后续', '真相', '现场')]
+
+    texts, topic_cols = [], []
+    for _ in range(n_rows):
+        if texts and rng.random() < duplicate_rate:
+            source = rng.randrange(len(texts))
+            texts.append(_near_duplicate(rng, texts[source]))
+            topic_cols.append(topic_cols[source])
+            continue
+        topics = rng.sample(topic_pool, rng.randint(1, 3))
+        texts.append(_post_text(rng, keyword, topics))
+        topic_cols.append(','.join(topics))
+
+    # 互动数为长尾分布 / Interaction counts are heavy-tailed
+    likes = np.floor(np_rng.pareto(1.2, n_rows) * 3).astype(np.int64)
+    comments = np.floor(likes * np_rng.uniform(0, 0.3, n_rows)).astype(np.int64)
+    reposts = np.floor(likes * np_rng.uniform(0, 0.2, n_rows)).astype(np.int64)
+    seconds = np.sort(np_rng.integers(0, 3 * 24 * 3600, n_rows))
+    times = [(start_time + timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M') for s in seconds]
+
+    return pd.DataFrame({
+        'id': [str(start_id + i) for i in range(n_rows)],
+        'bid': [f"O{rng.randrange(36 ** 8):x}"[:9] for _ in range(n_rows)],
+        'user_id': np_rng.integers(1_000_000_000, 9_999_999_999, n_rows).astype(str),
+        '用户昵称': [f"用户{rng.randint(1000, 999999)}" for _ in range(n_rows)],
+        '微博正文': texts,
+        '发布位置': [rng.choice(_LOCATIONS) for _ in range(n_rows)],
+        '话题': topic_cols,
+        '转发数': reposts,
+        '评论数': comments,
+        '点赞数': likes,
+        '互动总数': reposts + comments + likes,
+        '发布时间': times,
+        '发布工具': [rng.choice(_TOOLS) for _ in range(n_rows)],
+    })
+
+
+def generate_corpus(output_dir, n_rows, n_keywords=20, duplicate_rate=0.15, seed=0):
+    """
+    生成合成语料，每个关键词写一个CSV文件，行数按长尾分布分配到各关键词
+
+    参数：
+    -----------
+    output_dir : str
+        输出文件夹
+    n_rows : int
+        总行数
+    n_keywords : int
+        关键词数量
+    duplicate_rate : float
+        近似重复转发的比例
+    seed : int
+        随机种子，相同参数生成的语料完全一致
+
+    返回值：
+    -----------
+    list of str
+        生成的CSV文件路径
+    """
+    import numpy as np
+
+    os.makedirs(output_dir, exist_ok=True)
+    weights = 1.0 / np.arange(1, n_keywords + 1)
+    counts = np.floor(weights / weights.sum() * n_rows).astype(int)
+    counts[0] += n_rows - counts.sum()
+
+    paths = []
+    start_id = 5_000_000_000_000_000
+    for index, count in enumerate(counts):
+        keyword = f"热搜{index + 1:02d}"
+        frame = generate_keyword_frame(keyword, int(count), start_id, duplicate_rate, seed)
+        path = os.path.join(output_dir, f"{keyword}.csv")
+        frame.to_csv(path, index=False, encoding='utf-8-sig')
+        paths.append(path)
+        start_id += int(count)
+    print(f"✓ 已生成{n_rows}行合成语料，共{len(paths)}个关键词文件：{output_dir}")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成微博语料')
+    parser.add_argument('--size', choices=sorted(SIZES), default=None, help='预设规模')
+    parser.add_argument('--rows', type=int, default=None, help='总行数（覆盖--size）')
+    parser.add_argument('--keywords', type=int, default=20, help='关键词数量')
+    parser.add_argument('--duplicate_rate', type=float, default=0.15, help='近似重复转发的比例')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--output', required=True, help='输出文件夹')
+    args = parser.parse_args()
+
+    n_rows = args.rows or SIZES[args.size or '10k']
+    generate_corpus(args.output, n_rows, args.keywords, args.duplicate_rate, args.seed)
+
+
+if __name__ == '__main__':
+    main()
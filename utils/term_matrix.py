@@ -0,0 +1,280 @@
+"""
+整数编码词表与稀疏的关键词×词矩阵
+用一份共享词表（词→整数id）和 scipy CSR 矩阵代替每个关键词一个 Counter，
+内存只随非零项数量增长；前N个词用分区（partial sort）+ 一次整体排序得到，
+结果与 Counter.most_common 的顺序（包括并列时按首次出现的顺序）完全一致
+"""
+
+from collections import Counter
+from collections.abc import Mapping
+
+import numpy as np
+from scipy import sparse
+
+
+class Vocabulary:
+    """
+    词表：词与连续整数id的双向映射（id 按首次加入的顺序分配）
+    """
+
+    def __init__(self, terms=()):
+        self.terms = []
+        self.index = {}
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        """加入一个词并返回其id，已存在则返回原id"""
+        term_id = self.index.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.index[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def encode(self, terms):
+        """把词序列编码为 int32 数组（新词自动加入词表）"""
+        return np.fromiter((self.add(t) for t in terms), dtype=np.int32)
+
+    def decode(self, ids):
+        """把id数组还原为词列表"""
+        return [self.terms[i] for i in ids]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, term):
+        return term in self.index
+
+
+class KeywordTermMatrix(Mapping):
+    """
+    关键词×词的稀疏词频矩阵
+
+    行为关键词、列为词表中的词，值为词频。另存每个非零项在该关键词内首次出现的序号（first_seen），
+    用于复现 Counter 的插入顺序，因此与 {关键词: Counter} 之间可以无损互转。
+
+    同时实现只读 Mapping 接口：matrix[关键词] 返回该关键词的 Counter，
+    因此可以直接替代 tokenize_and_count_words 的返回值使用。
+
+    参数：
+    -----------
+    keywords : list of str
+        行对应的关键词
+    vocab : Vocabulary
+        列对应的词表
+    counts : scipy.sparse.csr_matrix
+        词频矩阵，形状 (关键词数, 词表大小)
+    first_seen : numpy.ndarray
+        与 counts.data 对齐的首次出现序号
+    """
+
+    def __init__(self, keywords, vocab, counts, first_seen):
+        self.keywords = list(keywords)
+        self.vocab = vocab
+        self.counts = counts
+        self.first_seen = first_seen
+        self._rows = {kw: i for i, kw in enumerate(self.keywords)}
+
+    @classmethod
+    def from_counters(cls, word_freq_by_keyword, vocab=None):
+        """
+        从 {关键词: Counter} 构建（Counter 的插入顺序保存为 first_seen）
+
+        参数：
+        -----------
+        word_freq_by_keyword : dict
+            {关键词: Counter 或 {词: 词频}}
+        vocab : Vocabulary or None
+            共享词表，None则新建
+
+        返回值：
+        -----------
+        KeywordTermMatrix
+        """
+        builder = MatrixBuilder(vocab)
+        for keyword, counter in word_freq_by_keyword.items():
+            builder.add_counts(keyword, counter)
+        return builder.build()
+
+    # --- Mapping 接口 ---
+
+    def __getitem__(self, keyword):
+        row = self._rows[keyword]
+        start, end = self.counts.indptr[row], self.counts.indptr[row + 1]
+        order = np.argsort(self.first_seen[start:end], kind='stable')
+        ids = self.counts.indices[start:end][order]
+        values = self.counts.data[start:end][order]
+        return Counter(dict(zip(self.vocab.decode(ids), values.tolist())))
+
+    def __iter__(self):
+        return iter(self.keywords)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __contains__(self, keyword):
+        return keyword in self._rows
+
+    # --- 转换与查询 ---
+
+    def to_counters(self):
+        """还原为 {关键词: Counter}（与构建时的内容和插入顺序一致）"""
+        return {kw: self[kw] for kw in self.keywords}
+
+    def top_n_entries(self, top_n):
+        """
+        每个关键词词频前N的词（向量化），top_n 为 None 时返回全部词
+
+        先对非零项多于N的行用 np.partition 求第N大的词频作为阈值，丢弃低于阈值的项；
+        剩余项按 (行, 词频降序, 首次出现顺序) 一次 lexsort，每行取前N个。
+
+        返回值：
+        -----------
+        (rows, term_ids, counts) 三个对齐的数组，按关键词、名次排列
+        """
+        counts = self.counts
+        row_lengths = np.diff(counts.indptr)
+        if top_n is None:
+            top_n = int(row_lengths.max()) if len(row_lengths) else 0
+        rows = np.repeat(np.arange(len(self.keywords), dtype=np.int64), row_lengths)
+        data = counts.data
+        keep = np.ones(len(data), dtype=bool)
+        for row in np.flatnonzero(row_lengths > top_n):
+            start, end = counts.indptr[row], counts.indptr[row + 1]
+            values = data[start:end]
+            threshold = np.partition(values, len(values) - top_n)[len(values) - top_n]
+            keep[start:end] = values >= threshold
+
+        candidates = np.flatnonzero(keep)
+        order = candidates[np.lexsort((
+            self.first_seen[candidates],
+            -data[candidates],
+            rows[candidates],
+        ))]
+        sorted_rows = rows[order]
+        row_starts = np.searchsorted(sorted_rows, sorted_rows, side='left')
+        rank = np.arange(len(order)) - row_starts
+        order = order[rank < top_n]
+        return rows[order], counts.indices[order], data[order]
+
+    def top_counters(self, top_n):
+        """
+        {关键词: Counter}，每个 Counter 只含前N个词且按名次插入，
+        对它调用 most_common 的结果与对完整 Counter 调用 most_common(top_n) 相同
+        """
+        rows, ids, values = self.top_n_entries(top_n)
+        out = {kw: Counter() for kw in self.keywords}
+        for row, term, value in zip(rows.tolist(), self.vocab.decode(ids), values.tolist()):
+            out[self.keywords[row]][term] = value
+        return out
+
+    def nbytes(self):
+        """矩阵数组占用的字节数（不含词表字符串）"""
+        return (self.counts.data.nbytes + self.counts.indices.nbytes + self.counts.indptr.nbytes
+                + self.first_seen.nbytes)
+
+
+class MatrixBuilder:
+    """
+    逐关键词累积词频并构建 KeywordTermMatrix，每个关键词处理完后只保留整数数组
+    """
+
+    def __init__(self, vocab=None):
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.keywords = []
+        self._rows = {}
+        self._parts = []
+
+    def add_counts(self, keyword, counter):
+        """加入一个关键词的 {词: 词频}（按插入顺序记录首次出现序号），同一关键词可多次加入并累加"""
+        ids = self.vocab.encode(counter.keys())
+        values = np.fromiter(counter.values(), dtype=np.int64, count=len(ids))
+        self._add(keyword, ids, values)
+
+    def add_tokens(self, keyword, tokens):
+        """加入一个关键词的一段词序列（未计数），首次出现顺序即序列中的顺序"""
+        ids = self.vocab.encode(tokens)
+        if not len(ids):
+            self._add(keyword, ids, np.zeros(0, dtype=np.int64))
+            return
+        unique, first, counts = np.unique(ids, return_index=True, return_counts=True)
+        order = np.argsort(first, kind='stable')
+        self._add(keyword, unique[order].astype(np.int32), counts[order].astype(np.int64))
+
+    def _add(self, keyword, ids, values):
+        row = self._rows.get(keyword)
+        if row is None:
+            row = self._rows[keyword] = len(self.keywords)
+            self.keywords.append(keyword)
+        self._parts.append((row, ids, values))
+
+    def build(self):
+        """合并所有部分：同一关键词的多次加入按加入顺序累加，首次出现序号取最早的一次"""
+        n_rows = len(self.keywords)
+        if self._parts:
+            rows = np.concatenate([np.full(len(ids), row, dtype=np.int64) for row, ids, _ in self._parts])
+            cols = np.concatenate([ids for _, ids, _ in self._parts]).astype(np.int64)
+            data = np.concatenate([values for _, _, values in self._parts])
+        else:
+            rows = cols = data = np.zeros(0, dtype=np.int64)
+        position = np.arange(len(data), dtype=np.int64)
+
+        # 按 (行, 列) 排序后合并重复项：词频求和，首次出现取最小位置
+        order = np.lexsort((position, cols, rows))
+        rows, cols, data, position = rows[order], cols[order], data[order], position[order]
+        new_entry = np.ones(len(rows), dtype=bool)
+        new_entry[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        starts = np.flatnonzero(new_entry)
+        rows, cols, position = rows[starts], cols[starts], position[starts]
+        data = np.add.reduceat(data, starts) if len(starts) else data
+
+        # 首次出现序号：在行内按全局位置重新编号
+        first_seen = np.empty(len(position), dtype=np.int64)
+        by_position = np.lexsort((position, rows))
+        row_starts = np.searchsorted(rows[by_position], rows[by_position], side='left')
+        first_seen[by_position] = np.arange(len(position)) - row_starts
+
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        dtype = np.int32 if not len(data) or data.max() < 2 ** 31 else np.int64
+        counts = sparse.csr_matrix(
+            (data.astype(dtype), cols.astype(np.int32), indptr),
+            shape=(n_rows, len(self.vocab)),
+        )
+        return KeywordTermMatrix(self.keywords, self.vocab, counts, first_seen.astype(np.int32))
+
+
+def tokenize_to_matrix(df, text_column, keyword_column, word_length_range):
+    """
+    按关键词分组调用 tokenize_and_count_words，每组的 Counter 立即编码为整数数组后释放，
+    峰值内存只有一个关键词的 Counter，而不是所有关键词的 Counter
+
+    参数：
+    -----------
+    df : pandas.DataFrame
+        包含文本和关键词的数据
+    text_column : str
+        文本列名
+    keyword_column : str
+        关键词列名
+    word_length_range : tuple
+        保留词的长度范围 (最小, 最大)
+
+    返回值：
+    -----------
+    KeywordTermMatrix
+    """
+    from processing.post_analysis import tokenize_and_count_words
+
+    builder = MatrixBuilder()
+    for _, group in df.groupby(keyword_column, sort=True):
+        counts = tokenize_and_count_words(
+            df=group,
+            text_column=text_column,
+            keyword_column=keyword_column,
+            word_length_range=word_length_range,
+        )
+        for keyword, counter in counts.items():
+            builder.add_counts(keyword, counter)
+    return builder.build()
@@ -0,0 +1,486 @@
+"""
+分词倒排索引
+tokenize_and_count_words 只保留按关键词汇总的词频，要找出"某关键词下提到某个词的微博"就得重新分词。
+本模块为每条微博保存分词结果的倒排表（词→微博）和正排表（微博→词）：
+微博按关键词连续编号，每个列表按编号升序做差分后用变长整数（varint）编码，保存为 .npy 后内存映射。
+查询只解码用到的列表，耗时取决于列表长度，与语料总量无关
+
+用法：
+    python -m utils.token_index <索引目录> 词A 词B --keyword 关键词A          # 同时包含（AND）
+    python -m utils.token_index <索引目录> 词A 词B --any                     # 包含任一（OR）
+    python -m utils.token_index <索引目录> 词A --keyword 关键词A --cooccurrence 20
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from .topic_index import _atomic_save, encode_post_ids
+
+FORMAT_VERSION = 1
+META_NAME = 'meta.json'
+ARRAY_NAMES = (
+    'term_offsets',   # (词数+1,) 每个词的倒排表在 postings 中的字节起止位置
+    'doc_freq',       # (词数,) 每个词出现的微博数
+    'postings',       # uint8，各词的微博编号（差分 + varint）
+    'doc_offsets',    # (微博数+1,) 每条微博的词表在 doc_terms 中的字节起止位置
+    'doc_term_ptr',   # (微博数+1,) 每条微博的词数累计
+    'doc_terms',      # uint8，各微博的词编号（差分 + varint）
+    'keyword_ptr',    # (关键词数+1,) 每个关键词的微博编号范围
+    'post_ids',       # (微博数,) 微博编号对应的微博ID
+)
+
+
+# --- varint 编解码 ---
+
+def varint_encode(values):
+    """
+    把非负整数数组编码为 varint 字节（每字节7位，最高位为1表示后面还有字节）
+
+    返回值：
+    -----------
+    (bytes, lengths)
+        uint8 字节数组，以及每个值占用的字节数
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= (np.uint64(1) << np.uint64(shift))
+    owner = np.repeat(np.arange(len(values)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    position = np.arange(len(owner), dtype=np.int64) - starts[owner]
+    low = (values[owner] >> (7 * position).astype(np.uint64)) & np.uint64(0x7F)
+    more = (position < lengths[owner] - 1).astype(np.uint64) << np.uint64(7)
+    return (low | more).astype(np.uint8), lengths
+
+
+def varint_decode(data):
+    """把 varint 字节数组解码为 int64 数组"""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    position = np.arange(len(data), dtype=np.int64) - np.repeat(starts, ends - starts + 1)
+    shifted = (data & 0x7F).astype(np.int64) << (7 * position)
+    return np.add.reduceat(shifted, starts)
+
+
+def _delta_encode(groups, values):
+    """
+    values 按 (组, 值) 升序排列；每组内改为与前一个值的差（组内第一个值保持原值）后 varint 编码
+
+    返回值：
+    -----------
+    (bytes, byte_ptr)
+        字节数组，以及每组的字节起止位置（长度为组数+1）
+    """
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    deltas = values.astype(np.int64).copy()
+    same = np.zeros(len(values), dtype=bool)
+    same[1:] = groups[1:] == groups[:-1]
+    deltas[1:][same[1:]] = values[1:][same[1:]] - values[:-1][same[1:]]
+    data, lengths = varint_encode(deltas)
+    byte_ptr = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(groups, weights=lengths, minlength=n_groups).astype(np.int64), out=byte_ptr[1:])
+    return data, byte_ptr
+
+
+def tokenize_posts(texts, word_length_range, cache_path=None, cache_max_bytes=None):
+    """
+    逐条微博分词：jieba.lcut(clean_text(正文))，按长度过滤，与 tokenize_and_count_words 的规则一致
+
+    参数：
+    -----------
+    texts : iterable of str
+        微博正文
+    word_length_range : tuple
+        保留词的长度范围 (最小, 最大)
+    cache_path : str or None
+        分词缓存路径（同 TOKENIZE_CACHE_PATH），None则不缓存
+
+    返回值：
+    -----------
+    list of list
+        每条微博去重后的词（按首次出现顺序）
+    """
+    import jieba
+    from processing.post_analysis import clean_text
+
+    from .seg_cache import SegmentationCache, cached_lcut
+
+    low, high = word_length_range
+    cache = SegmentationCache(cache_path, max_bytes=cache_max_bytes) if cache_path is not None else None
+    lcut = cached_lcut(cache) if cache is not None else jieba.lcut
+    tokens = [
+        list(dict.fromkeys(w for w in lcut(clean_text(text)) if low <= len(w) <= high))
+        for text in texts
+    ]
+    if cache is not None:
+        cache.close()
+    return tokens
+
+
+class TokenIndex:
+    """
+    分词倒排索引
+
+    微博按关键词连续编号（关键词 k 的微博编号为 keyword_ptr[k] 到 keyword_ptr[k+1]），
+    因此按关键词过滤只是对解码后的有序编号做一次二分查找。
+    倒排表（词→微博编号）用于词查询和 AND/OR 查询，正排表（微博→词编号）用于统计共现词。
+
+    参数：
+    -----------
+    terms : list of str
+        词编号对应的词
+    keywords : list
+        关键词编号对应的关键词
+    arrays : dict
+        ARRAY_NAMES 中的各数组（numpy.ndarray 或内存映射）
+    """
+
+    def __init__(self, terms, keywords, arrays):
+        self.terms = list(terms)
+        self.keywords = list(keywords)
+        self.arrays = arrays
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+        self._keyword_ids = {keyword: i for i, keyword in enumerate(self.keywords)}
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_tokens(cls, token_lists, keywords, post_ids):
+        """
+        从每条微博的词列表构建索引
+
+        参数：
+        -----------
+        token_lists : list of list
+            每条微博的词（tokenize_posts 的输出）
+        keywords : sequence
+            每条微博的关键词（为空的微博不进入索引）
+        post_ids : sequence
+            每条微博的ID
+
+        返回值：
+        -----------
+        TokenIndex
+        """
+        import pandas as pd
+
+        keyword_codes, keyword_values = pd.factorize(np.asarray(keywords, dtype=object))
+        # 关键词为空时 factorize 编号为 -1，这些微博跳过；
+        # 其余按关键词稳定排序后重新编号，同一关键词的微博编号连续
+        doc_order = np.flatnonzero(keyword_codes >= 0)
+        doc_order = doc_order[np.argsort(keyword_codes[doc_order], kind='stable')]
+        n_docs, n_keywords = len(doc_order), len(keyword_values)
+        keyword_ptr = np.zeros(n_keywords + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keyword_codes[doc_order], minlength=n_keywords), out=keyword_ptr[1:])
+
+        term_ids = {}
+        flat = []
+        lengths = np.zeros(n_docs, dtype=np.int64)
+        for doc, row in enumerate(doc_order.tolist()):
+            tokens = token_lists[row]
+            lengths[doc] = len(tokens)
+            flat.extend(term_ids.setdefault(t, len(term_ids)) for t in tokens)
+        terms = np.fromiter(flat, dtype=np.int64, count=len(flat))
+        docs = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+
+        # 倒排表：按 (词, 微博) 排序；正排表：按 (微博, 词) 排序
+        by_term = np.lexsort((docs, terms))
+        postings, term_offsets = _delta_encode(terms[by_term], docs[by_term])
+        term_offsets = np.pad(term_offsets, (0, len(term_ids) + 1 - len(term_offsets)), mode='edge')
+        by_doc = np.lexsort((terms, docs))
+        doc_terms, doc_offsets = _delta_encode(docs[by_doc], terms[by_doc])
+        doc_offsets = np.pad(doc_offsets, (0, n_docs + 1 - len(doc_offsets)), mode='edge')
+        doc_term_ptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(lengths, out=doc_term_ptr[1:])
+
+        arrays = {
+            'term_offsets': term_offsets,
+            'doc_freq': np.bincount(terms, minlength=len(term_ids)).astype(np.int32),
+            'postings': postings,
+            'doc_offsets': doc_offsets,
+            'doc_term_ptr': doc_term_ptr,
+            'doc_terms': doc_terms,
+            'keyword_ptr': keyword_ptr,
+            'post_ids': encode_post_ids(np.asarray(post_ids, dtype=object)[doc_order]),
+        }
+        return cls(list(term_ids), keyword_values.tolist(), arrays)
+
+    @classmethod
+    def build(cls, df, text_column, keyword_column, id_column, word_length_range,
+              cache_path=None, cache_max_bytes=None):
+        """
+        对 df 中的每条微博分词并构建索引
+
+        参数：
+        -----------
+        df : pandas.DataFrame
+            微博数据（通常为去重后的数据）
+        text_column, keyword_column, id_column : str
+            正文、关键词和微博ID列名
+        word_length_range : tuple
+            保留词的长度范围 (最小, 最大)
+        cache_path, cache_max_bytes
+            分词缓存，同 tokenize_posts
+
+        返回值：
+        -----------
+        TokenIndex
+        """
+        for column in (text_column, keyword_column, id_column):
+            if column not in df.columns:
+                raise ValueError(f"列 {column} 不存在")
+        has_keyword = df[keyword_column].notna()
+        if not has_keyword.all():
+            print(f"  分词索引：跳过关键词为空的微博{int((~has_keyword).sum())}条")
+            df = df[has_keyword]
+        token_lists = tokenize_posts(
+            df[text_column].astype(str),
+            word_length_range,
+            cache_path=cache_path,
+            cache_max_bytes=cache_max_bytes,
+        )
+        return cls.from_tokens(token_lists, df[keyword_column].to_numpy(), df[id_column].to_numpy())
+
+    # --- 持久化 ---
+
+    def save(self, path):
+        """
+        保存到目录：每个数组一个 .npy 文件，词表和关键词列表保存在 meta.json（最后写入）
+
+        参数：
+        -----------
+        path : str
+            索引目录，不存在则创建
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            _atomic_save(os.path.join(path, f"{name}.npy"), np.asarray(self.arrays[name]))
+        meta = {
+            'version': FORMAT_VERSION,
+            'terms': self.terms,
+            'keywords': self.keywords,
+            'n_docs': int(len(self.post_ids)),
+            'postings_bytes': int(len(self.postings)),
+        }
+        meta_path = os.path.join(path, META_NAME)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, meta_path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        从目录加载索引
+
+        参数：
+        -----------
+        path : str
+            save 写入的目录
+        mmap : bool
+            是否以只读内存映射方式打开数组
+
+        返回值：
+        -----------
+        TokenIndex
+        """
+        with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"分词索引版本不兼容：{meta.get('version')}，请重新构建")
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+            for name in ARRAY_NAMES
+        }
+        if len(arrays['post_ids']) != meta['n_docs'] or len(arrays['postings']) != meta['postings_bytes']:
+            raise ValueError(f"分词索引不完整：{path}，请重新构建")
+        return cls(meta['terms'], meta['keywords'], arrays)
+
+    # --- 查询 ---
+
+    def _keyword_range(self, keyword):
+        if keyword is None:
+            return 0, len(self.post_ids)
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is None:
+            return 0, 0
+        return int(self.keyword_ptr[keyword_id]), int(self.keyword_ptr[keyword_id + 1])
+
+    def _docs(self, term, keyword=None):
+        """某个词的微博编号（升序），keyword 不为 None 时只保留该关键词下的部分"""
+        term_id = self._term_ids.get(term)
+        low, high = self._keyword_range(keyword)
+        if term_id is None or low == high:
+            return np.zeros(0, dtype=np.int64)
+        start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+        docs = np.cumsum(varint_decode(self.postings[start:end]))
+        if keyword is None:
+            return docs
+        return docs[np.searchsorted(docs, low):np.searchsorted(docs, high)]
+
+    def _combine(self, terms, keyword, intersect):
+        if isinstance(terms, str):
+            terms = [terms]
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return np.zeros(0, dtype=np.int64)
+        if intersect:
+            # 从最短的倒排表开始求交集，结果为空时提前结束
+            terms.sort(key=lambda t: int(self.doc_freq[self._term_ids[t]]) if t in self._term_ids else 0)
+            docs = self._docs(terms[0], keyword)
+            for term in terms[1:]:
+                if not len(docs):
+                    break
+                docs = np.intersect1d(docs, self._docs(term, keyword), assume_unique=True)
+            return docs
+        return np.unique(np.concatenate([self._docs(t, keyword) for t in terms]))
+
+    def lookup(self, term, keyword=None):
+        """
+        包含该词的微博ID（按关键词、原数据的行顺序）
+
+        参数：
+        -----------
+        term : str
+            词
+        keyword : str or None
+            只返回该关键词下的微博，None则不限关键词
+
+        返回值：
+        -----------
+        numpy.ndarray
+            微博ID
+        """
+        return self.post_ids[self._docs(term, keyword)]
+
+    def search_all(self, terms, keyword=None):
+        """同时包含所有词的微博ID（AND）"""
+        return self.post_ids[self._combine(terms, keyword, intersect=True)]
+
+    def search_any(self, terms, keyword=None):
+        """包含任一词的微博ID（OR）"""
+        return self.post_ids[self._combine(terms, keyword, intersect=False)]
+
+    def document_frequency(self, term, keyword=None):
+        """包含该词的微博数，keyword 不为 None 时只计该关键词下的微博"""
+        if keyword is None:
+            term_id = self._term_ids.get(term)
+            return 0 if term_id is None else int(self.doc_freq[term_id])
+        return len(self._docs(term, keyword))
+
+    def cooccurrence_count(self, term_a, term_b, keyword=None):
+        """同时包含两个词的微博数"""
+        return len(self._combine([term_a, term_b], keyword, intersect=True))
+
+    def cooccurrence(self, term, keyword=None, top_n=20):
+        """
+        与该词出现在同一条微博中最多的词（只解码包含该词的微博的正排表）
+
+        参数：
+        -----------
+        term : str
+            词
+        keyword : str or None
+            只统计该关键词下的微博，None则统计所有关键词
+        top_n : int
+            返回的词数
+
+        返回值：
+        -----------
+        list of tuple
+            [(词, 共同出现的微博数), ...]，按微博数降序，并列时按词编号（首次出现的顺序）
+        """
+        docs = self._docs(term, keyword)
+        if not len(docs):
+            return []
+        starts, ends = self.doc_offsets[docs], self.doc_offsets[docs + 1]
+        byte_counts = ends - starts
+        positions = np.arange(int(byte_counts.sum()), dtype=np.int64)
+        positions += np.repeat(starts - (np.cumsum(byte_counts) - byte_counts), byte_counts)
+        deltas = varint_decode(self.doc_terms[positions])
+
+        # 每条微博内差分还原：整体累加后减去该微博之前的累加值
+        term_counts = self.doc_term_ptr[docs + 1] - self.doc_term_ptr[docs]
+        totals = np.cumsum(deltas)
+        doc_starts = np.cumsum(term_counts) - term_counts
+        before = np.where(doc_starts > 0, totals[np.maximum(doc_starts - 1, 0)], 0)
+        term_ids = totals - np.repeat(before, term_counts)
+
+        # 只对出现过的词计数，耗时与词表大小无关
+        candidates, counts = np.unique(term_ids[term_ids != self._term_ids[term]], return_counts=True)
+        if len(candidates) > top_n:
+            threshold = np.partition(counts, len(counts) - top_n)[len(counts) - top_n]
+            keep = counts >= threshold
+            candidates, counts = candidates[keep], counts[keep]
+        ranked = np.lexsort((candidates, -counts))[:top_n]
+        return [(self.terms[i], int(c)) for i, c in zip(candidates[ranked].tolist(), counts[ranked].tolist())]
+
+    def __contains__(self, term):
+        return term in self._term_ids
+
+    def __len__(self):
+        return len(self.terms)
+
+    def nbytes(self):
+        """索引数组占用的字节数（不含词表字符串）"""
+        return sum(int(np.asarray(self.arrays[name]).nbytes) for name in ARRAY_NAMES)
+
+
+def build_token_index(df, path, text_column, keyword_column, id_column, word_length_range,
+                      cache_path=None, cache_max_bytes=None):
+    """
+    构建分词倒排索引并保存到 path（参数同 TokenIndex.build）
+
+    返回值：
+    -----------
+    TokenIndex
+    """
+    index = TokenIndex.build(
+        df,
+        text_column=text_column,
+        keyword_column=keyword_column,
+        id_column=id_column,
+        word_length_range=word_length_range,
+        cache_path=cache_path,
+        cache_max_bytes=cache_max_bytes,
+    )
+    index.save(path)
+    print(f"  分词索引：{len(index.post_ids)}条微博，{len(index)}个词，"
+          f"{index.nbytes() / 1024 / 1024:.1f}MB，已保存到 {path}")
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询分词倒排索引')
+    parser.add_argument('index_dir', help='分词索引目录（settings.TOKEN_INDEX_PATH）')
+    parser.add_argument('terms', nargs='+', help='查询的词')
+    parser.add_argument('--keyword', default=None, help='只查询该关键词下的微博')
+    parser.add_argument('--any', action='store_true', help='包含任一词即可（默认需同时包含所有词）')
+    parser.add_argument('--cooccurrence', type=int, default=None, metavar='N',
+                        help='列出与第一个词共同出现最多的N个词')
+    parser.add_argument('--limit', type=int, default=20, help='最多列出的微博ID数')
+    args = parser.parse_args(argv)
+
+    index = TokenIndex.load(args.index_dir)
+    if args.cooccurrence is not None:
+        for term, count in index.cooccurrence(args.terms[0], args.keyword, args.cooccurrence):
+            print(f"  {term}  {count}")
+        return
+    search = index.search_any if args.any else index.search_all
+    ids = search(args.terms, args.keyword)
+    print(f"{'或'.join(args.terms) if args.any else '且'.join(args.terms)}：{len(ids)}条微博")
+    for post_id in ids[:args.limit].tolist():
+        print(f"  {post_id}")
+
+
+if __name__ == '__main__':
+    main()
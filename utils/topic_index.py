@@ -0,0 +1,353 @@
+"""
+向量化话题提取与话题→微博倒排索引
+用一个预编译的正则把话题列整体拆成 (微博, 话题) 对，再构建按话题排序的倒排表和按关键词排好序的话题计数，
+保存为 .npy 数组后以内存映射方式加载：查询某话题下的微博只是一次切片，前K个话题只是读取前K项，
+与语料规模无关，不再需要对 DataFrame 做全表扫描
+
+用法：
+    python -m utils.topic_index <索引目录> --top 10 --keyword 关键词A
+    python -m utils.topic_index <索引目录> --topic 话题A --keyword 关键词A
+"""
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_NAME = 'meta.json'
+ARRAY_NAMES = (
+    'indptr',            # (话题数+1,) 每个话题在 postings 中的起止位置
+    'postings',          # 按 (话题, 关键词, 行号) 排序的微博ID
+    'posting_keywords',  # 与 postings 对齐的关键词编号，话题内有序，可二分查找
+    'keyword_indptr',    # (关键词数+1,) 每个关键词在 keyword_topics 中的起止位置
+    'keyword_topics',    # 每个关键词的话题编号，按微博数降序（并列时按话题首次出现顺序）
+    'keyword_counts',    # 与 keyword_topics 对齐的微博数
+    'topic_totals',      # (话题数,) 每个话题在所有关键词下的微博数
+    'global_order',      # 所有话题按微博数降序排列的编号
+)
+# 话题之间可以用 #、逗号、顿号或换行分隔；话题内部的单个空格保留
+TOPIC_PATTERN = re.compile(r'[^#,，、;；\s]+(?: [^#,，、;；\s]+)*')
+
+
+def normalize_topic(topic):
+    """去掉首尾的 # 和空白，'#话题#' 与 '话题' 视为同一个话题"""
+    return str(topic).strip().strip('#').strip()
+
+
+def encode_post_ids(ids):
+    """微博ID全部是整数时保存为 int64，否则保存为定长字符串（二者都可以内存映射）"""
+    import pandas as pd
+
+    ids = pd.Series(ids)
+    if pd.api.types.is_integer_dtype(ids.dtype):
+        return ids.to_numpy(dtype=np.int64)
+    text = ids.astype(str)
+    # 微博ID有16位以上，超出 float 的精度，不能经 pd.to_numeric 转换
+    if len(text) and text.str.fullmatch(r'-?\d{1,18}').all():
+        return text.astype(np.int64).to_numpy()
+    return np.asarray(text.to_numpy(), dtype=str)
+
+
+def explode_topics(values):
+    """
+    把话题列整体拆成 (行号, 话题编号) 对
+
+    话题列的取值高度重复（转发、同一热搜下的微博），因此先对整列 factorize，
+    只对不同的取值各运行一次 TOPIC_PATTERN，再用整数数组运算展开到每一行；
+    同一条微博重复出现的话题只保留一次
+
+    参数：
+    -----------
+    values : pandas.Series
+        话题列
+
+    返回值：
+    -----------
+    (rows, topic_codes, topics)
+        rows、topic_codes 为对齐的 int64 数组，按行号、话题在该行中的顺序排列；
+        topics 为话题编号对应的话题列表（按首次出现的顺序）
+    """
+    import pandas as pd
+
+    value_codes, uniques = pd.factorize(values.fillna('').astype(str).to_numpy())
+    per_value = [list(dict.fromkeys(TOPIC_PATTERN.findall(value))) for value in uniques]
+    flat_codes, topics = pd.factorize(pd.Series([t for found in per_value for t in found], dtype=object))
+    lengths = np.fromiter((len(found) for found in per_value), dtype=np.int64, count=len(per_value))
+    offsets = np.zeros(len(per_value) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    row_lengths = lengths[value_codes]
+    rows = np.repeat(np.arange(len(value_codes), dtype=np.int64), row_lengths)
+    row_starts = np.cumsum(row_lengths) - row_lengths
+    within = np.arange(len(rows), dtype=np.int64) - np.repeat(row_starts, row_lengths)
+    topic_codes = flat_codes[offsets[value_codes[rows]] + within].astype(np.int64)
+    return rows, topic_codes, list(topics)
+
+
+def _atomic_save(path, array):
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class TopicIndex:
+    """
+    话题→微博ID倒排索引，附带按关键词的话题计数
+
+    postings 按 (话题, 关键词, 行号) 排序，话题 t 的微博为 postings[indptr[t]:indptr[t+1]]，
+    话题内再按 posting_keywords 二分查找即可得到某个关键词下的部分；
+    keyword_topics / keyword_counts 在构建时已按微博数降序排好，前K个话题直接取前K项。
+    同一条微博在两个关键词下各出现一次时，不指定关键词的查询会返回两次。
+
+    参数：
+    -----------
+    topics : list of str
+        话题编号对应的话题（按首次出现的顺序）
+    keywords : list
+        关键词编号对应的关键词
+    arrays : dict
+        ARRAY_NAMES 中的各数组（numpy.ndarray 或内存映射）
+    """
+
+    def __init__(self, topics, keywords, arrays):
+        self.topics = list(topics)
+        self.keywords = list(keywords)
+        self.arrays = arrays
+        self._topic_ids = {topic: i for i, topic in enumerate(self.topics)}
+        self._keyword_ids = {keyword: i for i, keyword in enumerate(self.keywords)}
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def build(cls, df, topics_column, id_column, keyword_column):
+        """
+        从微博 DataFrame 构建索引（全部为整数数组运算，没有逐行的 Python 循环）；
+        关键词为空的微博不属于任何关键词，不进入索引
+
+        参数：
+        -----------
+        df : pandas.DataFrame
+            微博数据
+        topics_column, id_column, keyword_column : str
+            话题、微博ID和关键词列名
+
+        返回值：
+        -----------
+        TopicIndex
+        """
+        import pandas as pd
+
+        for column in (topics_column, id_column, keyword_column):
+            if column not in df.columns:
+                raise ValueError(f"列 {column} 不存在")
+        has_keyword = df[keyword_column].notna()
+        if not has_keyword.all():
+            print(f"  话题索引：跳过关键词为空的微博{int((~has_keyword).sum())}条")
+            df = df[has_keyword]
+        rows, topic_codes, topics = explode_topics(df[topics_column])
+        row_keywords, keywords = pd.factorize(df[keyword_column].to_numpy())
+        keyword_codes = row_keywords[rows].astype(np.int64)
+        n_topics, n_keywords = len(topics), len(keywords)
+
+        # 倒排表按 (话题, 关键词, 行号) 排序
+        order = np.lexsort((rows, keyword_codes, topic_codes))
+        indptr = np.zeros(n_topics + 1, dtype=np.int64)
+        np.cumsum(np.bincount(topic_codes, minlength=n_topics), out=indptr[1:])
+        postings = encode_post_ids(df[id_column].to_numpy())[rows[order]]
+        posting_keywords = keyword_codes[order].astype(np.int32)
+
+        # 按关键词计数：(关键词, 话题) 对合并后按 (关键词, 微博数降序, 话题编号) 排序
+        pair_codes = keyword_codes.astype(np.int64) * max(n_topics, 1) + topic_codes
+        unique_pairs, pair_counts = np.unique(pair_codes, return_counts=True)
+        pair_keywords = unique_pairs // max(n_topics, 1)
+        pair_topics = unique_pairs % max(n_topics, 1)
+        ranked = np.lexsort((pair_topics, -pair_counts, pair_keywords))
+        keyword_indptr = np.zeros(n_keywords + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_keywords, minlength=n_keywords), out=keyword_indptr[1:])
+
+        topic_totals = np.bincount(topic_codes, minlength=n_topics).astype(np.int64)
+        global_order = np.lexsort((np.arange(n_topics), -topic_totals))
+
+        arrays = {
+            'indptr': indptr,
+            'postings': postings,
+            'posting_keywords': posting_keywords,
+            'keyword_indptr': keyword_indptr,
+            'keyword_topics': pair_topics[ranked].astype(np.int32),
+            'keyword_counts': pair_counts[ranked].astype(np.int64),
+            'topic_totals': topic_totals,
+            'global_order': global_order.astype(np.int32),
+        }
+        return cls(topics, keywords.tolist(), arrays)
+
+    # --- 持久化 ---
+
+    def save(self, path):
+        """
+        保存到目录：每个数组一个 .npy 文件，话题和关键词列表保存在 meta.json（最后写入）
+
+        参数：
+        -----------
+        path : str
+            索引目录，不存在则创建
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            _atomic_save(os.path.join(path, f"{name}.npy"), np.asarray(self.arrays[name]))
+        meta = {
+            'version': FORMAT_VERSION,
+            'topics': self.topics,
+            'keywords': self.keywords,
+            'n_postings': int(len(self.postings)),
+        }
+        meta_path = os.path.join(path, META_NAME)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, meta_path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        从目录加载索引
+
+        参数：
+        -----------
+        path : str
+            save 写入的目录
+        mmap : bool
+            是否以只读内存映射方式打开数组（加载时间与索引大小无关）
+
+        返回值：
+        -----------
+        TopicIndex
+        """
+        with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"话题索引版本不兼容：{meta.get('version')}，请重新构建")
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+            for name in ARRAY_NAMES
+        }
+        if len(arrays['postings']) != meta['n_postings']:
+            raise ValueError(f"话题索引不完整：{path}，请重新构建")
+        return cls(meta['topics'], meta['keywords'], arrays)
+
+    # --- 查询 ---
+
+    def _topic_range(self, topic, keyword=None):
+        topic_id = self._topic_ids.get(normalize_topic(topic))
+        if topic_id is None:
+            return 0, 0
+        start, end = int(self.indptr[topic_id]), int(self.indptr[topic_id + 1])
+        if keyword is None:
+            return start, end
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is None:
+            return 0, 0
+        block = self.posting_keywords[start:end]
+        return (start + int(np.searchsorted(block, keyword_id, side='left')),
+                start + int(np.searchsorted(block, keyword_id, side='right')))
+
+    def posts(self, topic, keyword=None):
+        """
+        带有该话题的微博ID（按原数据的行顺序），keyword 不为 None 时只取该关键词下的微博
+
+        返回值：
+        -----------
+        numpy.ndarray
+            postings 的切片（内存映射时不复制数据）
+        """
+        start, end = self._topic_range(topic, keyword)
+        return self.postings[start:end]
+
+    def count(self, topic, keyword=None):
+        """带有该话题的微博数，keyword 不为 None 时只计该关键词下的微博"""
+        start, end = self._topic_range(topic, keyword)
+        return end - start
+
+    def top_topics(self, keyword=None, k=10):
+        """
+        微博数最多的前K个话题
+
+        参数：
+        -----------
+        keyword : str or None
+            关键词，None则统计所有关键词
+        k : int
+            返回的话题数
+
+        返回值：
+        -----------
+        list of tuple
+            [(话题, 微博数), ...]，按微博数降序，并列时按话题首次出现的顺序
+        """
+        if keyword is None:
+            ids = self.global_order[:k]
+            return [(self.topics[i], int(self.topic_totals[i])) for i in ids.tolist()]
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is None:
+            return []
+        start = int(self.keyword_indptr[keyword_id])
+        end = min(int(self.keyword_indptr[keyword_id + 1]), start + k)
+        return [
+            (self.topics[t], c)
+            for t, c in zip(self.keyword_topics[start:end].tolist(), self.keyword_counts[start:end].tolist())
+        ]
+
+    def __contains__(self, topic):
+        return normalize_topic(topic) in self._topic_ids
+
+    def __len__(self):
+        return len(self.topics)
+
+
+def build_topic_index(df, path, topics_column, id_column, keyword_column):
+    """
+    构建话题倒排索引并保存到 path
+
+    参数：
+    -----------
+    df : pandas.DataFrame
+        微博数据
+    path : str
+        索引目录
+    topics_column, id_column, keyword_column : str
+        话题、微博ID和关键词列名
+
+    返回值：
+    -----------
+    TopicIndex
+    """
+    index = TopicIndex.build(df, topics_column, id_column, keyword_column)
+    index.save(path)
+    print(f"  话题索引：{len(index)}个话题，{len(index.postings)}条倒排记录，已保存到 {path}")
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询话题倒排索引')
+    parser.add_argument('index_dir', help='话题索引目录（settings.TOPIC_INDEX_PATH）')
+    parser.add_argument('--topic', default=None, help='列出带有该话题的微博ID')
+    parser.add_argument('--keyword', default=None, help='只查询该关键词下的微博')
+    parser.add_argument('--top', type=int, default=10, help='未指定 --topic 时列出前N个话题')
+    args = parser.parse_args(argv)
+
+    index = TopicIndex.load(args.index_dir)
+    if args.topic is not None:
+        ids = index.posts(args.topic, args.keyword)
+        print(f"#{normalize_topic(args.topic)}#：{len(ids)}条微博")
+        for post_id in ids[:args.top].tolist():
+            print(f"  {post_id}")
+        return
+    for rank, (topic, count) in enumerate(index.top_topics(args.keyword, args.top), 1):
+        print(f"{rank:>3}. #{topic}#  {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,560 @@
+"""
+增量监视模式
+轮询 LOAD_POSTS_FOLDER_PATH，只读取新出现或有新增行的CSV文件：新微博先与持久化的按关键词已保留微博索引
+（精确文本 + MinHash/LSH 分桶，候选再用 DEDUPE_SIMILARITY_THRESHOLD 校验，见 dedupe_lsh.py）去重，
+保留下来的微博分词后累加进持久化的按关键词词频，最后只刷新受影响关键词的 word_freq_df 和词云。
+每次更新的开销与新数据量成正比，与历史总量无关。
+
+去重规则与 dedupe_posts 相同：相似的微博只保留发布时间最新的一条，数值列求和。
+新微博比已保留的相似微博更新时，由新微博接替，词频相应减去旧正文、加上新正文。
+
+状态保存在 WATCH_STATE_DIR：
+    state.sqlite      已处理文件、已见微博id、已保留微博及其分桶、按关键词的词频
+    word_freq_df.csv  最新的词频表
+
+用法：
+    python -m utils watch            # 每 WATCH_INTERVAL 秒轮询一次，Ctrl+C 退出
+    python -m utils watch --once     # 只处理当前的新文件后退出（适合 cron）
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+
+from . import settings
+from .dedupe_lsh import DEFAULT_SUM_COLS, _similarity, minhash_signatures
+from .metrics import recorder_from_settings
+from .parallel_loader import _load_single_file, file_signature, list_csv_files
+
+STATE_DB_NAME = 'state.sqlite'
+WORD_FREQ_FILE_NAME = 'word_freq_df.csv'
+
+# 决定状态内容的 settings；与建立状态时不一致则拒绝继续累加
+STATE_SETTINGS = [
+    'LOAD_POSTS_KEYWORD_COLUMN',
+    'WATCH_ID_COLUMN',
+    'DEDUPE_KEYWORD_COL',
+    'DEDUPE_TEXT_COL',
+    'DEDUPE_TIME_COL',
+    'DEDUPE_SUM_COLS',
+    'DEDUPE_SIMILARITY_THRESHOLD',
+    'DEDUPE_MIN_LEN_FOR_SIMILARITY',
+    'DEDUPE_AUTO_CLEAN',
+    'DEDUPE_MINHASH_NUM_PERM',
+    'DEDUPE_MINHASH_BANDS',
+    'DEDUPE_MINHASH_SHINGLE_SIZE',
+    'TOKENIZE_TEXT_COLUMN',
+    'TOKENIZE_KEYWORD_COLUMN',
+    'TOKENIZE_WORD_LENGTH_RANGE',
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL,
+    rows INTEGER NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS seen (
+    keyword TEXT NOT NULL, post_id TEXT NOT NULL, PRIMARY KEY (keyword, post_id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS posts (
+    kept_id INTEGER PRIMARY KEY, keyword TEXT NOT NULL, text TEXT NOT NULL,
+    time TEXT, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS exact (
+    keyword TEXT NOT NULL, text TEXT NOT NULL, kept_id INTEGER NOT NULL,
+    PRIMARY KEY (keyword, text)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS bands (
+    keyword TEXT NOT NULL, band INTEGER NOT NULL, key BLOB NOT NULL, kept_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_bands_lookup ON bands(keyword, band, key);
+CREATE INDEX IF NOT EXISTS idx_bands_kept ON bands(kept_id);
+CREATE TABLE IF NOT EXISTS counts (
+    keyword TEXT NOT NULL, word TEXT NOT NULL, count INTEGER NOT NULL, seq INTEGER NOT NULL,
+    PRIMARY KEY (keyword, word)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_counts_rank ON counts(keyword, count DESC, seq);
+CREATE TABLE IF NOT EXISTS dirty (keyword TEXT PRIMARY KEY) WITHOUT ROWID;
+"""
+
+
+def state_fingerprint():
+    """STATE_SETTINGS 的哈希"""
+    payload = {name: getattr(settings, name) for name in STATE_SETTINGS}
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _to_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+class WatchState:
+    """
+    监视模式的持久化状态（SQLite）
+
+    参数：
+    -----------
+    state_dir : str
+        状态目录
+
+    异常：
+    -----------
+    ValueError
+        状态是用不同的去重/分词参数建立的
+    """
+
+    def __init__(self, state_dir):
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_dir = state_dir
+        self.word_freq_path = os.path.join(state_dir, WORD_FREQ_FILE_NAME)
+        self._conn = sqlite3.connect(os.path.join(state_dir, STATE_DB_NAME), timeout=60)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        fingerprint = state_fingerprint()
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO meta VALUES ('fingerprint', ?), ('seq', '0')", (fingerprint,))
+            self._conn.commit()
+        elif row[0] != fingerprint:
+            raise ValueError(
+                f"{state_dir} 中的状态是用不同的去重/分词参数建立的，请恢复原参数或删除该目录后重建"
+            )
+        num_perm, bands = settings.DEDUPE_MINHASH_NUM_PERM, settings.DEDUPE_MINHASH_BANDS
+        if num_perm % bands != 0:
+            raise ValueError("DEDUPE_MINHASH_NUM_PERM 必须能被 DEDUPE_MINHASH_BANDS 整除")
+        self._rows_per_band = num_perm // bands
+
+    def close(self):
+        self._conn.close()
+
+    # --- 文件 ---
+
+    def pending_files(self, folder_path, settle_seconds=0):
+        """
+        需要读取的文件：新文件，以及大小或修改时间变化的文件；最近 settle_seconds 秒内还在修改的文件暂不读取
+
+        返回值：
+        -----------
+        list of (str, dict, bool)
+            (路径, 文件签名, 是否为已处理过的文件)
+        """
+        now = time.time()
+        out = []
+        for path in list_csv_files(folder_path):
+            sig = file_signature(path)
+            row = self._conn.execute(
+                'SELECT mtime_ns, size FROM files WHERE path = ?', (sig['path'],)
+            ).fetchone()
+            if row is not None and row == (sig['mtime_ns'], sig['size']):
+                continue
+            if now - sig['mtime_ns'] / 1e9 < settle_seconds:
+                continue
+            out.append((path, sig, row is not None))
+        return out
+
+    def mark_file(self, sig, rows):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+            (sig['path'], sig['mtime_ns'], sig['size'], rows, time.time()),
+        )
+
+    def filter_unseen(self, frame, keyword_column, id_column):
+        """去掉已处理过的微博（按 关键词+id），并记录新id"""
+        keep = []
+        batch_seen = set()
+        for pos, (keyword, post_id) in enumerate(zip(frame[keyword_column].astype(str), frame[id_column].astype(str))):
+            if (keyword, post_id) in batch_seen:
+                continue
+            batch_seen.add((keyword, post_id))
+            if self._conn.execute(
+                'SELECT 1 FROM seen WHERE keyword = ? AND post_id = ?', (keyword, post_id)
+            ).fetchone() is None:
+                keep.append(pos)
+        self._conn.executemany('INSERT OR IGNORE INTO seen VALUES (?, ?)', batch_seen)
+        return frame.iloc[keep]
+
+    # --- 去重 ---
+
+    def _band_keys(self, signature):
+        rows = self._rows_per_band
+        return [signature[b * rows:(b + 1) * rows].tobytes() for b in range(settings.DEDUPE_MINHASH_BANDS)]
+
+    def _find_match(self, keyword, text, band_keys):
+        row = self._conn.execute(
+            'SELECT kept_id FROM exact WHERE keyword = ? AND text = ?', (keyword, text)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        if band_keys is None:
+            return None
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(r[0] for r in self._conn.execute(
+                'SELECT kept_id FROM bands WHERE keyword = ? AND band = ? AND key = ?', (keyword, band, key)
+            ))
+        best, best_score = None, 0.0
+        for kept_id in sorted(candidates):
+            cand_text = self._conn.execute('SELECT text FROM posts WHERE kept_id = ?', (kept_id,)).fetchone()[0]
+            score = _similarity(text, cand_text)
+            if score >= settings.DEDUPE_SIMILARITY_THRESHOLD and score > best_score:
+                best, best_score = kept_id, score
+        return best
+
+    def _index(self, kept_id, keyword, text, band_keys):
+        self._conn.execute('INSERT OR REPLACE INTO exact VALUES (?, ?, ?)', (keyword, text, kept_id))
+        if band_keys is not None:
+            self._conn.executemany(
+                'INSERT INTO bands VALUES (?, ?, ?, ?)',
+                [(keyword, band, key, kept_id) for band, key in enumerate(band_keys)],
+            )
+
+    def _unindex(self, kept_id):
+        self._conn.execute('DELETE FROM exact WHERE kept_id = ?', (kept_id,))
+        self._conn.execute('DELETE FROM bands WHERE kept_id = ?', (kept_id,))
+
+    def dedupe(self, frame):
+        """
+        把新微博与已保留微博去重，并更新索引
+
+        参数：
+        -----------
+        frame : pandas.DataFrame
+            新微博，需包含 DEDUPE_TEXT_COL（或设置 DEDUPE_AUTO_CLEAN）
+
+        返回值：
+        -----------
+        dict
+            'added': [(关键词, 正文)] 需要加入词频的微博，'removed': [(关键词, 正文)] 需要从词频中减去的微博，
+            'kept' / 'merged' / 'replaced': 新保留、并入已有微博、接替已有微博的条数
+        """
+        import pandas as pd
+
+        keyword_col, text_col, time_col = settings.DEDUPE_KEYWORD_COL, settings.DEDUPE_TEXT_COL, settings.DEDUPE_TIME_COL
+        token_col = settings.TOKENIZE_TEXT_COLUMN
+        frame = frame.copy()
+        if text_col not in frame.columns:
+            if not settings.DEDUPE_AUTO_CLEAN:
+                raise ValueError(f"列 {text_col} 不存在，可设置 DEDUPE_AUTO_CLEAN=True 自动清洗")
+            from processing.post_analysis import clean_text
+            frame[text_col] = frame['微博正文'].map(clean_text)
+        sum_cols = [c for c in (settings.DEDUPE_SUM_COLS or DEFAULT_SUM_COLS) if c in frame.columns]
+
+        times = pd.to_datetime(frame[time_col], errors='coerce')
+        texts_all = frame[text_col].fillna('').astype(str).to_numpy()
+        records = json.loads(frame.to_json(orient='records', force_ascii=False, date_format='iso'))
+        out = {'added': [], 'removed': [], 'kept': 0, 'merged': 0, 'replaced': 0}
+        added = []
+
+        for keyword, positions in frame.groupby(keyword_col, sort=False).indices.items():
+            keyword = str(keyword)
+            order = (
+                pd.Series(times.to_numpy()[positions])
+                .sort_values(ascending=False, kind='mergesort', na_position='last')
+                .index.to_numpy()
+            )
+            texts = texts_all[positions]
+            signatures = minhash_signatures(
+                texts,
+                num_perm=settings.DEDUPE_MINHASH_NUM_PERM,
+                shingle_size=settings.DEDUPE_MINHASH_SHINGLE_SIZE,
+            )
+            for pos in order:
+                text = texts[pos]
+                when = times.iloc[positions[pos]]
+                record = records[positions[pos]]
+                band_keys = (
+                    self._band_keys(signatures[pos])
+                    if len(text) >= settings.DEDUPE_MIN_LEN_FOR_SIMILARITY else None
+                )
+                kept_id = self._find_match(keyword, text, band_keys)
+                if kept_id is None:
+                    cursor = self._conn.execute(
+                        'INSERT INTO posts (keyword, text, time, data) VALUES (?, ?, ?, ?)',
+                        (keyword, text, None if pd.isna(when) else when.isoformat(),
+                         json.dumps(record, ensure_ascii=False)),
+                    )
+                    self._index(cursor.lastrowid, keyword, text, band_keys)
+                    added.append((positions[pos], keyword, record.get(token_col)))
+                    out['kept'] += 1
+                    continue
+
+                rep_time, rep_data = self._conn.execute(
+                    'SELECT time, data FROM posts WHERE kept_id = ?', (kept_id,)
+                ).fetchone()
+                rep_data = json.loads(rep_data)
+                newer = not pd.isna(when) and (rep_time is None or when > pd.Timestamp(rep_time))
+                if newer:
+                    # 新微博接替：数值列累加到新微博上，索引和词频换成新正文
+                    for col in sum_cols:
+                        record[col] = _to_number(record.get(col)) + _to_number(rep_data.get(col))
+                    self._unindex(kept_id)
+                    self._conn.execute(
+                        'UPDATE posts SET text = ?, time = ?, data = ? WHERE kept_id = ?',
+                        (text, when.isoformat(), json.dumps(record, ensure_ascii=False), kept_id),
+                    )
+                    self._index(kept_id, keyword, text, band_keys)
+                    out['removed'].append((keyword, rep_data.get(token_col)))
+                    added.append((positions[pos], keyword, record.get(token_col)))
+                    out['replaced'] += 1
+                else:
+                    for col in sum_cols:
+                        rep_data[col] = _to_number(rep_data.get(col)) + _to_number(record.get(col))
+                    self._conn.execute(
+                        'UPDATE posts SET data = ? WHERE kept_id = ?',
+                        (json.dumps(rep_data, ensure_ascii=False), kept_id),
+                    )
+                    out['merged'] += 1
+        # 按文件中的行序累加词频，使并列词的先后与完整流程（Counter 插入顺序）一致
+        out['added'] = [(keyword, text) for _, keyword, text in sorted(added)]
+        return out
+
+    # --- 词频 ---
+
+    def add_counts(self, word_freq_by_keyword, sign=1):
+        """把 {关键词: Counter} 累加（sign=-1 时减去）到持久化词频，词频降为0的词删除"""
+        seq = int(self._conn.execute("SELECT value FROM meta WHERE key = 'seq'").fetchone()[0])
+        for keyword, counter in word_freq_by_keyword.items():
+            rows = []
+            for word, count in counter.items():
+                seq += 1
+                rows.append((str(keyword), word, sign * int(count), seq))
+            self._conn.executemany(
+                'INSERT INTO counts VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(keyword, word) DO UPDATE SET count = count + excluded.count',
+                rows,
+            )
+            if sign < 0:
+                self._conn.execute('DELETE FROM counts WHERE keyword = ? AND count <= 0', (str(keyword),))
+        self._conn.execute("UPDATE meta SET value = ? WHERE key = 'seq'", (str(seq),))
+
+    def top_counters(self, keywords, top_n):
+        """
+        {关键词: Counter}，每个 Counter 只含前N个词且按名次插入（并列时先出现的在前），
+        可直接交给 create_word_frequency_dataframe
+        """
+        out = {}
+        for keyword in keywords:
+            rows = self._conn.execute(
+                'SELECT word, count FROM counts WHERE keyword = ? ORDER BY count DESC, seq LIMIT ?',
+                (keyword, top_n),
+            ).fetchall()
+            out[keyword] = Counter(dict(rows))
+        return out
+
+    def mark_dirty(self, keywords):
+        """记录词频已变、但 word_freq_df 和词云还没刷新的关键词（刷新失败时下次继续刷新）"""
+        self._conn.executemany('INSERT OR IGNORE INTO dirty VALUES (?)', [(k,) for k in keywords])
+
+    def dirty_keywords(self):
+        return {r[0] for r in self._conn.execute('SELECT keyword FROM dirty')}
+
+    def clear_dirty(self, keywords):
+        self._conn.executemany('DELETE FROM dirty WHERE keyword = ?', [(k,) for k in keywords])
+        self._conn.commit()
+
+    def keywords(self):
+        return [r[0] for r in self._conn.execute('SELECT DISTINCT keyword FROM counts ORDER BY keyword')]
+
+    def posts_frame(self, keywords=None):
+        """已保留的微博（去重后，数值列为累加值），可只取部分关键词"""
+        import pandas as pd
+
+        if keywords is None:
+            rows = self._conn.execute('SELECT data FROM posts ORDER BY kept_id')
+        else:
+            marks = ','.join('?' * len(keywords))
+            rows = self._conn.execute(
+                f'SELECT data FROM posts WHERE keyword IN ({marks}) ORDER BY kept_id', list(keywords)
+            )
+        return pd.DataFrame([json.loads(r[0]) for r in rows])
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+
+def _refresh_word_freq_df(state, affected):
+    """重算受影响关键词的前N个词，替换 word_freq_df.csv 中对应的行"""
+    import pandas as pd
+    from processing.post_analysis import create_word_frequency_dataframe
+
+    keyword_col = settings.WORDCLOUD_KEYWORD_COLUMN
+    fresh = create_word_frequency_dataframe(
+        word_freq_by_keyword=state.top_counters(sorted(affected), settings.WORD_FREQ_TOP_N),
+        top_n=settings.WORD_FREQ_TOP_N,
+    )
+    if os.path.exists(state.word_freq_path):
+        previous = pd.read_csv(
+            state.word_freq_path, keep_default_na=False,
+            dtype={keyword_col: str, settings.WORDCLOUD_WORD_COLUMN: str},
+        )
+        previous = previous[~previous[keyword_col].isin(affected)]
+        fresh = pd.concat([previous, fresh], ignore_index=True)
+    tmp_path = state.word_freq_path + '.tmp'
+    fresh.to_csv(tmp_path, index=False, encoding='utf-8-sig')
+    os.replace(tmp_path, state.word_freq_path)
+    return fresh
+
+
+def run_update(state_dir=None, folder_path=None):
+    """
+    处理一次新文件：读取 → 去重 → 分词累加 → 刷新受影响关键词的 word_freq_df 和词云
+
+    参数：
+    -----------
+    state_dir : str or None
+        状态目录，None则使用 settings.WATCH_STATE_DIR
+    folder_path : str or None
+        监视的文件夹，None则使用 settings.LOAD_POSTS_FOLDER_PATH
+
+    返回值：
+    -----------
+    dict or None
+        没有新文件时为None；否则包含 'files'、'rows'、'kept'、'merged'、'replaced'、
+        'keywords'（受影响的关键词）、'word_freq_df'、'wordcloud_files'、'metrics'、'seconds'
+    """
+    import pandas as pd
+    from processing.post_analysis import tokenize_and_count_words
+    from .parallel_wordcloud import render_wordclouds_parallel
+
+    state_dir = state_dir or settings.WATCH_STATE_DIR
+    folder_path = folder_path or settings.LOAD_POSTS_FOLDER_PATH
+    if state_dir is None:
+        raise ValueError("WATCH_STATE_DIR未设置，请在settings.py中配置")
+    if folder_path is None:
+        raise ValueError("LOAD_POSTS_FOLDER_PATH未设置，请在settings.py中配置")
+
+    start = time.perf_counter()
+    state = WatchState(state_dir)
+    try:
+        pending = state.pending_files(folder_path, settings.WATCH_SETTLE_SECONDS)
+        affected = state.dirty_keywords()
+        if not pending and not affected:
+            return None
+        recorder = recorder_from_settings()
+        keyword_col = settings.LOAD_POSTS_KEYWORD_COLUMN
+        id_col = settings.WATCH_ID_COLUMN
+
+        with recorder.stage('load') as record:
+            frames = []
+            for path, sig, seen_before in pending:
+                frame = _load_single_file(path, keyword_col)
+                if id_col in frame.columns:
+                    frame = state.filter_unseen(frame, keyword_col, id_col)
+                elif seen_before:
+                    print(f"⚠ {os.path.basename(path)} 已处理过且没有 {id_col} 列，无法区分新增行，已跳过")
+                    frame = frame.iloc[:0]
+                state.mark_file(sig, len(frame))
+                frames.append(frame)
+            new_rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            record['rows_out'] = len(new_rows)
+
+        result = {'files': len(pending), 'rows': len(new_rows), 'kept': 0, 'merged': 0, 'replaced': 0}
+        if len(new_rows):
+            with recorder.stage('dedupe', rows_in=len(new_rows)) as record:
+                deduped = state.dedupe(new_rows)
+                record['rows_out'] = deduped['kept']
+            result.update({k: deduped[k] for k in ('kept', 'merged', 'replaced')})
+
+            with recorder.stage('tokenize', rows_in=len(deduped['added']) + len(deduped['removed'])) as record:
+                for rows, sign in ((deduped['added'], 1), (deduped['removed'], -1)):
+                    if not rows:
+                        continue
+                    counts = tokenize_and_count_words(
+                        df=pd.DataFrame(rows, columns=[settings.TOKENIZE_KEYWORD_COLUMN, settings.TOKENIZE_TEXT_COLUMN]),
+                        text_column=settings.TOKENIZE_TEXT_COLUMN,
+                        keyword_column=settings.TOKENIZE_KEYWORD_COLUMN,
+                        word_length_range=settings.TOKENIZE_WORD_LENGTH_RANGE,
+                    )
+                    state.add_counts(counts, sign)
+                    affected.update(str(k) for k in counts)
+                record['rows_out'] = len(affected)
+        # 索引、词频和待刷新关键词在同一个事务中提交，中途失败不会留下只更新了一半的状态
+        state.mark_dirty(affected)
+        state.commit()
+
+        result['keywords'] = sorted(affected)
+        result['word_freq_df'] = None
+        result['wordcloud_files'] = None
+        if affected:
+            with recorder.stage('word_frequency', rows_in=len(affected)) as record:
+                word_freq_df = _refresh_word_freq_df(state, affected)
+                record['rows_out'] = len(word_freq_df)
+            result['word_freq_df'] = word_freq_df
+            if settings.WATCH_WORDCLOUD:
+                with recorder.stage('create_wordcloud', rows_in=len(word_freq_df)) as record:
+                    rendered = render_wordclouds_parallel(
+                        df=word_freq_df,
+                        keyword_column=settings.WORDCLOUD_KEYWORD_COLUMN,
+                        word_column=settings.WORDCLOUD_WORD_COLUMN,
+                        freq_column=settings.WORDCLOUD_FREQ_COLUMN,
+                        top_n=settings.WORDCLOUD_TOP_N,
+                        output_dir=settings.WORDCLOUD_OUTPUT_DIR,
+                        font_path=settings.WORDCLOUD_FONT_PATH,
+                        colors_list=settings.WORDCLOUD_COLORS_LIST,
+                        tile_size=settings.WORDCLOUD_TILE_SIZE,
+                        prefer_horizontal=settings.WORDCLOUD_PREFER_HORIZONTAL,
+                        relative_scaling=settings.WORDCLOUD_RELATIVE_SCALING,
+                        min_font_size=settings.WORDCLOUD_MIN_FONT_SIZE,
+                        workers=settings.WORDCLOUD_WORKERS,
+                        composite=settings.WORDCLOUD_COMPOSITE,
+                        cols=settings.WORDCLOUD_COLS,
+                        figsize=settings.WORDCLOUD_FIGSIZE,
+                    )
+                    record['rows_out'] = rendered['rendered']
+                result['wordcloud_files'] = rendered
+        state.clear_dirty(affected)
+    except BaseException:
+        state.rollback()
+        raise
+    finally:
+        state.close()
+
+    result['metrics'] = recorder.records
+    result['seconds'] = time.perf_counter() - start
+    print(
+        f"✓ 增量更新：{result['files']}个文件，新微博{result['rows']}条"
+        f"（新保留{result['kept']}，并入已有{result['merged']}，接替已有{result['replaced']}），"
+        f"刷新{len(affected)}个关键词，耗时{result['seconds']:.2f}s"
+    )
+    return result
+
+
+def watch(interval=None, once=False):
+    """
+    轮询 LOAD_POSTS_FOLDER_PATH，有新文件时调用 run_update；once=True 时只处理一次
+    """
+    interval = settings.WATCH_INTERVAL if interval is None else interval
+    if once:
+        return run_update()
+    print(f"✓ 开始监视 {settings.LOAD_POSTS_FOLDER_PATH}，每{interval}秒检查一次（Ctrl+C 退出）")
+    try:
+        while True:
+            run_update()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n✓ 已停止监视")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m utils watch', description='增量监视模式')
+    parser.add_argument('--once', action='store_true', help='只处理当前的新文件后退出')
+    parser.add_argument('--interval', type=float, default=None, help='轮询间隔（秒，默认settings.WATCH_INTERVAL）')
+    parser.add_argument('--folder', default=None, help='监视的文件夹（默认settings.LOAD_POSTS_FOLDER_PATH）')
+    parser.add_argument('--state_dir', default=None, help='状态目录（默认settings.WATCH_STATE_DIR）')
+    args = parser.parse_args(argv)
+    if args.folder:
+        settings.LOAD_POSTS_FOLDER_PATH = args.folder
+    if args.state_dir:
+        settings.WATCH_STATE_DIR = args.state_dir
+    result = watch(args.interval, args.once)
+    if args.once and result is None:
+        print("没有新文件")